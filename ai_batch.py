@@ -0,0 +1,63 @@
+# 批量AI决策模块
+# 把所有机器人的距离和朝向判断收集到数组中一次性计算
+
+import random
+
+import numpy as np
+
+# 与RobotTank.ai_shoot保持一致的参数
+FIRE_RANGE = 300
+FIRE_CHANCE = 0.03
+MISSILE_CHANCE = 0.2
+
+
+def batch_ai_shoot(robots, player, elapsed_frames):
+    """批量版本的RobotTank.ai_shoot
+
+    robots和elapsed_frames一一对应，返回本次生成的炮弹/导弹列表。
+    距离和朝向用向量运算一次算完，冷却状态由计时轮维护，直接读取；随机数仍按机器人顺序逐个抽取，
+    抽取条件与ai_shoot完全相同，因此同一个随机数序列下两种实现的行为一致。
+    """
+    count = len(robots)
+    if count == 0:
+        return []
+
+    # 收集位置
+    centers = np.fromiter((value for robot in robots for value in robot.rect.center),
+                          dtype=np.int64, count=count * 2).reshape(count, 2)
+    elapsed = np.asarray(elapsed_frames, dtype=np.float64)
+
+    # 距离判断（比较平方，与开方后比较300等价）
+    dx = player.rect.centerx - centers[:, 0]
+    dy = player.rect.centery - centers[:, 1]
+    in_range = dx * dx + dy * dy < FIRE_RANGE * FIRE_RANGE
+
+    # 射击方向：水平距离更大时朝左右，否则朝上下
+    horizontal = np.abs(dx) > np.abs(dy)
+    facing = np.where(horizontal, np.where(dx > 0, 1, 3), np.where(dy > 0, 2, 0))
+
+    # 开火几率按经过的帧数折算
+    fire_chance = np.where(elapsed == 1, FIRE_CHANCE, 1 - (1 - FIRE_CHANCE) ** elapsed)
+
+    for robot in robots:
+        robot.target = player
+
+    # 按顺序消耗随机数，只有在射程内的机器人才会抽取
+    projectiles = []
+    for index in np.flatnonzero(in_range).tolist():
+        if random.random() >= fire_chance[index]:
+            continue
+        robot = robots[index]
+        direction = int(facing[index])
+        if not robot.has_line_of_sight(player, direction):
+            continue
+        robot.rotate(direction)
+        if random.random() < MISSILE_CHANCE and robot.missile_ready:
+            projectile = robot.shoot_missile()
+        elif robot.bullet_ready:
+            projectile = robot.shoot_bullet()
+        else:
+            projectile = None
+        if projectile:
+            projectiles.append(projectile)
+    return projectiles
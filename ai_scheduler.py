@@ -0,0 +1,143 @@
+# AI调度模块
+# 把机器人的思考（瞄准、开火决策）分散到不同帧执行，并限制每帧的AI耗时
+
+import heapq
+import itertools
+import time
+
+
+class AIScheduler:
+    """按帧错开的AI思考调度器
+
+    每个机器人注册时分到一个槽位，只在与槽位对齐的帧上思考，
+    因此无论思考间隔是多少，机器人都会均匀分布到各帧，不会集中在同一帧。
+    离所有玩家都很远的机器人降低思考频率。
+    每帧的思考总耗时受预算限制，超出预算的机器人推迟到下一帧并优先处理。
+    """
+
+    def __init__(self, think_interval=3, far_interval=12, far_distance=400, frame_budget_ms=2.0):
+        self.think_interval = max(1, think_interval)
+        self.far_interval = max(self.think_interval, far_interval)
+        self.far_distance_sq = far_distance * far_distance
+        self.frame_budget = frame_budget_ms / 1000.0
+        self.frame = 0
+        self._queue = []  # (到期帧, 序号, 槽位, 机器人, 上次思考帧)
+        self._sequence = itertools.count()
+        self._registered = 0
+
+        # 统计信息
+        self.thinks_last_frame = 0
+        self.deferred_last_frame = 0
+        self.think_time_ms = 0.0
+        self.total_deferred = 0
+        self._batch_cost = 0.0  # 批量模式下每个机器人的平均耗时（秒）
+
+    def register(self, robot):
+        # 按注册顺序分配槽位
+        slot = self._registered
+        self._registered += 1
+        due = self._next_due(slot, self.think_interval)
+        heapq.heappush(self._queue, (due, next(self._sequence), slot, robot, due - self.think_interval))
+
+    def _next_due(self, slot, interval):
+        # 当前帧之后第一个与槽位对齐的帧
+        return self.frame + interval - (self.frame - slot) % interval
+
+    def interval_for(self, robot, targets):
+        # 离所有目标都很远时降低思考频率（比较距离平方，省去开方）
+        x, y = robot.rect.center
+        for target in targets:
+            dx = target.rect.centerx - x
+            dy = target.rect.centery - y
+            if dx * dx + dy * dy < self.far_distance_sq:
+                return self.think_interval
+        return self.far_interval
+
+    def update(self, targets, think):
+        """运行本帧到期的思考
+
+        think(robot, elapsed_frames) 由调用方提供，elapsed_frames是距上次思考经过的帧数。
+        """
+        self.frame += 1
+        queue = self._queue
+        start = time.perf_counter()
+        deadline = start + self.frame_budget
+        thinks = 0
+        deferred = []
+
+        while queue and queue[0][0] <= self.frame:
+            due, sequence, slot, robot, last_think = heapq.heappop(queue)
+            if not robot.alive():
+                continue
+            # 至少执行一次思考，保证预算很小时也能推进
+            if thinks and time.perf_counter() >= deadline:
+                deferred.append((due, sequence, slot, robot, last_think))
+                continue
+            think(robot, self.frame - last_think)
+            thinks += 1
+            next_due = self._next_due(slot, self.interval_for(robot, targets))
+            heapq.heappush(queue, (next_due, next(self._sequence), slot, robot, self.frame))
+
+        # 被推迟的机器人保留原来的到期帧，下一帧排在最前面
+        for entry in deferred:
+            heapq.heappush(queue, entry)
+
+        self.thinks_last_frame = thinks
+        self.deferred_last_frame = len(deferred)
+        self.total_deferred += len(deferred)
+        self.think_time_ms = (time.perf_counter() - start) * 1000
+        return thinks
+
+    def update_batch(self, targets, think_batch):
+        """批量运行本帧到期的思考
+
+        think_batch(robots, elapsed_frames) 一次处理所有到期机器人，机器人顺序与update()相同。
+        批量调用无法中途打断，所以按以往的每机器人平均耗时估算预算内能处理的数量，
+        其余的推迟到下一帧。
+        """
+        self.frame += 1
+        queue = self._queue
+        start = time.perf_counter()
+        limit = len(queue)
+        if self._batch_cost > 0:
+            limit = max(1, int(self.frame_budget / self._batch_cost))
+
+        entries = []
+        deferred = []
+        while queue and queue[0][0] <= self.frame:
+            entry = heapq.heappop(queue)
+            if not entry[3].alive():
+                continue
+            if len(entries) < limit:
+                entries.append(entry)
+            else:
+                deferred.append(entry)
+
+        if entries:
+            think_batch([entry[3] for entry in entries],
+                        [self.frame - entry[4] for entry in entries])
+            for due, sequence, slot, robot, last_think in entries:
+                next_due = self._next_due(slot, self.interval_for(robot, targets))
+                heapq.heappush(queue, (next_due, next(self._sequence), slot, robot, self.frame))
+            # 用指数滑动平均更新每个机器人的耗时估计
+            cost = (time.perf_counter() - start) / len(entries)
+            self._batch_cost = cost if self._batch_cost == 0 else self._batch_cost * 0.9 + cost * 0.1
+
+        # 被推迟的机器人保留原来的到期帧，下一帧排在最前面
+        for entry in deferred:
+            heapq.heappush(queue, entry)
+
+        self.thinks_last_frame = len(entries)
+        self.deferred_last_frame = len(deferred)
+        self.total_deferred += len(deferred)
+        self.think_time_ms = (time.perf_counter() - start) * 1000
+        return len(entries)
+
+    def stats(self):
+        return {
+            'frame': self.frame,
+            'thinks': self.thinks_last_frame,
+            'deferred': self.deferred_last_frame,
+            'think_time_ms': self.think_time_ms,
+            'total_deferred': self.total_deferred,
+        }
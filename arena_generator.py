@@ -0,0 +1,262 @@
+# 随机地图模块
+# 按种子和密度参数生成障碍物布局，每个候选布局在导航栅格上验证：
+# 出生点四周必须空出，所有出生点必须能从玩家出生点走到。
+# 栅格的每一行是一个整数的一段位，障碍物的膨胀和洪水填充都是整数位运算，每秒能验证上千个候选
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from config import (SCREEN_WIDTH, SCREEN_HEIGHT, PLAYER_TANK_SIZE, ROBOT_TANK_SIZE,
+                    NAV_CELL_SIZE, NAV_CLEARANCE, ARENA_DENSITY, ARENA_BOX_CELLS,
+                    ARENA_SPAWN_CLEARANCE, ARENA_MAX_CANDIDATES)
+from game_map import compile_map, parse_map
+
+
+def _overlaps(ax, ay, aw, ah, bx, by, bw, bh):
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+class ArenaGenerator:
+    """随机地图生成器
+
+    candidate(seed)由种子确定地生成一个候选布局（地图描述dict，格式与JSON地图文件相同），
+    check()验证任意一个同样大小的地图描述，generate()依次尝试候选直到找到合格的布局。
+    障碍物按导航格子对齐，验证用的栅格与compile_map()生成的导航栅格完全一致。
+    """
+
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, density=ARENA_DENSITY, robot_count=1,
+                 seed=None, box_cells=ARENA_BOX_CELLS, spawn_clearance=ARENA_SPAWN_CLEARANCE,
+                 max_candidates=ARENA_MAX_CANDIDATES):
+        self.width = width
+        self.height = height
+        self.density = density
+        self.robot_count = robot_count
+        self.box_cells = box_cells
+        self.spawn_clearance = spawn_clearance
+        self.max_candidates = max_candidates
+        self.random = random.Random(seed)
+        self.candidates = 0  # 已生成的候选布局数
+        self.rejected = {}  # 不合格原因 -> 次数
+
+        cell = NAV_CELL_SIZE
+        self.cols = cols = max(1, width // cell)
+        self.rows = rows = max(1, height // cell)
+        row_bits = (1 << cols) - 1
+        # _repeat[n]把一行的位复制到连续n行上
+        self._repeat = [0]
+        for _ in range(rows):
+            self._repeat.append((self._repeat[-1] << cols) | 1)
+        self._full = row_bits * self._repeat[rows]
+        # 左右移位时会从相邻行绕过来的列
+        self._not_first_col = (row_bits & ~1) * self._repeat[rows]
+        self._not_last_col = (row_bits >> 1) * self._repeat[rows]
+
+        # 格子中心离世界边界不足NAV_CLEARANCE的格子不可通行（与NavGrid相同）
+        half = cell // 2
+        edge_cols = 0
+        for col in range(cols):
+            cx = col * cell + half
+            if cx < NAV_CLEARANCE or cx > width - NAV_CLEARANCE:
+                edge_cols |= 1 << col
+        self._border = edge_cols * self._repeat[rows]
+        for row in range(rows):
+            cy = row * cell + half
+            if cy < NAV_CLEARANCE or cy > height - NAV_CLEARANCE:
+                self._border |= row_bits << (row * cols)
+
+    def reseed(self, seed=None):
+        self.random.seed(seed)
+
+    def _box_mask(self, x, y, w, h, clearance):
+        # 障碍物膨胀clearance后，格子中心落在其中的格子（与NavGrid的栅格化相同）
+        cell = NAV_CELL_SIZE
+        half = cell // 2
+        first_col = max(0, (x - clearance - half) // cell + 1)
+        last_col = min(self.cols - 1, (x + w + clearance - half - 1) // cell)
+        first_row = max(0, (y - clearance - half) // cell + 1)
+        last_row = min(self.rows - 1, (y + h + clearance - half - 1) // cell)
+        if first_col > last_col or first_row > last_row:
+            return 0
+        span = ((1 << (last_col - first_col + 1)) - 1) << first_col
+        return (span * self._repeat[last_row - first_row + 1]) << (first_row * self.cols)
+
+    def _cell_bit(self, x, y):
+        col = min(max(int(x) // NAV_CELL_SIZE, 0), self.cols - 1)
+        row = min(max(int(y) // NAV_CELL_SIZE, 0), self.rows - 1)
+        return 1 << (row * self.cols + col)
+
+    def _spawn_zone(self, x, y, size):
+        margin = self.spawn_clearance
+        return x - margin, y - margin, size + 2 * margin, size + 2 * margin
+
+    def _pick_spawn(self, rng, left, right, size, taken):
+        # 在[left, right)范围内找一个出生区不出界、也不与已有出生区重叠的位置
+        margin = self.spawn_clearance
+        low_x, high_x = max(left, margin), min(right, self.width - margin) - size
+        low_y, high_y = margin, self.height - margin - size
+        if low_x > high_x or low_y > high_y:
+            return None
+        for _ in range(20):
+            x, y = rng.randint(low_x, high_x), rng.randint(low_y, high_y)
+            zone = self._spawn_zone(x, y, size)
+            if not any(_overlaps(*zone, *other) for other in taken):
+                return x, y
+        return None
+
+    def candidate(self, seed):
+        """由seed确定地生成一个候选布局，返回地图描述dict（未经验证）"""
+        rng = random.Random(seed)
+        cell = NAV_CELL_SIZE
+        # 先定出生点：玩家在左侧三分之一，机器人在右半场
+        zones = []
+        player_spawn = self._pick_spawn(rng, 0, self.width // 3, PLAYER_TANK_SIZE, zones)
+        if player_spawn is None:
+            player_spawn = (self.spawn_clearance, self.height // 2)
+        zones.append(self._spawn_zone(*player_spawn, PLAYER_TANK_SIZE))
+        robot_spawns = []
+        for _ in range(self.robot_count):
+            spawn = self._pick_spawn(rng, self.width // 2, self.width, ROBOT_TANK_SIZE, zones)
+            if spawn is None:
+                spawn = robot_spawns[-1] if robot_spawns else (self.width - self.spawn_clearance - ROBOT_TANK_SIZE,
+                                                               self.height // 2)
+            robot_spawns.append(spawn)
+            zones.append(self._spawn_zone(*spawn, ROBOT_TANK_SIZE))
+
+        # 随机放置对齐格子的矩形，避开出生区，直到覆盖面积达到密度要求
+        # 障碍物对齐格子，与出生区相交等价于占用了与出生区相交的格子，用位与判断
+        reserved = 0
+        for zone_x, zone_y, zone_w, zone_h in zones:
+            reserved |= self._box_mask(zone_x, zone_y, zone_w, zone_h, cell // 2)
+        smallest, largest = self.box_cells
+        width_choices = min(largest, self.cols) - smallest + 1
+        height_choices = min(largest, self.rows) - smallest + 1
+        target = int(self.density * self.cols * self.rows)
+        rand = rng.random
+        occupied = 0
+        covered = 0
+        obstacles = []
+        for _ in range(max(1, target) * 4):
+            if covered >= target:
+                break
+            w = smallest + int(rand() * width_choices)
+            h = smallest + int(rand() * height_choices)
+            col = int(rand() * (self.cols - w + 1))
+            row = int(rand() * (self.rows - h + 1))
+            mask = self._box_mask(col * cell, row * cell, w * cell, h * cell, 0)
+            if mask & reserved:
+                continue
+            obstacles.append([col * cell, row * cell, w * cell, h * cell])
+            covered += bin(mask & ~occupied).count('1')
+            occupied |= mask
+
+        return {
+            'name': f"随机地图 {seed}",
+            'seed': seed,
+            'width': self.width,
+            'height': self.height,
+            'obstacles': obstacles,
+            'player_spawn': list(player_spawn),
+            'robot_spawns': [list(spawn) for spawn in robot_spawns],
+            'robot_count': self.robot_count,
+        }
+
+    def check(self, source):
+        """验证地图描述，合格时返回None，否则返回不合格的原因"""
+        obstacles = [tuple(box) for box in source.get('obstacles', ())]
+        player_x, player_y = source['player_spawn']
+        robot_spawns = [tuple(spawn) for spawn in source['robot_spawns']]
+        tanks = [(player_x, player_y, PLAYER_TANK_SIZE)] + [(x, y, ROBOT_TANK_SIZE) for x, y in robot_spawns]
+
+        # 出生区：坦克四周spawn_clearance以内不能有障碍物，坦克本身不能出界或互相重叠
+        for index, (x, y, size) in enumerate(tanks):
+            if x < 0 or y < 0 or x + size > self.width or y + size > self.height:
+                return '出生点出界'
+            zone = self._spawn_zone(x, y, size)
+            for box in obstacles:
+                if _overlaps(*zone, *box):
+                    return '出生区有障碍物'
+            for other_x, other_y, other_size in tanks[:index]:
+                if _overlaps(x, y, size, size, other_x, other_y, other_size, other_size):
+                    return '出生点重叠'
+
+        # 可达性：从玩家出生点所在格子开始，每次向四个方向扩展一格，直到覆盖所有机器人出生点
+        blocked = self._border
+        for box in obstacles:
+            blocked |= self._box_mask(*box, NAV_CLEARANCE)
+        free = self._full & ~blocked
+        reach = self._cell_bit(player_x + PLAYER_TANK_SIZE // 2, player_y + PLAYER_TANK_SIZE // 2)
+        if not reach & free:
+            return '出生点不可通行'
+        targets = 0
+        for x, y in robot_spawns:
+            targets |= self._cell_bit(x + ROBOT_TANK_SIZE // 2, y + ROBOT_TANK_SIZE // 2)
+        if targets & blocked:
+            return '出生点不可通行'
+        cols = self.cols
+        not_first_col, not_last_col = self._not_first_col, self._not_last_col
+        while reach & targets != targets:
+            grown = (reach | ((reach << 1) & not_first_col) | ((reach >> 1) & not_last_col) |
+                     (reach << cols) | (reach >> cols)) & free
+            if grown == reach:
+                return '出生点之间不连通'
+            reach = grown
+        return None
+
+    def generate(self):
+        """依次尝试候选布局，返回第一个合格的地图描述"""
+        for _ in range(self.max_candidates):
+            source = self.candidate(self.random.getrandbits(32))
+            self.candidates += 1
+            reason = self.check(source)
+            if reason is None:
+                return source
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        raise RuntimeError(f"连续{self.max_candidates}个候选布局都不合格，请降低障碍物密度")
+
+    def generate_map(self):
+        """生成一张合格的地图并编译成GameMap"""
+        return parse_map(compile_map(self.generate()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成随机地图")
+    parser.add_argument('output', nargs='?', help="输出目录，每张地图写成一个JSON文件")
+    parser.add_argument('--count', type=int, default=1, help="生成的地图数")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--density', type=float, default=ARENA_DENSITY, help="障碍物覆盖面积的占比")
+    parser.add_argument('--robots', type=int, default=1, help="机器人数量（出生点个数）")
+    parser.add_argument('--size', type=int, nargs=2, default=(SCREEN_WIDTH, SCREEN_HEIGHT),
+                        metavar=('WIDTH', 'HEIGHT'), help="地图大小（像素）")
+    parser.add_argument('--bench', type=int, default=0, help="只测量生成和验证候选布局的速度，不写文件")
+    args = parser.parse_args(argv)
+
+    generator = ArenaGenerator(args.size[0], args.size[1], args.density, args.robots, args.seed)
+    if args.bench:
+        seeds = [generator.random.getrandbits(32) for _ in range(args.bench)]
+        start = time.perf_counter()
+        sources = [generator.candidate(seed) for seed in seeds]
+        generated = time.perf_counter()
+        accepted = sum(generator.check(source) is None for source in sources)
+        checked = time.perf_counter()
+        print(f"生成 {args.bench} 个候选: {args.bench / (generated - start):.0f} 个/秒，"
+              f"验证: {args.bench / (checked - generated):.0f} 个/秒，合格 {accepted / args.bench:.1%}")
+        return
+    if not args.output:
+        parser.error("需要指定输出目录")
+
+    os.makedirs(args.output, exist_ok=True)
+    for _ in range(args.count):
+        source = generator.generate()
+        path = os.path.join(args.output, f"arena_{source['seed']}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(source, f, ensure_ascii=False, indent=4)
+        print(f"已生成: {path}（{len(source['obstacles'])} 个障碍物）")
+    print(f"共尝试 {generator.candidates} 个候选布局，不合格: {generator.rejected or '无'}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,6 +1,106 @@
 import pygame
 import os
 
+# 同时播放的声道数上限
+MAX_VOICES = 8
+
+# 音效优先级，数值大的可以抢占数值小的声道
+SOUND_PRIORITIES = {
+    'shoot': 1,
+    'deflect': 1,
+    'missile': 2,
+    'explosion': 3,
+    'tank_move': 4,
+}
+
+# 同一音效的合并窗口（毫秒），窗口内重复的播放请求合并为一次
+SOUND_COOLDOWNS_MS = {
+    'shoot': 40,
+    'deflect': 40,
+    'missile': 40,
+    'explosion': 60,
+    'tank_move': 0,
+}
+
+
+class VoiceMixer:
+    """固定声道数的混音层
+
+    同一音效在合并窗口内只播放一次；没有空闲声道时抢占优先级不高于新音效的声道，
+    先选优先级最低的，其次音量最小的，再次最早开始的；没有可抢占的声道时丢弃。
+    无论同时发生多少事件，声道数和每帧的播放次数都有上限。
+    """
+    
+    def __init__(self, voices=MAX_VOICES, priorities=SOUND_PRIORITIES, cooldowns=SOUND_COOLDOWNS_MS,
+                 clock=pygame.time.get_ticks):
+        pygame.mixer.set_num_channels(voices)
+        self.channels = [pygame.mixer.Channel(i) for i in range(voices)]
+        self.voices = [None] * voices  # 每个声道最近播放的(音效名, 优先级, 音量, 开始时间)
+        self.priorities = priorities
+        self.cooldowns = cooldowns
+        self.clock = clock
+        self.last_played = {}
+        self.played = 0
+        self.merged = 0
+        self.stolen = 0
+        self.dropped = 0
+    
+    def play(self, name, sound):
+        now = self.clock()
+        last = self.last_played.get(name)
+        if last is not None and now - last < self.cooldowns.get(name, 0):
+            self.merged += 1
+            return None
+        # 被丢弃的请求也开启合并窗口，同一波重复请求不再逐个寻找声道
+        self.last_played[name] = now
+        
+        priority = self.priorities.get(name, 0)
+        index = self._free_voice()
+        if index is None:
+            index = self._steal_voice(priority)
+            if index is None:
+                self.dropped += 1
+                return None
+            self.stolen += 1
+        
+        channel = self.channels[index]
+        channel.play(sound)
+        self.voices[index] = (name, priority, sound.get_volume(), now)
+        self.played += 1
+        return channel
+    
+    def stop(self, name):
+        for index, voice in enumerate(self.voices):
+            if voice is not None and voice[0] == name:
+                self.channels[index].stop()
+                self.voices[index] = None
+    
+    def _free_voice(self):
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return index
+        return None
+    
+    def _steal_voice(self, priority):
+        best = None
+        best_key = None
+        for index, voice in enumerate(self.voices):
+            if voice is None or voice[1] > priority:
+                continue
+            key = (voice[1], voice[2], voice[3])
+            if best_key is None or key < best_key:
+                best, best_key = index, key
+        return best
+    
+    def stats(self):
+        return {
+            'played': self.played,
+            'merged': self.merged,
+            'stolen': self.stolen,
+            'dropped': self.dropped,
+        }
+
+
 class SoundManager:
     def __init__(self):
         # 初始化pygame混音器
@@ -11,6 +111,9 @@ class SoundManager:
         
         # 加载音效
         self.load_sounds()
+        
+        # 所有音效经过混音层播放，限制声道数
+        self.mixer = VoiceMixer()
     
     def get_asset_path(self, filename):
         return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', filename)
@@ -158,9 +261,24 @@ class SoundManager:
     def play_sound(self, sound_name):
         # 播放指定的音效
         if sound_name in self.sounds:
-            self.sounds[sound_name].play()
+            self.mixer.play(sound_name, self.sounds[sound_name])
     
     def stop_sound(self, sound_name):
         # 停止指定的音效
         if sound_name in self.sounds:
-            self.sounds[sound_name].stop()
\ No newline at end of file
+            self.mixer.stop(sound_name)
+    
+    def stats(self):
+        return self.mixer.stats()
+
+
+class NullSoundManager:
+    # 无声的音效管理器，用于无窗口的模拟和训练，不初始化混音器
+    def play_sound(self, sound_name):
+        pass
+    
+    def stop_sound(self, sound_name):
+        pass
+    
+    def stats(self):
+        return {}
@@ -0,0 +1,146 @@
+# 机器人程序接口
+# 比赛中的每辆坦克由一个机器人程序控制：每步收到一份只读的观测，返回一个动作。
+# 本模块只依赖标准库，机器人程序在单独的进程中运行，不需要加载游戏和pygame
+
+import importlib
+import math
+import random
+from collections import namedtuple
+
+# 移动方向 0: 不动, 1: 上, 2: 右, 3: 下, 4: 左（与训练环境的动作编码相同）
+MOVE_NONE, MOVE_UP, MOVE_RIGHT, MOVE_DOWN, MOVE_LEFT = range(5)
+
+# 动作：移动方向, 是否发射炮弹, 是否发射导弹
+Action = namedtuple('Action', 'move fire missile')
+NOOP = Action(MOVE_NONE, False, False)
+
+# 对局开始时的固定信息：世界大小、障碍物矩形(x, y, 宽, 高)、己方阵营、每秒模拟步数
+MatchInfo = namedtuple('MatchInfo', 'world_width world_height obstacles team sim_rate')
+# 坦克的中心位置、方向(0上 1右 2下 3左)、生命值，以及炮弹/导弹是否冷却完毕
+TankView = namedtuple('TankView', 'entity_id x y direction health bullet_ready missile_ready')
+# 弹药的中心位置、速度、是否导弹、是否敌方发射
+ProjectileView = namedtuple('ProjectileView', 'x y dx dy is_missile hostile')
+# 每一步的观测：模拟步数、自己、敌方坦克、场上弹药
+Observation = namedtuple('Observation', 'tick me enemies projectiles')
+
+
+class Bot:
+    """机器人程序的基类
+
+    reset()在每场对局开始时调用一次，act()每步调用一次并返回Action。
+    act()超出每步的CPU预算时，这一步按不动处理，结果被丢弃。
+    """
+
+    name = 'bot'
+
+    def reset(self, info):
+        self.info = info
+
+    def act(self, observation):
+        return NOOP
+
+
+class IdleBot(Bot):
+    # 原地不动，用作基准
+    name = 'idle'
+
+
+class RandomBot(Bot):
+    # 每隔一段时间随机换方向，随机开火
+    name = 'random'
+
+    def reset(self, info):
+        super().reset(info)
+        self.move = MOVE_NONE
+        self.random = random.Random()
+
+    def act(self, observation):
+        if observation.tick % 30 == 0:
+            self.move = self.random.randint(MOVE_NONE, MOVE_LEFT)
+        return Action(self.move, self.random.random() < 0.1, self.random.random() < 0.02)
+
+
+class ChaserBot(Bot):
+    # 向最近的敌人靠近，与敌人在同一行或同一列时转向开火；被挡住时先横向绕开一段
+    name = 'chaser'
+
+    ALIGN_TOLERANCE = 15
+    FIRE_RANGE = 350
+    DETOUR_TICKS = 40
+
+    def reset(self, info):
+        super().reset(info)
+        self.last_position = None
+        self.last_move = MOVE_NONE
+        self.detour = MOVE_NONE
+        self.detour_ticks = 0
+
+    def act(self, observation):
+        action = self.choose(observation)
+        self.last_position = (observation.me.x, observation.me.y)
+        self.last_move = action.move
+        return action
+
+    def clear_shot(self, me, target):
+        # 两者之间的弹道上没有障碍物（已经在同一行或同一列时才调用）
+        left, right = sorted((me.x, target.x))
+        top, bottom = sorted((me.y, target.y))
+        left, top, right, bottom = left - 5, top - 5, right + 5, bottom + 5
+        for x, y, width, height in self.info.obstacles:
+            if x < right and left < x + width and y < bottom and top < y + height:
+                return False
+        return True
+
+    def start_detour(self, blocked_move, tick):
+        # 换到与被挡住的方向垂直的方向绕一段，交替选择绕行的一侧
+        turn = tick // 97 % 2
+        if blocked_move in (MOVE_UP, MOVE_DOWN):
+            self.detour = (MOVE_RIGHT, MOVE_LEFT)[turn]
+        else:
+            self.detour = (MOVE_DOWN, MOVE_UP)[turn]
+        self.detour_ticks = self.DETOUR_TICKS
+
+    def choose(self, observation):
+        me = observation.me
+        if not observation.enemies:
+            return NOOP
+        if self.last_move != MOVE_NONE and self.last_position == (me.x, me.y) and not self.detour_ticks:
+            self.start_detour(self.last_move, observation.tick)  # 上一步想走却没动
+        if self.detour_ticks:
+            self.detour_ticks -= 1
+            return Action(self.detour, False, False)
+        target = min(observation.enemies, key=lambda enemy: (enemy.x - me.x) ** 2 + (enemy.y - me.y) ** 2)
+        dx, dy = target.x - me.x, target.y - me.y
+        distance = math.hypot(dx, dy)
+        aligned = abs(dy) <= self.ALIGN_TOLERANCE or abs(dx) <= self.ALIGN_TOLERANCE
+        if aligned and distance < self.FIRE_RANGE and self.clear_shot(me, target):
+            # 已经对齐且弹道畅通：转向目标开火
+            if abs(dy) <= self.ALIGN_TOLERANCE:
+                facing = MOVE_RIGHT if dx > 0 else MOVE_LEFT
+            else:
+                facing = MOVE_DOWN if dy > 0 else MOVE_UP
+            if me.direction == facing - 1:
+                return Action(MOVE_NONE, me.bullet_ready, me.missile_ready)
+            return Action(facing, False, False)
+        # 沿差得多的轴靠近，被障碍物挡住时由绕行处理
+        if abs(dx) >= abs(dy):
+            return Action(MOVE_RIGHT if dx > 0 else MOVE_LEFT, False, False)
+        return Action(MOVE_DOWN if dy > 0 else MOVE_UP, False, False)
+
+
+# 内置的机器人程序，比赛时也可以用"模块:类名"指定第三方程序
+BUILTIN_BOTS = {
+    'idle': 'bots:IdleBot',
+    'random': 'bots:RandomBot',
+    'chaser': 'bots:ChaserBot',
+}
+
+
+def load_bot(spec):
+    """按"模块:类名"创建机器人程序"""
+    spec = BUILTIN_BOTS.get(spec, spec)
+    module_name, _, class_name = spec.partition(':')
+    if not class_name:
+        raise ValueError(f"机器人程序应写成 模块:类名 的形式: {spec}")
+    bot_class = getattr(importlib.import_module(module_name), class_name)
+    return bot_class()
@@ -0,0 +1,127 @@
+# 碰撞检测模块
+# 扫掠AABB：按一步内的整段移动计算最早的碰撞时刻，移动距离再大也不会穿过薄障碍物
+# 需要像素级精度时，在矩形筛选之后再用遮罩检测
+
+import math
+
+import pygame
+
+
+def sweep_time(rect, dx, dy, target):
+    """rect沿(dx, dy)移动时与target开始重叠的时刻
+
+    时刻以整步移动的比例表示，范围[0, 1)；起点已经重叠时返回0，本步内不会重叠时返回None。
+    重叠的判定与pygame.Rect.colliderect一致，边缘刚好接触不算碰撞。
+    """
+    if dx > 0:
+        entry_x = (target.left - rect.right) / dx
+        exit_x = (target.right - rect.left) / dx
+    elif dx < 0:
+        entry_x = (target.right - rect.left) / dx
+        exit_x = (target.left - rect.right) / dx
+    elif rect.left < target.right and target.left < rect.right:
+        entry_x, exit_x = -math.inf, math.inf
+    else:
+        return None
+
+    if dy > 0:
+        entry_y = (target.top - rect.bottom) / dy
+        exit_y = (target.bottom - rect.top) / dy
+    elif dy < 0:
+        entry_y = (target.bottom - rect.top) / dy
+        exit_y = (target.top - rect.bottom) / dy
+    elif rect.top < target.bottom and target.top < rect.bottom:
+        entry_y, exit_y = -math.inf, math.inf
+    else:
+        return None
+
+    entry = max(entry_x, entry_y)
+    if entry >= min(exit_x, exit_y) or entry >= 1 or min(exit_x, exit_y) <= 0:
+        return None
+    return max(entry, 0.0)
+
+
+def first_hit(rect, dx, dy, targets, skip_overlapping=False):
+    """在targets（Rect列表）中找出rect沿(dx, dy)移动时最早碰到的一个
+
+    返回(时刻, 下标)，没有碰撞时返回None。先用整段移动的包围盒筛选候选，
+    只对包围盒相交的目标做扫掠计算。skip_overlapping为True时忽略起点已经重叠的目标。
+    """
+    bounds = rect.union(rect.move(dx, dy))
+    best = None
+    for index in bounds.collidelistall(targets):
+        if skip_overlapping and rect.colliderect(targets[index]):
+            continue
+        time = sweep_time(rect, dx, dy, targets[index])
+        if time is not None and (best is None or time < best[0]):
+            best = (time, index)
+    return best
+
+
+# 图像 -> 碰撞遮罩；图像本身已被缓存共享，遮罩随之共享
+_mask_cache = {}
+
+
+def mask_for(image):
+    mask = _mask_cache.get(image)
+    if mask is None:
+        mask = pygame.mask.from_surface(image)
+        _mask_cache[image] = mask
+    return mask
+
+
+class MaskCollider:
+    """像素级的扫掠碰撞检测
+
+    先用矩形扫掠筛选，只有矩形在本步内相交的目标才沿路径逐像素推进，
+    检测两个遮罩是否重叠，透明的边角不算命中。
+    rect_tests/rect_hits是矩形筛选的次数和通过数，mask_tests/mask_hits是遮罩检测的次数和命中数。
+    """
+
+    def __init__(self):
+        self.rect_tests = 0
+        self.rect_hits = 0
+        self.mask_tests = 0
+        self.mask_hits = 0
+
+    def first_hit(self, rect, dx, dy, mask, target_rects, target_masks):
+        """返回(时刻, 下标)，没有像素级碰撞时返回None"""
+        bounds = rect.union(rect.move(dx, dy))
+        best = None
+        for index in bounds.collidelistall(target_rects):
+            self.rect_tests += 1
+            target = target_rects[index]
+            time = sweep_time(rect, dx, dy, target)
+            if time is None:
+                continue
+            self.rect_hits += 1
+            time = self._mask_time(rect, dx, dy, mask, target, target_masks[index], time)
+            if time is not None and (best is None or time < best[0]):
+                best = (time, index)
+        return best
+
+    def _mask_time(self, rect, dx, dy, mask, target, target_mask, start_time):
+        # 从矩形开始相交的位置起每次推进一个像素
+        steps = max(abs(dx), abs(dy))
+        if steps == 0:
+            self.mask_tests += 1
+            if target_mask.overlap(mask, (rect.x - target.x, rect.y - target.y)):
+                self.mask_hits += 1
+                return 0.0
+            return None
+        for step in range(int(start_time * steps), steps + 1):
+            time = step / steps
+            self.mask_tests += 1
+            offset = (rect.x + round(dx * time) - target.x, rect.y + round(dy * time) - target.y)
+            if target_mask.overlap(mask, offset):
+                self.mask_hits += 1
+                return time
+        return None
+
+    def stats(self):
+        return {
+            'rect_tests': self.rect_tests,
+            'rect_hits': self.rect_hits,
+            'mask_tests': self.mask_tests,
+            'mask_hits': self.mask_hits,
+        }
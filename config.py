@@ -45,4 +45,75 @@ MISSILE_COOLDOWN = 90
 # 游戏设置
 DEFAULT_ROBOT_COUNT = 4
 MAX_ROBOT_COUNT = 8
-MIN_ROBOT_COUNT = 1
\ No newline at end of file
+MIN_ROBOT_COUNT = 1
+
+# 导航设置
+NAV_CELL_SIZE = 20  # 流场格子大小（像素）
+NAV_CLEARANCE = 20  # 导航时与障碍物保持的距离，等于坦克半径（像素）
+LOS_CELL_SIZE = 10  # 视线查询格子大小（像素）
+LOS_MARGIN = 5  # 视线查询时障碍物膨胀的距离，等于炮弹半径（像素）
+FLOW_BUILD_BUDGET = 4096  # 每步模拟最多扩展的流场格子数，大地图的流场分几步算完
+FLOW_CACHE_SIZE = 64  # 每场对局最多缓存的流场数
+SHARED_GRID_CACHE_SIZE = 8  # 按障碍物布局共用的导航和视线栅格最多保留几份
+
+# AI调度设置
+AI_THINK_INTERVAL = 3  # 机器人思考间隔（帧数）
+AI_FAR_THINK_INTERVAL = 12  # 远离玩家时的思考间隔（帧数）
+AI_FAR_DISTANCE = 400  # 超过该距离视为远离玩家（像素）
+AI_FRAME_BUDGET_MS = 2.0  # 每帧AI思考的时间预算（毫秒）
+AI_BATCH_DECISIONS = True  # 使用numpy批量计算所有机器人的AI决策
+
+# 世界与渲染设置
+TILE_SIZE = 40  # 地图瓦片大小（像素）
+CHUNK_TILES = 8  # 每个地图区块的边长（瓦片数）
+ACTIVE_MARGIN = 200  # 视口外仍按全精度模拟的范围（像素）
+OFFSCREEN_UPDATE_INTERVAL = 4  # 活动范围外的机器人每隔几帧更新一次
+
+# 地图设置
+DEFAULT_MAP = 'maps/default.json'  # 默认地图（相对于游戏目录）
+
+# 随机地图设置
+ARENA_DENSITY = 0.25  # 障碍物覆盖面积的占比
+ARENA_BOX_CELLS = (1, 6)  # 障碍物边长的范围（导航格子数）
+ARENA_SPAWN_CLEARANCE = 40  # 出生点坦克四周必须空出的距离（像素）
+ARENA_MAX_CANDIDATES = 200  # 生成一张合格地图最多尝试的候选布局数
+
+# 画质调节设置
+QUALITY_WINDOW = 30  # 计算平均帧耗时的帧数
+QUALITY_DOWNGRADE_RATIO = 0.9  # 平均帧耗时超过预算的该比例时降低画质
+QUALITY_UPGRADE_RATIO = 0.6  # 平均帧耗时低于预算的该比例时允许提高画质
+QUALITY_UPGRADE_DELAY = 120  # 持续有余量多少帧后才提高一级画质
+
+# 模拟与渲染设置
+SIM_RATE = 60  # 固定的模拟频率（每秒步数）
+MAX_SIM_STEPS_PER_FRAME = 5  # 正常速度下每个渲染帧最多追赶的模拟步数
+FAST_FORWARD_SPEEDS = (1, 4, 16, 0)  # 按F键循环切换的快进倍率，0表示不限速
+UNBOUNDED_FRAME_MS = 15.0  # 不限速时每个渲染帧用于模拟的时间（毫秒）
+SPLIT_SIMULATION = False  # 是否把模拟放到单独的进程中，通过共享内存把状态传给渲染进程
+TIMER_WHEEL_BITS = 6  # 计时轮每层的槽数为2的这么多次方
+TIMER_WHEEL_LEVELS = 4  # 计时轮层数，各层合起来覆盖 2**(6*4) 步，更远的计时器每转一圈重新分配
+INPUT_LATENCY_SAMPLES = 1024  # 输入延迟统计保留最近多少次按键
+
+# 日志设置
+LOG_LEVEL = 'INFO'  # DEBUG/INFO/WARNING/ERROR，可以用环境变量TANK_LOG_LEVEL覆盖
+LOG_CAPACITY = 4096  # 环形缓冲区保存的记录数
+LOG_FLUSH_INTERVAL = 0.1  # 后台线程写出日志的间隔（秒）
+CRASH_LOG = 'crash.log'  # 崩溃时转储日志的文件（相对于游戏目录）
+
+# 遥测设置
+TELEMETRY_DIR = 'telemetry'  # 对局事件文件的目录（相对于游戏目录），为空时不记录；可以用环境变量TANK_TELEMETRY覆盖
+TELEMETRY_CHUNK_EVENTS = 4096  # 攒够多少条事件压缩写出一个数据块
+TELEMETRY_COMPRESS_LEVEL = 1  # zlib压缩级别，越低越快
+
+# 对局历史设置
+MATCH_HISTORY_DB = 'match_history.db'  # 对局历史数据库（相对于游戏目录），为空时不记录；可以用环境变量TANK_HISTORY覆盖
+HISTORY_BATCH_SIZE = 256  # 后台线程每个事务最多写入的对局数
+HISTORY_FLUSH_INTERVAL = 1.0  # 不足一批时最多等待多久写入（秒）
+
+# 机器人程序比赛设置
+BOT_TICK_BUDGET_MS = 5.0  # 机器人程序每步的CPU预算（毫秒），超出时这一步按不动处理
+BOT_IPC_MARGIN_MS = 2.0  # 每步等待回答时在预算之外留给进程间通信的时间（毫秒）
+BOT_START_TIMEOUT = 10.0  # 等待机器人程序进程启动和初始化的时间（秒）
+MATCH_MAX_TICKS = 3600  # 每场对局的最大步数，到时为平局
+ELO_START = 1500  # 初始等级分
+ELO_K = 32  # 每场对局等级分调整的幅度
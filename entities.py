@@ -0,0 +1,38 @@
+# 实体模块
+# 实体用一组组件名描述自己具有哪些能力；系统按组件组合查询实体，
+# 查询结果缓存为精灵组，实体生成时加入所有匹配的组，被kill()时由pygame自动移除
+
+import itertools
+
+import pygame
+
+
+class EntityStore:
+    """按组件组合缓存查询结果的实体存储
+
+    每个实体的components是组件名的frozenset。query(*components)返回同时具有这些组件的
+    实体组成的精灵组：第一次查询时从现有实体中筛选一次，之后随实体生成和消亡增量更新，
+    系统每帧直接遍历结果，不必再逐个判断实体的类型。
+    组内的顺序就是实体生成的顺序。生成时为实体分配从1开始递增的entity_id。
+    """
+
+    def __init__(self):
+        self.entities = pygame.sprite.Group()
+        self._queries = {frozenset(): self.entities}
+        self._ids = itertools.count(1)
+
+    def spawn(self, entity):
+        entity.entity_id = next(self._ids)
+        components = entity.components
+        for key, group in self._queries.items():
+            if key <= components:
+                group.add(entity)
+        return entity
+
+    def query(self, *components):
+        key = frozenset(components)
+        group = self._queries.get(key)
+        if group is None:
+            group = pygame.sprite.Group([entity for entity in self.entities if key <= entity.components])
+            self._queries[key] = group
+        return group
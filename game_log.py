@@ -0,0 +1,150 @@
+# 日志模块
+# 分级日志：关闭的级别直接返回，不格式化消息；记录先放进内存中的环形缓冲区，
+# 由后台线程成批写到终端，游戏主循环不会因为终端输出而卡顿
+
+import atexit
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from config import LOG_LEVEL, LOG_CAPACITY, LOG_FLUSH_INTERVAL
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+
+def level_from_name(name):
+    for level, level_name in LEVEL_NAMES.items():
+        if level_name == str(name).upper():
+            return level
+    raise ValueError(f"未知的日志级别: {name}")
+
+
+class RingLog:
+    """带环形缓冲区的分级日志
+
+    消息使用%格式，参数在写出时才格式化，被过滤掉的消息没有格式化开销。
+    pending保存等待写出的记录，history保存最近capacity条记录，崩溃时可以转储到文件。
+    两者都有长度上限，写出跟不上时丢弃最旧的记录，不会阻塞调用方。
+    """
+
+    def __init__(self, level=INFO, capacity=4096, flush_interval=0.1, stream=None):
+        self.level = level
+        self.pending = deque(maxlen=capacity)
+        self.history = deque(maxlen=capacity)
+        self.flush_interval = flush_interval
+        self.stream = stream  # 为None时写到当前的sys.stdout
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def set_level(self, level):
+        self.level = level
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, message, *args):
+        if level < self.level:
+            return
+        record = (time.time(), level, message, args)
+        self.pending.append(record)
+        self.history.append(record)
+        if self._thread is None:
+            self._start()
+
+    def debug(self, message, *args):
+        if DEBUG >= self.level:
+            self.log(DEBUG, message, *args)
+
+    def info(self, message, *args):
+        if INFO >= self.level:
+            self.log(INFO, message, *args)
+
+    def warning(self, message, *args):
+        if WARNING >= self.level:
+            self.log(WARNING, message, *args)
+
+    def error(self, message, *args):
+        if ERROR >= self.level:
+            self.log(ERROR, message, *args)
+
+    def exception(self, message, *args):
+        # 记录错误和当前正在处理的异常堆栈
+        if ERROR >= self.level:
+            self.log(ERROR, '%s\n%s', message % args if args else message, traceback.format_exc().rstrip())
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='game-log', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    @staticmethod
+    def format(record, with_time=False):
+        created, level, message, args = record
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError):
+                message = f"{message} {args!r}"
+        line = f"[{LEVEL_NAMES.get(level, level)}] {message}"
+        if with_time:
+            line = time.strftime('%H:%M:%S', time.localtime(created)) + f".{int(created % 1 * 1000):03d} " + line
+        return line
+
+    def flush(self):
+        """把等待中的记录一次写出（后台线程定期调用，退出时也会调用）"""
+        with self._lock:
+            lines = []
+            while True:
+                try:
+                    record = self.pending.popleft()
+                except IndexError:
+                    break
+                lines.append(self.format(record))
+            if lines:
+                stream = self.stream or sys.stdout
+                try:
+                    stream.write('\n'.join(lines) + '\n')
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+
+    def dump(self, path):
+        """把最近的记录（包括已经写出的）带时间戳写到文件，返回文件路径"""
+        lines = [self.format(record, with_time=True) for record in list(self.history)]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def install_excepthook(self, path):
+        # 未捕获的异常先记录并转储缓冲区，再交给原来的处理函数
+        previous = sys.excepthook
+
+        def hook(exc_type, exc, tb):
+            self.log(ERROR, '未捕获的异常:\n%s', ''.join(traceback.format_exception(exc_type, exc, tb)).rstrip())
+            try:
+                self.dump(path)
+            except OSError:
+                pass
+            self.flush()
+            previous(exc_type, exc, tb)
+
+        sys.excepthook = hook
+
+
+# 全局日志，级别可以用环境变量TANK_LOG_LEVEL覆盖配置
+log = RingLog(level_from_name(os.environ.get('TANK_LOG_LEVEL', LOG_LEVEL)), LOG_CAPACITY, LOG_FLUSH_INTERVAL)
@@ -0,0 +1,261 @@
+# 地图模块
+# 地图用JSON文件描述，编译成二进制文件后运行时一次读入，不再解析任何源文件
+#
+# 二进制格式（小端）：
+#   文件头 MAP_HEADER
+#   地图名称（UTF-8）
+#   合并后的碰撞盒 box_count * 4 个int32 (x, y, 宽, 高)
+#   机器人出生点 spawn_count * 2 个int32 (x, y)
+#   导航栅格 nav_cols * nav_rows 字节
+#   视线栅格 los_cols * los_rows 字节
+
+import argparse
+import json
+import os
+import struct
+import sys
+from array import array
+
+from config import NAV_CELL_SIZE, NAV_CLEARANCE, LOS_CELL_SIZE, LOS_MARGIN
+from navigation import NavGrid, LineOfSight
+
+MAP_MAGIC = b'TANKMAP\x00'
+MAP_VERSION = 1
+MAP_HEADER = struct.Struct('<8sHH17i')
+COMPILED_SUFFIX = '.tkmap'
+
+
+class GameMap:
+    """编译好的地图
+
+    导航栅格和视线栅格直接引用文件数据，加载时不需要遍历障碍物。
+    """
+
+    def __init__(self, name, width, height, boxes, player_spawn, robot_spawns, robot_count,
+                 nav_grid, line_of_sight):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.boxes = boxes
+        self.player_spawn = player_spawn
+        self.robot_spawns = robot_spawns
+        self.robot_count = robot_count
+        self.nav_grid = nav_grid
+        self.line_of_sight = line_of_sight
+
+
+def merge_boxes(boxes):
+    """合并碰撞盒
+
+    去掉重复的盒子，然后反复合并同一行上高度相同且相接的盒子、
+    同一列上宽度相同且相接的盒子，直到无法再合并。
+    """
+    boxes = sorted(set(tuple(box) for box in boxes))
+    changed = True
+    while changed:
+        changed = False
+        # 水平方向合并
+        boxes.sort(key=lambda box: (box[1], box[3], box[0]))
+        merged = []
+        for x, y, w, h in boxes:
+            if merged:
+                last_x, last_y, last_w, last_h = merged[-1]
+                if last_y == y and last_h == h and x <= last_x + last_w:
+                    merged[-1] = (last_x, y, max(last_x + last_w, x + w) - last_x, h)
+                    changed = True
+                    continue
+            merged.append((x, y, w, h))
+        # 垂直方向合并
+        merged.sort(key=lambda box: (box[0], box[2], box[1]))
+        boxes = []
+        for x, y, w, h in merged:
+            if boxes:
+                last_x, last_y, last_w, last_h = boxes[-1]
+                if last_x == x and last_w == w and y <= last_y + last_h:
+                    boxes[-1] = (x, last_y, w, max(last_y + last_h, y + h) - last_y)
+                    changed = True
+                    continue
+            boxes.append((x, y, w, h))
+    return boxes
+
+
+def _int32_bytes(values):
+    data = array('i', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _int32_values(view):
+    data = array('i')
+    data.frombytes(view)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+
+def compile_map(source):
+    """把地图描述（dict）编译成二进制数据"""
+    width = int(source['width'])
+    height = int(source['height'])
+    boxes = merge_boxes(source.get('obstacles', []))
+    player_x, player_y = source.get('player_spawn', (100, 300))
+    robot_spawns = [tuple(spawn) for spawn in source.get('robot_spawns', [(600, 300)])]
+    robot_count = int(source.get('robot_count', len(robot_spawns)))
+    name = source.get('name', '').encode('utf-8')
+
+    # 编译时完成所有栅格化，运行时直接使用结果
+    nav_grid = NavGrid(width, height, NAV_CELL_SIZE, boxes, NAV_CLEARANCE)
+    line_of_sight = LineOfSight(width, height, LOS_CELL_SIZE, boxes, LOS_MARGIN)
+
+    header = MAP_HEADER.pack(
+        MAP_MAGIC, MAP_VERSION, len(name), width, height,
+        NAV_CELL_SIZE, NAV_CLEARANCE, nav_grid.cols, nav_grid.rows,
+        LOS_CELL_SIZE, LOS_MARGIN, line_of_sight.cols, line_of_sight.rows,
+        int(player_x), int(player_y), robot_count, len(boxes), len(robot_spawns),
+        0, 0)
+    return b''.join((
+        header,
+        name,
+        _int32_bytes(value for box in boxes for value in box),
+        _int32_bytes(int(value) for spawn in robot_spawns for value in spawn),
+        bytes(nav_grid.blocked),
+        bytes(line_of_sight.occupied),
+    ))
+
+
+def parse_map(data):
+    """从二进制数据构建GameMap，栅格直接引用data的切片，不做复制"""
+    view = memoryview(data)
+    if len(view) < MAP_HEADER.size:
+        raise ValueError("地图文件不完整")
+    (magic, version, name_length, width, height,
+     nav_cell, nav_clearance, nav_cols, nav_rows,
+     los_cell, los_margin, los_cols, los_rows,
+     player_x, player_y, robot_count, box_count, spawn_count,
+     _reserved1, _reserved2) = MAP_HEADER.unpack_from(view)
+    if magic != MAP_MAGIC or version != MAP_VERSION:
+        raise ValueError("不是有效的地图文件")
+    if (nav_cell, nav_clearance, los_cell, los_margin) != (NAV_CELL_SIZE, NAV_CLEARANCE,
+                                                          LOS_CELL_SIZE, LOS_MARGIN):
+        raise ValueError("地图文件的导航参数与当前配置不一致，请重新编译")
+    # 各段的长度都由文件头给出，先核对总长度，截断或损坏的文件在这里就报错
+    if (min(width, height, box_count, spawn_count) < 0 or
+            (nav_cols, nav_rows) != (max(1, width // nav_cell), max(1, height // nav_cell)) or
+            (los_cols, los_rows) != (max(1, width // los_cell), max(1, height // los_cell))):
+        raise ValueError("地图文件头已损坏")
+    expected = (MAP_HEADER.size + name_length + box_count * 16 + spawn_count * 8 +
+                nav_cols * nav_rows + los_cols * los_rows)
+    if len(view) != expected:
+        raise ValueError(f"地图文件长度不正确：应为{expected}字节，实际{len(view)}字节")
+
+    offset = MAP_HEADER.size
+    name = bytes(view[offset:offset + name_length]).decode('utf-8')
+    offset += name_length
+    box_values = _int32_values(view[offset:offset + box_count * 16])
+    offset += box_count * 16
+    spawn_values = _int32_values(view[offset:offset + spawn_count * 8])
+    offset += spawn_count * 8
+    nav_blocked = view[offset:offset + nav_cols * nav_rows]
+    offset += nav_cols * nav_rows
+    los_occupied = view[offset:offset + los_cols * los_rows]
+
+    boxes = [tuple(box_values[i:i + 4]) for i in range(0, len(box_values), 4)]
+    robot_spawns = [tuple(spawn_values[i:i + 2]) for i in range(0, len(spawn_values), 2)]
+    nav_grid = NavGrid(width, height, nav_cell, blocked=nav_blocked)
+    line_of_sight = LineOfSight(width, height, los_cell, occupied=los_occupied)
+    return GameMap(name, width, height, boxes, (player_x, player_y), robot_spawns, robot_count,
+                   nav_grid, line_of_sight)
+
+
+def compiled_path(source_path):
+    return os.path.splitext(source_path)[0] + COMPILED_SUFFIX
+
+
+def write_compiled(path, data):
+    # 先写到同目录的临时文件再替换，其他进程同时加载时不会读到写了一半的文件
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def compile_map_file(source_path, output_path=None):
+    with open(source_path, 'r', encoding='utf-8') as f:
+        data = compile_map(json.load(f))
+    output_path = output_path or compiled_path(source_path)
+    write_compiled(output_path, data)
+    return output_path
+
+
+# 已加载的地图，同一进程中的多场对局共用
+_map_cache = {}
+
+
+def load_map(path):
+    """加载地图
+
+    path可以是编译好的.tkmap文件，也可以是JSON源文件；
+    后者在编译结果不存在或已过期时先重新编译。整个文件一次读入内存。
+    """
+    path = os.path.abspath(path)
+    game_map = _map_cache.get(path)
+    if game_map is not None:
+        return game_map
+
+    binary_path = path
+    data = None
+    if not path.endswith(COMPILED_SUFFIX):
+        binary_path = compiled_path(path)
+        if (not os.path.exists(binary_path) or
+                os.path.getmtime(binary_path) < os.path.getmtime(path)):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = compile_map(json.load(f))
+            try:
+                write_compiled(binary_path, data)
+            except OSError:
+                # 目录不可写时只在内存中使用编译结果
+                pass
+
+    if data is None:
+        with open(binary_path, 'rb') as f:
+            data = f.read()
+        try:
+            game_map = parse_map(data)
+        except ValueError:
+            # 配置变化导致编译结果失效时，有源文件就重新编译，并写回编译结果供以后加载
+            if binary_path == path:
+                raise
+            with open(path, 'r', encoding='utf-8') as f:
+                data = compile_map(json.load(f))
+            game_map = parse_map(data)
+            try:
+                write_compiled(binary_path, data)
+            except OSError:
+                pass
+    else:
+        game_map = parse_map(data)
+
+    _map_cache[path] = game_map
+    return game_map
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把JSON地图编译成二进制地图文件")
+    parser.add_argument('sources', nargs='+', help="JSON地图文件")
+    parser.add_argument('-o', '--output', help="输出文件（只编译一个地图时可用）")
+    args = parser.parse_args()
+    if args.output and len(args.sources) > 1:
+        parser.error("编译多个地图时不能指定输出文件")
+    for source in args.sources:
+        output = compile_map_file(source, args.output)
+        print(f"已编译: {source} -> {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# 输入模块
+# 每帧只在模拟之前的一个地方读取输入：帧间等待时收下到达的事件并记下到达时间，
+# 模拟开始前统一取出事件、读取按键状态；同时测量按键从到达到进入模拟、再到画面显示的延迟
+
+import time
+from collections import deque
+
+import pygame
+from pygame.locals import QUIT, KEYDOWN, KEYUP, NOEVENT, K_ESCAPE, K_w, K_a, K_s, K_d, K_SPACE, K_m
+
+# 玩家坦克使用的按键
+CONTROL_KEYS = (K_w, K_a, K_s, K_d, K_SPACE, K_m)
+
+
+class InputLatency:
+    """按键输入延迟统计
+
+    每个控制键的按下或松开事件依次记下到达、被采集、第一次进入模拟和画面显示的时间，
+    显示后把各段延迟放进最近samples条的记录中，按百分位数报告。
+    """
+
+    STAGES = ('采集', '模拟', '显示')
+
+    def __init__(self, samples=1024):
+        self.samples = deque(maxlen=samples)  # (到采集, 到模拟, 到显示)，单位毫秒
+        self._pending = []  # [到达, 采集, 模拟]
+
+    def arrived(self, arrival):
+        self._pending.append([arrival, None, None])
+
+    def sampled(self, now):
+        for event in self._pending:
+            if event[1] is None:
+                event[1] = now
+
+    def simulated(self, now):
+        # 只有在模拟之前已经采集的事件才算进入了这一步
+        for event in self._pending:
+            if event[1] is not None and event[2] is None:
+                event[2] = now
+
+    def presented(self, now):
+        if not self._pending:
+            return
+        waiting = []
+        for arrival, sampled, simulated in self._pending:
+            if simulated is None:
+                waiting.append([arrival, sampled, simulated])  # 这一帧没有执行模拟，等下一帧
+            else:
+                self.samples.append(((sampled - arrival) * 1000, (simulated - arrival) * 1000,
+                                     (now - arrival) * 1000))
+        self._pending = waiting
+
+    def discard_pending(self):
+        self._pending = []
+
+    def percentiles(self, stage, points=(50, 95, 99)):
+        values = sorted(sample[stage] for sample in self.samples)
+        if not values:
+            return None
+        return [values[min(len(values) - 1, len(values) * point // 100)] for point in points] + [values[-1]]
+
+    def report(self):
+        if not self.samples:
+            return "没有记录到按键输入"
+        lines = [f"按键输入延迟，共 {len(self.samples)} 次（毫秒，p50 / p95 / p99 / 最大）"]
+        for stage, name in enumerate(self.STAGES):
+            p50, p95, p99, worst = self.percentiles(stage)
+            lines.append(f"  到达 -> {name}: {p50:.1f} / {p95:.1f} / {p99:.1f} / {worst:.1f}")
+        return '\n'.join(lines)
+
+
+class InputStage:
+    """每帧唯一的输入采集点
+
+    wait_until()在帧间等待的同时收下到达的事件并记下时间；poll()在模拟之前调用，
+    取出本帧的事件并读取按键状态，写入keys（注入玩家坦克的input_keys）。
+    两次采集之间按下又松开的控制键在下一步模拟中仍算按下，短按不会丢失。
+    ESC和关闭窗口设置quit，其余的按键按下事件由poll()返回给调用方处理。
+    """
+
+    def __init__(self, latency=None):
+        self.keys = {key: False for key in CONTROL_KEYS}
+        self.pressed = dict(self.keys)  # 采集时的实际按键状态
+        self.latency = latency
+        self.quit = False
+        self._events = []  # (事件, 到达时间)
+        self._latched = set()  # 已经松开、但还没有进入模拟的短按
+
+    def _receive(self, event, arrival):
+        self._events.append((event, arrival))
+        if self.latency is not None and event.type in (KEYDOWN, KEYUP) and event.key in self.keys:
+            self.latency.arrived(arrival)
+
+    def collect(self):
+        # 收下队列中已有的事件
+        now = time.perf_counter()
+        for event in pygame.event.get():
+            self._receive(event, now)
+
+    def wait_until(self, deadline):
+        """等待到perf_counter()时间deadline，期间事件一到就收下"""
+        while True:
+            remaining = int((deadline - time.perf_counter()) * 1000)
+            if remaining <= 0:
+                break
+            event = pygame.event.wait(remaining)
+            if event.type != NOEVENT:
+                self._receive(event, time.perf_counter())
+        self.collect()
+
+    def poll(self):
+        """模拟之前调用：返回本帧的按键按下事件，更新keys和quit"""
+        self.collect()
+        now = time.perf_counter()
+        state = pygame.key.get_pressed()
+        key_downs = []
+        for event, _ in self._events:
+            if event.type == QUIT:
+                self.quit = True
+            elif event.type == KEYDOWN:
+                if event.key == K_ESCAPE:
+                    self.quit = True
+                elif event.key in self.keys:
+                    self._latched.add(event.key)
+                else:
+                    key_downs.append(event)
+        self._events = []
+        for key in self.keys:
+            self.pressed[key] = bool(state[key])
+            self.keys[key] = self.pressed[key] or key in self._latched
+        if self.latency is not None:
+            self.latency.sampled(now)
+        return key_downs
+
+    def step_done(self):
+        # 每步模拟之后调用：短按已经生效，按键恢复为实际状态
+        if self._latched:
+            for key in self._latched:
+                self.keys[key] = self.pressed[key]
+            self._latched.clear()
+        if self.latency is not None:
+            self.latency.simulated(time.perf_counter())
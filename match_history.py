@@ -0,0 +1,208 @@
+# 对局历史模块
+# 每场结束的对局写入本地SQLite数据库；写入由后台线程成批提交，游戏主循环只把结果放进队列。
+# 查询走单独的连接，按索引统计排行榜和各配置的胜率
+#
+# 用法: python match_history.py [数据库] [leaderboard|winrates|recent] [--source game|training|tournament]
+
+import argparse
+import atexit
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from config import HISTORY_BATCH_SIZE, HISTORY_FLUSH_INTERVAL
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    finished_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    player TEXT NOT NULL,
+    robot TEXT NOT NULL,
+    winner TEXT,
+    ticks INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    map TEXT,
+    robot_count INTEGER NOT NULL,
+    world_width INTEGER NOT NULL,
+    world_height INTEGER NOT NULL,
+    config TEXT NOT NULL,
+    player_shots INTEGER NOT NULL,
+    robot_shots INTEGER NOT NULL,
+    player_hits INTEGER NOT NULL,
+    robot_hits INTEGER NOT NULL,
+    player_deflected INTEGER NOT NULL,
+    robot_deflected INTEGER NOT NULL,
+    damage_dealt INTEGER NOT NULL,
+    damage_taken INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS matches_finished ON matches (finished_at);
+CREATE INDEX IF NOT EXISTS matches_player ON matches (source, player, winner);
+CREATE INDEX IF NOT EXISTS matches_config ON matches (source, config, winner);
+"""
+
+COLUMNS = ('finished_at', 'source', 'player', 'robot', 'winner', 'ticks', 'duration', 'map', 'robot_count',
+           'world_width', 'world_height', 'config', 'player_shots', 'robot_shots', 'player_hits', 'robot_hits',
+           'player_deflected', 'robot_deflected', 'damage_dealt', 'damage_taken')
+INSERT = f"INSERT INTO matches ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+# 每场对局累计的统计项，由Game在对局过程中更新
+STAT_NAMES = ('player_shots', 'robot_shots', 'player_hits', 'robot_hits', 'player_deflected', 'robot_deflected',
+              'damage_dealt', 'damage_taken')
+
+
+def new_match_stats():
+    return dict.fromkeys(STAT_NAMES, 0)
+
+
+def connect(path):
+    # WAL模式下读写互不阻塞；synchronous=NORMAL时提交不等待fsync，只在检查点时同步
+    connection = sqlite3.connect(path, timeout=30.0)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class MatchHistory:
+    """对局历史的写入端
+
+    open()之前record()直接返回。记录只是把一行放进队列，后台线程攒够batch_size行
+    或等待flush_interval秒后在一个事务中写入，游戏主循环不会等待磁盘。
+    """
+
+    def __init__(self, batch_size=256, flush_interval=1.0):
+        self.enabled = False
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.path = None
+        self.source = 'game'
+        self.player = 'human'
+        self.written = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def open(self, path, source='game', player='human'):
+        """打开数据库并启动后台线程，返回True；已经打开时什么也不做，返回False
+
+        source和player是本进程记录的对局默认的来源和玩家一方的控制者。
+        只有得到True的调用方才应该调用close()。
+        """
+        if self.enabled:
+            return False
+        self.path = path
+        self.source = source
+        self.player = player
+        if self._thread is None:
+            atexit.register(self.close)
+        connect(path).close()  # 在调用方线程中建表，路径错误时立即报错
+        self.enabled = True
+        self._thread = threading.Thread(target=self._run, name='match-history', daemon=True)
+        self._thread.start()
+        return True
+
+    def record(self, result, player=None, robot='builtin', source=None):
+        """记录一场对局，result为Game.match_result()的返回值"""
+        if not self.enabled:
+            return
+        row = dict(result, finished_at=time.time(), source=source or self.source, player=player or self.player,
+                   robot=robot)
+        self._queue.put(tuple(row[column] for column in COLUMNS))
+
+    def close(self):
+        """写入队列中剩余的记录并等待后台线程结束"""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        connection = connect(self.path)
+        running = True
+        while running:
+            rows = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                try:
+                    row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if row is None:
+                    running = False
+                    break
+                rows.append(row)
+            if rows:
+                with connection:
+                    connection.executemany(INSERT, rows)
+                self.written += len(rows)
+        connection.close()
+
+
+def leaderboard(connection, source=None, limit=20):
+    """按控制者统计胜场、场次、胜率和平均时长，玩家一方和机器人一方的对局都计入"""
+    where, params = ('WHERE source = ?', (source,)) if source else ('', ())
+    return connection.execute(f"""
+        SELECT name, SUM(won) AS wins, COUNT(*) AS played, 1.0 * SUM(won) / COUNT(*) AS win_rate, AVG(duration)
+        FROM (SELECT player AS name, winner = 'player' AS won, duration FROM matches {where}
+              UNION ALL
+              SELECT robot AS name, winner = 'robot' AS won, duration FROM matches {where})
+        GROUP BY name ORDER BY wins DESC, win_rate DESC LIMIT ?""", params * 2 + (limit,)).fetchall()
+
+
+def win_rates(connection, source=None):
+    """按配置统计玩家胜率和平均伤害"""
+    where, params = ('WHERE source = ?', (source,)) if source else ('', ())
+    return connection.execute(f"""
+        SELECT config, COUNT(*) AS played, 1.0 * SUM(winner = 'player') / COUNT(*) AS win_rate,
+               AVG(damage_dealt), AVG(damage_taken), AVG(duration)
+        FROM matches {where}
+        GROUP BY config ORDER BY played DESC""", params).fetchall()
+
+
+def recent(connection, source=None, limit=20):
+    where, params = ('WHERE source = ?', (source,)) if source else ('', ())
+    return connection.execute(f"""
+        SELECT finished_at, source, player, robot, winner, duration, config, player_hits, robot_hits
+        FROM matches {where}
+        ORDER BY finished_at DESC LIMIT ?""", params + (limit,)).fetchall()
+
+
+# 全局写入端，由游戏主函数或批量运行的脚本打开
+history = MatchHistory(HISTORY_BATCH_SIZE, HISTORY_FLUSH_INTERVAL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查询对局历史")
+    parser.add_argument('database', nargs='?', default='match_history.db', help="数据库文件")
+    parser.add_argument('query', nargs='?', choices=('leaderboard', 'winrates', 'recent'), default='leaderboard')
+    parser.add_argument('--source', help="只统计某一来源的对局: game/training/tournament")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.database):
+        parser.error(f"数据库不存在: {args.database}")
+    connection = connect(args.database)
+    if args.query == 'leaderboard':
+        print("控制者            胜场   场次   胜率  平均时长(秒)")
+        for player, wins, played, rate, duration in leaderboard(connection, args.source, args.limit):
+            print(f"{player:<16} {wins:>6} {played:>6} {rate:>6.1%} {duration:>12.1f}")
+    elif args.query == 'winrates':
+        print("配置                                场次  玩家胜率  造成伤害  受到伤害  平均时长(秒)")
+        for config, played, rate, dealt, taken, duration in win_rates(connection, args.source):
+            print(f"{config:<34} {played:>6} {rate:>9.1%} {dealt:>9.1f} {taken:>9.1f} {duration:>12.1f}")
+    else:
+        for finished_at, source, player, robot, winner, duration, config, player_hits, robot_hits in \
+                recent(connection, args.source, args.limit):
+            when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(finished_at))
+            outcome = {'player': f"{player}胜", 'robot': f"{robot}胜"}.get(winner, '平局')
+            print(f"{when} {source:<10} {player} vs {robot}: {outcome}，{duration:.1f}秒，"
+                  f"命中 {player_hits}:{robot_hits}，{config}")
+    connection.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
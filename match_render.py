@@ -0,0 +1,199 @@
+# 离线渲染模块
+# 按比赛脚本（随机种子 + 玩家按键变化）重放对局，把每一帧渲染成图片序列或原始帧流，
+# 帧范围分给多个进程并行渲染，不需要窗口
+#
+# 用法: python match_render.py match.json 输出路径 [--workers N] [--every N] [--format png|bmp|raw]
+
+import os
+
+# 离线渲染不需要窗口和声音，必须在导入pygame之前设置
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+import pygame
+from pygame.locals import K_w, K_a, K_s, K_d, K_SPACE, K_m
+
+import tank_battle
+from assets.sound_manager import NullSoundManager
+from config import SIM_RATE, SCREEN_WIDTH, SCREEN_HEIGHT
+from game_map import load_map
+
+# 比赛脚本中的按键名
+KEY_NAMES = {'w': K_w, 'a': K_a, 's': K_s, 'd': K_d, 'space': K_SPACE, 'm': K_m}
+
+IMAGE_FORMATS = ('png', 'bmp', 'tga', 'jpg')
+RAW_FORMAT = 'raw'
+WRITE_BUFFER = 8 * 1024 * 1024  # 原始帧流每次成批写入的字节数
+
+# 重放时机器人AI的每帧预算：必须足够大，不能因为渲染机器的快慢推迟思考，否则重放结果会不一致
+REPLAY_AI_BUDGET = 3600.0
+
+
+def load_match(path):
+    """读取比赛脚本
+
+    {"seed": 0, "robot_count": 3, "map": "maps/default.json", "world_size": null, "ticks": 3600,
+     "inputs": [[0, ["d"]], [90, ["d", "space"]], [120, []]]}
+    inputs是按模拟步数排列的按键变化：从该步起按住列出的键，直到下一次变化。
+    map和world_size可以省略，map相对于游戏目录。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        match = json.load(f)
+    inputs = []
+    for tick, names in match.get('inputs', []):
+        unknown = [name for name in names if name not in KEY_NAMES]
+        if unknown:
+            raise ValueError(f"比赛脚本中有未知的按键: {unknown}")
+        inputs.append((int(tick), tuple(names)))
+    inputs.sort(key=lambda change: change[0])
+    world_size = match.get('world_size')
+    return {
+        'seed': match.get('seed', 0),
+        'robot_count': match.get('robot_count'),
+        'map': match.get('map'),
+        'world_size': tuple(world_size) if world_size else None,
+        'ticks': int(match['ticks']),
+        'inputs': inputs,
+    }
+
+
+class MatchReplay:
+    """按比赛脚本逐步推进的无窗口对局，同一个脚本每次重放的结果都相同"""
+
+    def __init__(self, match):
+        self.match = match
+        game_map = None
+        if match['map']:
+            game_dir = os.path.dirname(os.path.abspath(tank_battle.__file__))
+            game_map = load_map(os.path.join(game_dir, match['map']))
+        random.seed(match['seed'])
+        self.game = tank_battle.Game(match['robot_count'], NullSoundManager(), world_size=match['world_size'],
+                                     game_map=game_map)
+        self.game.ai_scheduler.frame_budget = REPLAY_AI_BUDGET
+        self.keys = {key: False for key in KEY_NAMES.values()}
+        self.game.player.input_keys = self.keys
+        self.tick = 0
+        self._next_input = 0
+
+    def step(self):
+        # 先应用本步开始时的按键变化，再推进一步
+        inputs = self.match['inputs']
+        while self._next_input < len(inputs) and inputs[self._next_input][0] <= self.tick:
+            pressed = inputs[self._next_input][1]
+            for name, key in KEY_NAMES.items():
+                self.keys[key] = name in pressed
+            self._next_input += 1
+        self.game.run_logic()
+        self.tick += 1
+
+    def advance_to(self, tick):
+        while self.tick < tick:
+            self.step()
+
+
+def frame_count(match, every):
+    # 第i帧是第i * every步之后的画面，第0帧是开局画面
+    return match['ticks'] // every + 1
+
+
+def frame_path(output, index, image_format):
+    return os.path.join(output, f"frame_{index:06d}.{image_format}")
+
+
+def render_range(match, output, image_format, every, first, stop):
+    """渲染[first, stop)范围内的帧，先不绘制地快进到起点，返回(帧数, 耗时秒)"""
+    start_time = time.perf_counter()
+    replay = MatchReplay(match)
+    replay.advance_to(first * every)
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+
+    if image_format == RAW_FORMAT:
+        # 每帧大小固定，各进程直接写入同一个文件中自己的区段
+        frame_size = SCREEN_WIDTH * SCREEN_HEIGHT * 3
+        with open(output, 'r+b', buffering=WRITE_BUFFER) as f:
+            f.seek(first * frame_size)
+            for index in range(first, stop):
+                replay.advance_to(index * every)
+                replay.game.draw_frame(surface)
+                f.write(pygame.image.tobytes(surface, 'RGB'))
+    else:
+        for index in range(first, stop):
+            replay.advance_to(index * every)
+            replay.game.draw_frame(surface)
+            pygame.image.save(surface, frame_path(output, index, image_format))
+    return stop - first, time.perf_counter() - start_time
+
+
+def _render_task(task):
+    return render_range(*task)
+
+
+def render_match(match, output, image_format='png', every=1, workers=None):
+    """把比赛渲染到output（图片序列为目录，原始帧流为文件），返回帧数
+
+    帧按连续的范围平均分给各进程；每个进程从开局快进到自己的起点，快进只运行模拟，
+    比渲染便宜得多。workers为0时在当前进程中渲染。
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    total = frame_count(match, every)
+    if image_format == RAW_FORMAT:
+        # 预先分配整个文件，各进程写入自己的区段
+        with open(output, 'wb') as f:
+            f.truncate(total * SCREEN_WIDTH * SCREEN_HEIGHT * 3)
+    else:
+        os.makedirs(output, exist_ok=True)
+
+    ranges = max(1, min(workers, total))
+    bounds = [total * index // ranges for index in range(ranges + 1)]
+    tasks = [(match, output, image_format, every, bounds[index], bounds[index + 1]) for index in range(ranges)]
+    if workers == 0:
+        for task in tasks:
+            _render_task(task)
+        return total
+
+    # 使用spawn启动，避免在已初始化的SDL上fork
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(ranges)
+    try:
+        for frames, seconds in pool.imap_unordered(_render_task, tasks):
+            print(f"已渲染 {frames} 帧，用时 {seconds:.1f} 秒")
+    finally:
+        # 不用terminate()：SDL会把SIGTERM转换成退出事件，子进程不会结束
+        pool.close()
+        pool.join()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把比赛脚本离线渲染为图片序列或原始帧流")
+    parser.add_argument('match', help="比赛脚本（JSON）")
+    parser.add_argument('output', help="输出目录（图片序列）或文件（原始帧流）")
+    parser.add_argument('--format', choices=IMAGE_FORMATS + (RAW_FORMAT,), default='png',
+                        help="输出格式，raw为连续的RGB24帧")
+    parser.add_argument('--every', type=int, default=1, help="每隔多少个模拟步输出一帧")
+    parser.add_argument('--workers', type=int, default=None, help="渲染进程数，默认等于CPU核数，0表示不使用子进程")
+    args = parser.parse_args(argv)
+
+    match = load_match(args.match)
+    every = max(1, args.every)
+    start_time = time.perf_counter()
+    total = render_match(match, args.output, args.format, every, args.workers)
+    elapsed = time.perf_counter() - start_time
+    match_seconds = match['ticks'] / SIM_RATE
+    print(f"共 {total} 帧，比赛时长 {match_seconds:.1f} 秒，渲染用时 {elapsed:.1f} 秒"
+          f"（{elapsed / match_seconds:.2f} 倍实时）" if match_seconds else f"共 {total} 帧")
+    if args.format == RAW_FORMAT:
+        print(f"转换为视频: ffmpeg -f rawvideo -pix_fmt rgb24 -s {SCREEN_WIDTH}x{SCREEN_HEIGHT} "
+              f"-r {SIM_RATE / every:g} -i {args.output} out.mp4")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
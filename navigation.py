@@ -0,0 +1,341 @@
+# 导航模块
+# 基于网格的共享流场：目标所在格子变化时才重新计算一次，所有机器人共用同一份结果
+
+from collections import OrderedDict, deque
+
+from config import FLOW_CACHE_SIZE, SHARED_GRID_CACHE_SIZE
+
+# 方向对应的格子偏移（0: 上, 1: 右, 2: 下, 3: 左）
+DIRECTION_OFFSETS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+# 流场中表示"没有方向"的值
+NO_DIRECTION = 255
+
+# 把栅格中的0（可通行）映射为1、其余映射为0的字节转换表
+_OPEN_TABLE = bytes([1]) + bytes(255)
+
+# 按地图缓存的静态导航数据，同一张地图的多场对局共用；只保留最近使用的几张地图
+_nav_grid_cache = OrderedDict()
+_line_of_sight_cache = OrderedDict()
+
+
+def _obstacle_key(obstacle_rects):
+    return tuple(tuple(rect) for rect in obstacle_rects)
+
+
+def _shared(cache, key, factory):
+    value = cache.get(key)
+    if value is None:
+        value = factory()
+        cache[key] = value
+        while len(cache) > SHARED_GRID_CACHE_SIZE:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return value
+
+
+def shared_nav_grid(width, height, cell_size, obstacle_rects, clearance):
+    key = (width, height, cell_size, clearance, _obstacle_key(obstacle_rects))
+    return _shared(_nav_grid_cache, key,
+                   lambda: NavGrid(width, height, cell_size, obstacle_rects, clearance))
+
+
+def shared_line_of_sight(width, height, cell_size, obstacle_rects, margin=0):
+    key = (width, height, cell_size, margin, _obstacle_key(obstacle_rects))
+    return _shared(_line_of_sight_cache, key,
+                   lambda: LineOfSight(width, height, cell_size, obstacle_rects, margin))
+
+
+class NavGrid:
+    """静态障碍物栅格
+
+    每个格子记录坦克中心停在格子中心时是否会与障碍物或屏幕边界重叠，
+    因此只要坦克沿格子中心移动就不会卡在墙上。
+    """
+
+    def __init__(self, width, height, cell_size, obstacle_rects=(), clearance=0, blocked=None):
+        self.cell_size = cell_size
+        self.cols = max(1, width // cell_size)
+        self.rows = max(1, height // cell_size)
+
+        # 传入预先算好的栅格（如编译好的地图）时直接使用
+        if blocked is not None:
+            self.blocked = blocked
+            return
+        self.blocked = bytearray(self.cols * self.rows)
+
+        # 格子中心离世界边界不足clearance的格子不可通行
+        half = cell_size // 2
+        for row in range(self.rows):
+            cy = row * cell_size + half
+            for col in range(self.cols):
+                cx = col * cell_size + half
+                if (cx < clearance or cy < clearance or
+                        cx > width - clearance or cy > height - clearance):
+                    self.blocked[row * self.cols + col] = 1
+
+        # 障碍物按坦克半径膨胀后，格子中心落在其中的格子不可通行
+        # 逐个障碍物只处理它覆盖的格子范围，耗时与障碍物面积成正比
+        for x, y, w, h in (tuple(rect) for rect in obstacle_rects):
+            left, top = x - clearance, y - clearance
+            right, bottom = x + w + clearance, y + h + clearance
+            first_col = max(0, (left - half) // cell_size + 1)
+            last_col = min(self.cols - 1, (right - half - 1) // cell_size)
+            first_row = max(0, (top - half) // cell_size + 1)
+            last_row = min(self.rows - 1, (bottom - half - 1) // cell_size)
+            for row in range(first_row, last_row + 1):
+                start = row * self.cols
+                for col in range(first_col, last_col + 1):
+                    self.blocked[start + col] = 1
+
+    def cell_at(self, x, y):
+        # 将像素坐标转换为格子坐标（超出范围时夹到边缘）
+        col = min(max(int(x) // self.cell_size, 0), self.cols - 1)
+        row = min(max(int(y) // self.cell_size, 0), self.rows - 1)
+        return col, row
+
+    def cell_center(self, col, row):
+        half = self.cell_size // 2
+        return col * self.cell_size + half, row * self.cell_size + half
+
+    def is_blocked(self, col, row):
+        return self.blocked[row * self.cols + col] == 1
+
+
+class FlowField:
+    """指向单一目标的流场
+
+    用广度优先搜索从目标格子向外扩展，每个格子记录下一步应走的方向。
+    计算只在目标所在格子变化时进行，查询只是一次数组索引，
+    所以寻路成本与机器人数量无关。
+    指定budget时每次set_target()最多扩展budget个格子，大地图的流场分几步算完，
+    算完之前机器人继续使用上一个流场。
+    算好的流场按目标格子缓存在本流场对象中（每场对局一个），只保留最近使用的cache_size个。
+    缓存不在对局之间共用：否则大地图上同一场对局的流场何时到位取决于之前的对局，重放结果就不再确定。
+    """
+
+    def __init__(self, grid, budget=None, cache_size=FLOW_CACHE_SIZE):
+        self.grid = grid
+        self.budget = budget
+        self.cache = OrderedDict()  # 目标格子 -> 流场，按最近使用排序
+        self.cache_size = cache_size
+        self.target_cell = None
+        self.flow = bytes([NO_DIRECTION]) * (grid.cols * grid.rows)
+        self.rebuild_count = 0
+        self._build_cell = None  # 正在计算的流场的目标格子
+        self._build = None
+
+    def set_target(self, x, y):
+        # 目标仍在同一格子时直接复用已有流场，只继续未完成的计算
+        cell = self.grid.cell_at(x, y)
+        changed = cell != self.target_cell
+        if changed:
+            self.target_cell = cell
+            flow = self.cache.get(cell)
+            if flow is not None:
+                self.cache.move_to_end(cell)
+                self.flow = flow
+                self._build = None
+                return True
+            if self._build is None:
+                self._start_build(cell)
+        self._continue_build()
+        return changed
+
+    def _start_build(self, cell):
+        self._build_cell = cell
+        self._build = self._build_steps(cell)
+
+    def _continue_build(self):
+        if self._build is None:
+            return
+        try:
+            next(self._build)
+        except StopIteration as finished:
+            flow = finished.value
+            self.cache[self._build_cell] = flow
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            self.rebuild_count += 1
+            self.flow = flow
+            self._build = None
+            # 计算期间目标又换了格子时，接着计算新目标的流场
+            if self._build_cell != self.target_cell:
+                self._start_build(self.target_cell)
+
+    def _build_steps(self, target_cell):
+        # 生成器：每处理budget个格子暂停一次，结束时返回流场
+        grid = self.grid
+        cols = grid.cols
+        last_col = cols - 1
+        size = cols * grid.rows
+        blocked = grid.blocked
+        budget = self.budget or size
+        flow = bytearray([NO_DIRECTION]) * size
+
+        target_index = target_cell[1] * cols + target_cell[0]
+        # 不可通行的格子一开始就算作已访问
+        seen = bytearray(blocked)
+        seen[target_index] = 1
+        queue = deque([target_index])
+        pop, push = queue.popleft, queue.append
+
+        # 从目标出发反向扩展：邻居走向当前格子的方向就是它的流向
+        # 邻居按下、左、上、右的顺序访问，流向分别为上、右、下、左
+        expanded = 0
+        while queue:
+            index = pop()
+            col = index % cols
+            neighbor = index + cols
+            if neighbor < size and not seen[neighbor]:
+                seen[neighbor] = 1
+                flow[neighbor] = 0
+                push(neighbor)
+            if col:
+                neighbor = index - 1
+                if not seen[neighbor]:
+                    seen[neighbor] = 1
+                    flow[neighbor] = 1
+                    push(neighbor)
+            neighbor = index - cols
+            if neighbor >= 0 and not seen[neighbor]:
+                seen[neighbor] = 1
+                flow[neighbor] = 2
+                push(neighbor)
+            if col != last_col:
+                neighbor = index + 1
+                if not seen[neighbor]:
+                    seen[neighbor] = 1
+                    flow[neighbor] = 3
+                    push(neighbor)
+            expanded += 1
+            if expanded >= budget and queue:
+                expanded = 0
+                yield
+
+        # 被推到障碍物边缘的坦克可能位于不可通行的格子，引导它回到相邻的可通行格子
+        # 依次检查上、右、下、左的相邻格子，取第一个能到达目标的
+        reached = (int.from_bytes(seen, 'little') &
+                   int.from_bytes(bytes(blocked).translate(_OPEN_TABLE), 'little'))
+        reached = bytearray(reached.to_bytes(size, 'little'))
+        reached[target_index] = 1
+        for index in range(size):
+            if blocked[index]:
+                col = index % cols
+                if index >= cols and reached[index - cols]:
+                    flow[index] = 0
+                elif col != last_col and reached[index + 1]:
+                    flow[index] = 1
+                elif index + cols < size and reached[index + cols]:
+                    flow[index] = 2
+                elif col and reached[index - 1]:
+                    flow[index] = 3
+            expanded += 1
+            if expanded >= budget and index + 1 < size:
+                expanded = 0
+                yield
+
+        return bytes(flow)
+
+    def direction_at(self, x, y):
+        # 查询某个位置的前进方向，到达目标或无法到达时返回None
+        col, row = self.grid.cell_at(x, y)
+        direction = self.flow[row * self.grid.cols + col]
+        if direction == NO_DIRECTION:
+            return None
+        return direction
+
+
+class LineOfSight:
+    """静态障碍物的视线查询
+
+    障碍物预先栅格化，查询时在格子上做直线遍历，
+    结果按(起点格子, 终点格子)缓存。障碍物不会移动，缓存永远有效。
+    """
+
+    def __init__(self, width, height, cell_size, obstacle_rects=(), margin=0, max_cache_size=65536,
+                 occupied=None):
+        self.cell_size = cell_size
+        self.cols = max(1, width // cell_size)
+        self.rows = max(1, height // cell_size)
+        self.max_cache_size = max_cache_size
+        self._cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # 传入预先算好的栅格（如编译好的地图）时直接使用
+        if occupied is not None:
+            self.occupied = occupied
+            return
+        self.occupied = bytearray(self.cols * self.rows)
+
+        # 把障碍物（按弹体半径膨胀）覆盖到的格子全部标记为遮挡
+        for x, y, w, h in (tuple(rect) for rect in obstacle_rects):
+            first_col = max(0, (x - margin) // cell_size)
+            last_col = min(self.cols - 1, (x + w + margin - 1) // cell_size)
+            first_row = max(0, (y - margin) // cell_size)
+            last_row = min(self.rows - 1, (y + h + margin - 1) // cell_size)
+            for row in range(first_row, last_row + 1):
+                for col in range(first_col, last_col + 1):
+                    self.occupied[row * self.cols + col] = 1
+
+    def cell_at(self, x, y):
+        col = min(max(int(x) // self.cell_size, 0), self.cols - 1)
+        row = min(max(int(y) // self.cell_size, 0), self.rows - 1)
+        return col, row
+
+    def is_clear(self, x0, y0, x1, y1):
+        # 两点之间没有障碍物遮挡时返回True
+        start = self.cell_at(x0, y0)
+        end = self.cell_at(x1, y1)
+        # 视线是对称的，统一键的顺序让两个方向共用一条缓存
+        key = (start, end) if start <= end else (end, start)
+        result = self._cache.get(key)
+        if result is not None:
+            self.cache_hits += 1
+            return result
+
+        self.cache_misses += 1
+        result = self._trace(key[0], key[1])
+        if len(self._cache) >= self.max_cache_size:
+            self._cache.clear()
+        self._cache[key] = result
+        return result
+
+    def _blocked(self, col, row):
+        return self.occupied[row * self.cols + col] == 1
+
+    def _trace(self, start, end):
+        # 在格子上遍历直线经过的所有格子，起点和终点格子本身不参与判断
+        col, row = start
+        end_col, end_row = end
+        dx = abs(end_col - col)
+        dy = abs(end_row - row)
+        step_x = 1 if end_col > col else -1
+        step_y = 1 if end_row > row else -1
+        remaining = dx + dy
+        error = dx - dy
+        dx *= 2
+        dy *= 2
+
+        while remaining > 0:
+            if error > 0:
+                col += step_x
+                error -= dy
+                remaining -= 1
+            elif error < 0:
+                row += step_y
+                error += dx
+                remaining -= 1
+            else:
+                # 直线正好穿过格子角点，两侧的格子都可能挡住视线
+                if self._blocked(col + step_x, row) or self._blocked(col, row + step_y):
+                    return False
+                col += step_x
+                row += step_y
+                error += dx - dy
+                remaining -= 2
+            if remaining > 0 and self._blocked(col, row):
+                return False
+        return True
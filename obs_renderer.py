@@ -0,0 +1,78 @@
+# 观测渲染模块
+# 在低分辨率网格上按类别编码绘制对局，直接写入调用方提供的numpy数组，不创建窗口
+
+import weakref
+
+import numpy as np
+
+# 类别编码
+CELL_EMPTY = 0
+CELL_OBSTACLE = 1
+CELL_PLAYER = 2
+CELL_ROBOT = 3
+CELL_PLAYER_BULLET = 4
+CELL_ROBOT_BULLET = 5
+CELL_PLAYER_MISSILE = 6
+CELL_ROBOT_MISSILE = 7
+
+
+class ObservationRenderer:
+    """类别编码的低分辨率观测渲染器
+
+    输出数组形状为(height, width)，dtype为uint8，每个格子记录其中的实体类别，
+    后绘制的类别覆盖先绘制的（障碍物 < 弹药 < 机器人 < 玩家）。
+    障碍物不会移动，按地图预先画好一层，每帧只做一次整块复制，
+    之后的绘制都是对输出数组的切片赋值，不分配新数组。
+    世界大小在每次render()时取自对局，同一个渲染器可以交替渲染大小不同的地图；
+    静态层跟随对局的障碍物组保存，对局被回收后随之释放。
+    """
+
+    def __init__(self, width=80, height=60, world_width=800, world_height=600):
+        self.width = width
+        self.height = height
+        self.world_width = world_width
+        self.world_height = world_height
+        self._static_layers = weakref.WeakKeyDictionary()  # 障碍物组 -> 预先绘制好的静态层
+
+    def cell_span(self, rect):
+        # 把世界坐标矩形换算成格子范围，至少覆盖一个格子
+        x, y, w, h = rect
+        x0 = min(max(x * self.width // self.world_width, 0), self.width - 1)
+        y0 = min(max(y * self.height // self.world_height, 0), self.height - 1)
+        x1 = min(max(-(-(x + w) * self.width // self.world_width), x0 + 1), self.width)
+        y1 = min(max(-(-(y + h) * self.height // self.world_height), y0 + 1), self.height)
+        return x0, y0, x1, y1
+
+    def static_layer(self, obstacles):
+        layer = np.zeros((self.height, self.width), dtype=np.uint8)
+        for obstacle in obstacles:
+            x0, y0, x1, y1 = self.cell_span(obstacle.rect)
+            layer[y0:y1, x0:x1] = CELL_OBSTACLE
+        return layer
+
+    def _draw(self, out, sprites, code, missile_code=None):
+        for sprite in sprites:
+            rect = sprite.rect
+            # 完全在世界之外的实体不绘制
+            if (rect.right <= 0 or rect.bottom <= 0 or
+                    rect.left >= self.world_width or rect.top >= self.world_height):
+                continue
+            x0, y0, x1, y1 = self.cell_span(rect)
+            out[y0:y1, x0:x1] = missile_code if missile_code is not None and sprite.is_missile else code
+
+    def render(self, game, out):
+        """把game的当前状态写入out，返回out"""
+        self.world_width = game.world_width
+        self.world_height = game.world_height
+        # 同一场对局的障碍物组直接复用已画好的静态层
+        layer = self._static_layers.get(game.obstacles)
+        if layer is None:
+            layer = self.static_layer(game.obstacles)
+            self._static_layers[game.obstacles] = layer
+        np.copyto(out, layer)
+        self._draw(out, game.player_bullets, CELL_PLAYER_BULLET, CELL_PLAYER_MISSILE)
+        self._draw(out, game.robot_bullets, CELL_ROBOT_BULLET, CELL_ROBOT_MISSILE)
+        self._draw(out, game.robots, CELL_ROBOT)
+        if game.player.alive():
+            self._draw(out, (game.player,), CELL_PLAYER)
+        return out
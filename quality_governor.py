@@ -0,0 +1,99 @@
+# 画质调节模块
+# 根据最近的帧耗时与帧预算(1/FPS)的比较，逐级降低或恢复渲染与特效的开销
+
+from collections import deque
+
+
+class QualityLevel:
+    """一个画质等级的设置
+
+    explosion_frame_step: 爆炸动画每隔几帧才重新缩放一次图像
+    max_explosions: 同时存在的爆炸效果上限，None表示不限制
+    max_sounds: 每帧最多新播放的音效数，None表示不限制
+    hud_interval: 状态栏文字每隔几帧重新渲染一次
+    render_scale: 内部渲染分辨率相对于屏幕的比例
+    """
+
+    def __init__(self, name, explosion_frame_step, max_explosions, max_sounds, hud_interval, render_scale):
+        self.name = name
+        self.explosion_frame_step = explosion_frame_step
+        self.max_explosions = max_explosions
+        self.max_sounds = max_sounds
+        self.hud_interval = hud_interval
+        self.render_scale = render_scale
+
+
+# 从高到低排列，等级编号即下标
+QUALITY_LEVELS = (
+    QualityLevel('高', 1, None, None, 1, 1.0),
+    QualityLevel('中', 2, 12, 4, 2, 1.0),
+    QualityLevel('低', 3, 6, 2, 4, 1.0),
+    QualityLevel('最低', 5, 3, 1, 8, 0.5),
+)
+
+
+class QualityGovernor:
+    """画质调节器
+
+    每帧记录一次实际耗时（不含等待时间）。最近window帧的平均耗时超过预算的
+    downgrade_ratio时立即降一级；低于预算的upgrade_ratio并持续upgrade_delay帧后
+    才升一级，避免在两个等级之间来回切换。每次切换后清空样本重新统计。
+    """
+
+    def __init__(self, fps=60, levels=QUALITY_LEVELS, window=30, downgrade_ratio=0.9,
+                 upgrade_ratio=0.6, upgrade_delay=120):
+        self.budget_ms = 1000.0 / fps
+        self.levels = levels
+        self.downgrade_ms = self.budget_ms * downgrade_ratio
+        self.upgrade_ms = self.budget_ms * upgrade_ratio
+        self.upgrade_delay = upgrade_delay
+        self.level = 0
+        self.samples = deque(maxlen=window)
+        self._total = 0.0
+        self._calm_frames = 0
+        self.changes = 0
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def average_ms(self):
+        return self._total / len(self.samples) if self.samples else 0.0
+
+    def record(self, frame_ms):
+        """记录一帧的耗时，返回当前画质设置"""
+        if len(self.samples) == self.samples.maxlen:
+            self._total -= self.samples[0]
+        self.samples.append(frame_ms)
+        self._total += frame_ms
+        if len(self.samples) < self.samples.maxlen:
+            return self.settings
+
+        average = self._total / len(self.samples)
+        if average > self.downgrade_ms:
+            self._calm_frames = 0
+            if self.level < len(self.levels) - 1:
+                self._set_level(self.level + 1)
+        elif average < self.upgrade_ms and self.level > 0:
+            self._calm_frames += 1
+            if self._calm_frames >= self.upgrade_delay:
+                self._set_level(self.level - 1)
+        else:
+            self._calm_frames = 0
+        return self.settings
+
+    def _set_level(self, level):
+        self.level = level
+        self.samples.clear()
+        self._total = 0.0
+        self._calm_frames = 0
+        self.changes += 1
+
+    def stats(self):
+        return {
+            'level': self.level,
+            'name': self.settings.name,
+            'average_ms': self.average_ms(),
+            'budget_ms': self.budget_ms,
+            'changes': self.changes,
+        }
@@ -0,0 +1,105 @@
+# 渲染管线模块
+# 绘制命令按图层排序、按源图像分组，每个图层用一次Surface.blits批量提交
+
+import weakref
+
+import pygame
+
+# 图层顺序（数值小的先绘制）
+LAYER_GROUND = 0
+LAYER_TANKS = 10
+LAYER_PROJECTILES = 20
+LAYER_EFFECTS = 30
+
+
+class RenderPipeline:
+    """分层批量绘制
+
+    每帧先submit所有绘制命令，再flush到目标表面。
+    同一图层内使用同一张源图像的命令排在一起，然后用一次blits提交整个图层，
+    省去逐个精灵调用blit的Python开销。同一图层内的先后顺序不作保证。
+    flush时可以指定内部渲染比例，先画到较小的表面上再放大到目标表面。
+    """
+
+    def __init__(self):
+        self._layers = {}  # 图层 -> {源图像: [位置, ...]}
+        self.stats = {}  # 图层 -> {'draw_calls', 'blits', 'pixels'}
+        self._scaled = weakref.WeakKeyDictionary()  # 源图像 -> (比例, 缩小后的图像)
+        self._low_surface = None
+
+    def begin(self):
+        for commands in self._layers.values():
+            commands.clear()
+
+    def submit(self, layer, image, position):
+        commands = self._layers.get(layer)
+        if commands is None:
+            commands = self._layers[layer] = {}
+        positions = commands.get(image)
+        if positions is None:
+            commands[image] = [position]
+        else:
+            positions.append(position)
+
+    def submit_sprites(self, layer, sprites, view, previous=None, alpha=1.0):
+        # 只提交与视口相交的精灵，位置换算为屏幕坐标
+        # previous给出上一步模拟时各精灵的中心，alpha小于1时在上一步和当前位置之间插值
+        offset_x, offset_y = view.x, view.y
+        if previous is None or alpha >= 1.0:
+            for sprite in sprites:
+                rect = sprite.rect
+                if view.colliderect(rect):
+                    self.submit(layer, sprite.image, (rect.x - offset_x, rect.y - offset_y))
+            return
+        back = 1.0 - alpha
+        for sprite in sprites:
+            rect = sprite.rect
+            if view.colliderect(rect):
+                x, y = rect.x - offset_x, rect.y - offset_y
+                center = previous.get(sprite)
+                if center is not None:
+                    # 新出现的精灵没有上一步的位置，直接画在当前位置
+                    x += round((center[0] - rect.centerx) * back)
+                    y += round((center[1] - rect.centery) * back)
+                self.submit(layer, sprite.image, (x, y))
+
+    def scaled_image(self, image, scale):
+        # 缩小后的图像按源图像缓存，源图像被释放时缓存随之失效
+        cached = self._scaled.get(image)
+        if cached is not None and cached[0] == scale:
+            return cached[1]
+        width, height = image.get_size()
+        scaled = pygame.transform.scale(image, (max(1, round(width * scale)), max(1, round(height * scale))))
+        self._scaled[image] = (scale, scaled)
+        return scaled
+
+    def flush(self, target, scale=1.0):
+        surface = target
+        if scale != 1.0:
+            width, height = target.get_size()
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            if self._low_surface is None or self._low_surface.get_size() != size:
+                self._low_surface = pygame.Surface(size).convert(target)
+            surface = self._low_surface
+
+        stats = {}
+        for layer in sorted(self._layers):
+            commands = self._layers[layer]
+            if not commands:
+                continue
+            sequence = []
+            pixels = 0
+            for image, positions in commands.items():
+                if scale != 1.0:
+                    image = self.scaled_image(image, scale)
+                    positions = [(int(x * scale), int(y * scale)) for x, y in positions]
+                width, height = image.get_size()
+                pixels += width * height * len(positions)
+                sequence.extend((image, position) for position in positions)
+            surface.blits(sequence, doreturn=False)
+            stats[layer] = {'draw_calls': 1, 'blits': len(sequence), 'pixels': pixels}
+
+        if surface is not target:
+            pygame.transform.scale(surface, target.get_size(), target)
+        self.stats = stats
+        return stats
@@ -0,0 +1,61 @@
+# 模拟循环模块
+# 模拟按固定步长推进，与渲染帧率无关：一个渲染帧可以执行多步模拟，
+# 也可以在两步模拟之间渲染，用插值得到平滑的位置
+
+import time
+
+
+class FixedStepLoop:
+    """固定步长的模拟累加器
+
+    每个渲染帧把实际经过的时间乘以快进倍率累加起来，够一步就执行一步模拟。
+    返回的alpha是累加器中剩余的不足一步的比例，渲染时用来在上一步和当前步之间插值。
+    倍率为k时每个渲染帧大约执行k步，即每k个模拟状态渲染一次。
+    倍率为0表示不限速：每帧在time_budget_ms内尽可能多地执行模拟，只渲染最后的状态。
+    """
+
+    def __init__(self, step_ms, speed=1, max_steps_per_frame=5, time_budget_ms=15.0):
+        self.step_ms = step_ms
+        self.max_steps_per_frame = max_steps_per_frame
+        self.time_budget_ms = time_budget_ms
+        self.accumulator = 0.0
+        self.speed = speed
+        self.steps = 0
+        self.dropped_ms = 0.0  # 因追赶上限而丢弃的时间，说明机器跟不上当前倍率
+
+    def set_speed(self, speed):
+        self.speed = speed
+        self.accumulator = 0.0
+
+    def advance(self, elapsed_ms, step):
+        """按经过的时间执行模拟，step()执行一步模拟
+
+        返回(本帧执行的步数, 插值比例alpha)。
+        """
+        if self.speed == 0:
+            return self._advance_unbounded(step), 1.0
+
+        self.accumulator += elapsed_ms * self.speed
+        max_steps = self.max_steps_per_frame * self.speed
+        steps = 0
+        while self.accumulator >= self.step_ms and steps < max_steps:
+            step()
+            self.accumulator -= self.step_ms
+            steps += 1
+        if self.accumulator >= self.step_ms:
+            # 追不上时丢弃积压的时间，宁可变慢也不越积越多
+            self.dropped_ms += self.accumulator - self.accumulator % self.step_ms
+            self.accumulator %= self.step_ms
+        self.steps += steps
+        return steps, self.accumulator / self.step_ms
+
+    def _advance_unbounded(self, step):
+        deadline = time.perf_counter() + self.time_budget_ms / 1000.0
+        steps = 0
+        while True:
+            step()
+            steps += 1
+            if time.perf_counter() >= deadline:
+                break
+        self.steps += steps
+        return steps
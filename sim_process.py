@@ -0,0 +1,405 @@
+# 多进程模拟模块
+# 模拟在子进程中按固定频率运行，每一步的渲染状态写入共享内存中的环形缓冲区；
+# 主进程直接从共享内存读取状态绘制，按键状态通过另一块共享内存传回子进程。
+# 两个方向都只有一个写者，不需要加锁：渲染慢了不会拖慢模拟，模拟也不用等待渲染
+
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import pygame
+from pygame.locals import K_r, K_w, K_a, K_s, K_d, K_SPACE, K_m
+
+from config import SIM_RATE
+from game_log import log
+from game_map import load_map
+from render_pipeline import LAYER_GROUND, LAYER_TANKS, LAYER_PROJECTILES, LAYER_EFFECTS
+from telemetry import telemetry
+from match_history import history
+from input_stage import InputStage
+
+# tank_battle在导入时会创建窗口，并且它本身导入了本模块，所以只在函数内部导入
+
+# 环形缓冲区的槽数，读者落后超过这么多步时数据会被覆盖
+RING_SLOTS = 8
+
+# 每个槽中各类实体的数量上限，超出的部分不发布
+MAX_TANKS = 64
+MAX_PROJECTILES = 512
+MAX_EXPLOSIONS = 128
+
+SOUND_NAMES = ('shoot', 'missile', 'explosion', 'deflect', 'tank_move')
+
+# 槽头部的字段（int32下标）
+(SEQ, TICK, CAMERA_X, CAMERA_Y, PLAYER_HEALTH, ROBOT_HEALTH, GAME_OVER, WINNER,
+ TANK_COUNT, PROJECTILE_COUNT, EXPLOSION_COUNT) = range(11)
+SOUND_PLAYS = 11  # 本步各音效的播放次数
+SOUND_STOPS = SOUND_PLAYS + len(SOUND_NAMES)  # 本步各音效的停止次数
+SLOT_HEADER = SOUND_STOPS + len(SOUND_NAMES)
+
+TANK_FIELDS = 4        # x, y, 方向, 阵营(0: 玩家, 1: 机器人)
+PROJECTILE_FIELDS = 3  # x, y, 是否导弹
+EXPLOSION_FIELDS = 3   # 中心x, 中心y, 当前大小
+
+TANKS_OFFSET = SLOT_HEADER
+PROJECTILES_OFFSET = TANKS_OFFSET + MAX_TANKS * TANK_FIELDS
+EXPLOSIONS_OFFSET = PROJECTILES_OFFSET + MAX_PROJECTILES * PROJECTILE_FIELDS
+SLOT_SIZE = EXPLOSIONS_OFFSET + MAX_EXPLOSIONS * EXPLOSION_FIELDS
+
+WINNERS = (None, 'player', 'robot')
+
+# 输入通道的字段
+INPUT_KEYS, INPUT_RESTARTS, INPUT_QUIT = range(3)
+INPUT_SIZE = 3
+CONTROL_KEYS = (K_w, K_a, K_s, K_d, K_SPACE, K_m)  # 按键状态按这个顺序编码为位
+
+
+class StateRing:
+    """共享内存中的渲染状态环形缓冲区
+
+    开头一个int32记录最新发布的步数（0表示尚未发布），之后是RING_SLOTS个槽，
+    第tick步写在第tick % RING_SLOTS个槽。写入时槽的seq先加一变为奇数，写完再加一；
+    读者记下seq后直接从共享内存读取，读完seq没变才说明数据完整。
+    """
+
+    def __init__(self, name=None, slots=RING_SLOTS):
+        size = (1 + slots * SLOT_SIZE) * 4
+        if name is None:
+            self.block = shared_memory.SharedMemory(create=True, size=size)
+            self.block.buf[:size] = bytes(size)
+        else:
+            self.block = shared_memory.SharedMemory(name=name)
+        self.data = self.block.buf[:size].cast('i')
+        self.slots = slots
+
+    @property
+    def name(self):
+        return self.block.name
+
+    @property
+    def latest(self):
+        return self.data[0]
+
+    def slot(self, tick):
+        return 1 + (tick % self.slots) * SLOT_SIZE
+
+    def publish(self, game, tick, sound_plays, sound_stops):
+        data = self.data
+        base = self.slot(tick)
+        data[base + SEQ] += 1  # 奇数：正在写入
+
+        count = 0
+        offset = base + TANKS_OFFSET
+        for tank in game.tanks:
+            if count == MAX_TANKS:
+                break
+            data[offset] = tank.rect.x
+            data[offset + 1] = tank.rect.y
+            data[offset + 2] = tank.direction
+            data[offset + 3] = 0 if tank.team == 'friendly' else 1
+            offset += TANK_FIELDS
+            count += 1
+        data[base + TANK_COUNT] = count
+
+        count = 0
+        offset = base + PROJECTILES_OFFSET
+        for projectile in game.projectiles:
+            if count == MAX_PROJECTILES:
+                break
+            data[offset] = projectile.rect.x
+            data[offset + 1] = projectile.rect.y
+            data[offset + 2] = projectile.is_missile
+            offset += PROJECTILE_FIELDS
+            count += 1
+        data[base + PROJECTILE_COUNT] = count
+
+        count = 0
+        offset = base + EXPLOSIONS_OFFSET
+        for explosion in game.explosions:
+            if count == MAX_EXPLOSIONS:
+                break
+            data[offset] = explosion.rect.centerx
+            data[offset + 1] = explosion.rect.centery
+            data[offset + 2] = explosion.rect.width
+            offset += EXPLOSION_FIELDS
+            count += 1
+        data[base + EXPLOSION_COUNT] = count
+
+        robot = next(iter(game.robots), game.robot)
+        data[base + TICK] = tick
+        data[base + CAMERA_X] = game.camera.rect.x
+        data[base + CAMERA_Y] = game.camera.rect.y
+        data[base + PLAYER_HEALTH] = game.player.health
+        data[base + ROBOT_HEALTH] = robot.health
+        data[base + GAME_OVER] = game.game_over
+        data[base + WINNER] = WINNERS.index(game.winner)
+        for index in range(len(SOUND_NAMES)):
+            data[base + SOUND_PLAYS + index] = sound_plays[index]
+            data[base + SOUND_STOPS + index] = sound_stops[index]
+
+        data[base + SEQ] += 1  # 偶数：写入完成
+        data[0] = tick
+
+    def close(self, unlink=False):
+        self.data.release()
+        self.block.close()
+        if unlink:
+            self.block.unlink()
+
+
+class InputChannel:
+    """渲染进程写、模拟进程读的输入通道：按键位掩码、重新开始的次数、退出标志"""
+
+    def __init__(self, name=None):
+        size = INPUT_SIZE * 4
+        if name is None:
+            self.block = shared_memory.SharedMemory(create=True, size=size)
+            self.block.buf[:size] = bytes(size)
+        else:
+            self.block = shared_memory.SharedMemory(name=name)
+        self.data = self.block.buf[:size].cast('i')
+
+    @property
+    def name(self):
+        return self.block.name
+
+    def write_keys(self, pressed):
+        bits = 0
+        for bit, key in enumerate(CONTROL_KEYS):
+            if pressed[key]:
+                bits |= 1 << bit
+        self.data[INPUT_KEYS] = bits
+
+    def read_keys(self, keys):
+        bits = self.data[INPUT_KEYS]
+        for bit, key in enumerate(CONTROL_KEYS):
+            keys[key] = bool(bits & (1 << bit))
+        return keys
+
+    def close(self, unlink=False):
+        self.data.release()
+        self.block.close()
+        if unlink:
+            self.block.unlink()
+
+
+class RecordingSoundManager:
+    # 模拟进程中不播放声音，只统计每一步的播放和停止请求，由渲染进程播放
+    def __init__(self):
+        self.plays = [0] * len(SOUND_NAMES)
+        self.stops = [0] * len(SOUND_NAMES)
+
+    def play_sound(self, sound_name):
+        if sound_name in SOUND_NAMES:
+            self.plays[SOUND_NAMES.index(sound_name)] += 1
+
+    def stop_sound(self, sound_name):
+        if sound_name in SOUND_NAMES:
+            self.stops[SOUND_NAMES.index(sound_name)] += 1
+
+    def reset(self):
+        for index in range(len(SOUND_NAMES)):
+            self.plays[index] = 0
+            self.stops[index] = 0
+
+
+def _sim_main(ring_name, input_name, robot_count, world_size, map_path, telemetry_dir=None, history_path=None):
+    # 模拟进程：窗口和声音驱动已由父进程在启动前设置为dummy
+    from tank_battle import Game
+
+    if telemetry_dir:
+        telemetry.open(telemetry_dir)
+    if history_path:
+        history.open(history_path)
+    ring = StateRing(ring_name)
+    inputs = InputChannel(input_name)
+    sounds = RecordingSoundManager()
+    game_map = load_map(map_path) if map_path else None
+    game = Game(robot_count, sounds, world_size=world_size, game_map=game_map)
+    keys = {key: False for key in CONTROL_KEYS}
+    restarts = inputs.data[INPUT_RESTARTS]
+
+    step = 1.0 / SIM_RATE
+    next_time = time.perf_counter()
+    tick = 0
+    try:
+        while not inputs.data[INPUT_QUIT]:
+            if inputs.data[INPUT_RESTARTS] != restarts:
+                restarts = inputs.data[INPUT_RESTARTS]
+                if game.game_over:
+                    game.__init__(game.robot_count, sounds, game.world_size, game.game_map)
+            game.player.input_keys = inputs.read_keys(keys)
+            game.run_logic()
+            tick += 1
+            ring.publish(game, tick, sounds.plays, sounds.stops)
+            sounds.reset()
+
+            # 按固定频率推进，落后太多时不再追赶
+            next_time += step
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.25:
+                next_time = time.perf_counter()
+    finally:
+        telemetry.close()
+        history.close()
+        ring.close()
+        inputs.close()
+
+
+class SplitRenderer:
+    """渲染进程一侧：从环形缓冲区读取状态绘制，并播放模拟进程请求的音效
+
+    world是本进程中的一个Game，只使用它的地图区块、摄像机、状态栏、图像和音效，不运行模拟。
+    """
+
+    def __init__(self, world, ring):
+        from tank_battle import load_image, get_asset_path, tank_orientations
+        self.world = world
+        self.ring = ring
+        self.tank_images = (tank_orientations(world.player.original_image),
+                            tank_orientations(world.robot.original_image))
+        self.projectile_images = (world.player.bullet_image, world.player.missile_image)
+        self.explosion_image = load_image(get_asset_path('explosion.svg'))
+        self._explosion_sizes = {}
+        self.last_tick = 0
+        self.torn_frames = 0  # 读取期间被覆盖而放弃的帧
+
+    def explosion_frame(self, size):
+        image = self._explosion_sizes.get(size)
+        if image is None:
+            image = pygame.transform.scale(self.explosion_image, (size, size))
+            self._explosion_sizes[size] = image
+        return image
+
+    def play_sounds(self, tick):
+        # 合并上次绘制之后各步的音效请求，每种音效最多播放一次
+        data = self.ring.data
+        first = max(self.last_tick + 1, tick - self.ring.slots + 1)
+        plays = [0] * len(SOUND_NAMES)
+        stops = [0] * len(SOUND_NAMES)
+        for past in range(first, tick + 1):
+            base = self.ring.slot(past)
+            if data[base + TICK] != past:
+                continue
+            for index in range(len(SOUND_NAMES)):
+                plays[index] += data[base + SOUND_PLAYS + index]
+                stops[index] += data[base + SOUND_STOPS + index]
+        sound_manager = self.world.sound_manager
+        for index, name in enumerate(SOUND_NAMES):
+            if stops[index]:
+                sound_manager.stop_sound(name)
+            if plays[index]:
+                sound_manager.play_sound(name)
+
+    def draw(self, surface, tick):
+        """绘制第tick步的状态，数据在读取期间被覆盖时返回False"""
+        data = self.ring.data
+        base = self.ring.slot(tick)
+        seq = data[base + SEQ]
+        if seq & 1 or data[base + TICK] != tick:
+            return False
+
+        world = self.world
+        camera = world.camera
+        camera.rect.topleft = (data[base + CAMERA_X], data[base + CAMERA_Y])
+        view = camera.rect
+        view_x, view_y = view.x, view.y
+        pipeline = world.render_pipeline
+        pipeline.begin()
+        for chunk, position in world.tile_map.visible_chunks(view):
+            pipeline.submit(LAYER_GROUND, chunk, position)
+
+        # 直接从共享内存读取，不复制整个槽
+        offset = base + TANKS_OFFSET
+        for _ in range(data[base + TANK_COUNT]):
+            image = self.tank_images[data[offset + 3]][data[offset + 2]][0]
+            pipeline.submit(LAYER_TANKS, image, (data[offset] - view_x, data[offset + 1] - view_y))
+            offset += TANK_FIELDS
+        offset = base + PROJECTILES_OFFSET
+        for _ in range(data[base + PROJECTILE_COUNT]):
+            image = self.projectile_images[data[offset + 2]]
+            pipeline.submit(LAYER_PROJECTILES, image, (data[offset] - view_x, data[offset + 1] - view_y))
+            offset += PROJECTILE_FIELDS
+        offset = base + EXPLOSIONS_OFFSET
+        for _ in range(data[base + EXPLOSION_COUNT]):
+            size = data[offset + 2]
+            position = (data[offset] - size // 2 - view_x, data[offset + 1] - size // 2 - view_y)
+            pipeline.submit(LAYER_EFFECTS, self.explosion_frame(size), position)
+            offset += EXPLOSION_FIELDS
+        player_health = data[base + PLAYER_HEALTH]
+        robot_health = data[base + ROBOT_HEALTH]
+        game_over = data[base + GAME_OVER]
+        winner = WINNERS[data[base + WINNER]]
+
+        if data[base + SEQ] != seq:
+            self.torn_frames += 1
+            return False
+
+        pipeline.flush(surface)
+        world.render_count += 1
+        if not game_over:
+            world.player.health = player_health
+            world.robot.health = robot_health
+            world.status_display.show_health(surface, world.player, world.robot)
+        elif winner == 'player':
+            world.status_display.show_message(surface, "你赢了! 按R键重新开始", (0, 255, 0))
+        else:
+            world.status_display.show_message(surface, "你输了! 按R键重新开始", (255, 0, 0))
+        return True
+
+
+def run_split(robot_count=None, world_size=None, map_path=None, telemetry_dir=None, history_path=None):
+    """在两个进程中运行游戏：子进程模拟，本进程处理输入、渲染和音效"""
+    from tank_battle import Game, screen, clock, FPS
+
+    game_map = load_map(map_path) if map_path else None
+    world = Game(robot_count, world_size=world_size, game_map=game_map)
+    ring = StateRing()
+    inputs = InputChannel()
+    renderer = SplitRenderer(world, ring)
+
+    context = multiprocessing.get_context('spawn')
+    process = context.Process(target=_sim_main, daemon=True,
+                              args=(ring.name, inputs.name, world.robot_count, world_size, map_path, telemetry_dir,
+                                    history_path))
+    # spawn启动的子进程会重新导入主模块，在那之前就要让它使用dummy驱动，不打开窗口和声音设备
+    saved = {key: os.environ.get(key) for key in ('SDL_VIDEODRIVER', 'SDL_AUDIODRIVER')}
+    os.environ.update(SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy')
+    try:
+        process.start()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    log.info("模拟进程已启动: pid=%s", process.pid)
+
+    try:
+        # 与单进程时一样只在一个地方读取输入；短按在共享内存中保留一帧，模拟进程按自己的步调读取
+        stage = InputStage()
+        while not stage.quit and process.is_alive():
+            for event in stage.poll():
+                if event.key == K_r:
+                    inputs.data[INPUT_RESTARTS] += 1
+            inputs.write_keys(stage.keys)
+            stage.step_done()
+
+            tick = ring.latest
+            if tick > renderer.last_tick:
+                renderer.play_sounds(tick)
+                renderer.last_tick = tick
+                if renderer.draw(screen, tick):
+                    pygame.display.flip()
+            clock.tick(FPS)
+    finally:
+        inputs.data[INPUT_QUIT] = 1
+        process.join(2.0)
+        if process.is_alive():
+            process.terminate()
+        log.info("模拟进程已退出，放弃的帧: %s", renderer.torn_frames)
+        ring.close(unlink=True)
+        inputs.close(unlink=True)
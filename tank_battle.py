@@ -3,31 +3,51 @@ import sys
 import random
 import math
 import os
-import traceback
+import time
 from pygame.locals import *
 from assets.sound_manager import SoundManager
+from config import (NAV_CELL_SIZE, NAV_CLEARANCE, LOS_CELL_SIZE, LOS_MARGIN, FLOW_BUILD_BUDGET, DEFAULT_MAP, AI_THINK_INTERVAL, AI_FAR_THINK_INTERVAL,
+                    AI_FAR_DISTANCE, AI_FRAME_BUDGET_MS, AI_BATCH_DECISIONS, TILE_SIZE, CHUNK_TILES,
+                    ACTIVE_MARGIN, OFFSCREEN_UPDATE_INTERVAL, QUALITY_WINDOW, QUALITY_DOWNGRADE_RATIO,
+                    QUALITY_UPGRADE_RATIO, QUALITY_UPGRADE_DELAY, SIM_RATE, MAX_SIM_STEPS_PER_FRAME,
+                    FAST_FORWARD_SPEEDS, UNBOUNDED_FRAME_MS, CRASH_LOG, SPLIT_SIMULATION,
+                    TELEMETRY_DIR, MATCH_HISTORY_DB, TIMER_WHEEL_BITS, TIMER_WHEEL_LEVELS,
+                    INPUT_LATENCY_SAMPLES)
+from navigation import FlowField, shared_nav_grid, shared_line_of_sight
+from ai_scheduler import AIScheduler
+from world import Camera, TileMap
+from game_map import load_map
+from render_pipeline import RenderPipeline, LAYER_GROUND, LAYER_TANKS, LAYER_PROJECTILES, LAYER_EFFECTS
+from quality_governor import QualityGovernor, QUALITY_LEVELS
+from sim_loop import FixedStepLoop
+from collision import first_hit, mask_for, MaskCollider
+from game_log import log
+from entities import EntityStore
+from sim_process import run_split
+from telemetry import telemetry
+from match_history import history, new_match_stats
+from timer_wheel import TimerWheel
+from input_stage import InputStage, InputLatency
 
-# 调试模式
-DEBUG_MODE = True
-
-def debug_print(message):
-    """打印调试信息"""
-    if DEBUG_MODE:
-        print(f"[DEBUG] {message}")
+# 批量AI决策依赖numpy，没有安装时退回逐个机器人决策
+try:
+    from ai_batch import batch_ai_shoot
+except ImportError:
+    batch_ai_shoot = None
 
 # 初始化pygame
-debug_print("正在初始化pygame...")
+log.debug("正在初始化pygame...")
 try:
     pygame.init()
-    debug_print(f"Pygame初始化完成: {pygame.get_init()}")
-    debug_print(f"Pygame版本: {pygame.version.ver}")
-    debug_print(f"SDL版本: {'.'.join(map(str, pygame.version.SDL))}")
+    log.debug("Pygame初始化完成: %s", pygame.get_init())
+    log.debug("Pygame版本: %s", pygame.version.ver)
+    log.debug("SDL版本: %s", '.'.join(map(str, pygame.version.SDL)))
     
     # 检查已初始化的模块
     initialized_modules = []
     # pygame.get_init()返回的是一个布尔值，不能使用_asdict()
     # 获取已初始化的模块信息
-    debug_print("检查已初始化的模块...")
+    log.debug("检查已初始化的模块...")
     if pygame.display.get_init():
         initialized_modules.append("display")
     if pygame.font.get_init():
@@ -36,10 +56,10 @@ try:
         initialized_modules.append("mixer")
     if pygame.joystick.get_init():
         initialized_modules.append("joystick")
-    debug_print(f"已初始化的模块: {', '.join(initialized_modules)}")
+    log.debug("已初始化的模块: %s", ', '.join(initialized_modules))
 except Exception as e:
-    print(f"pygame初始化失败: {e}")
-    traceback.print_exc()
+    log.exception("pygame初始化失败: %s", e)
+    log.flush()
     sys.exit(1)
 
 # 游戏常量
@@ -60,98 +80,100 @@ screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption('坦克大战')
 clock = pygame.time.Clock()
 
+# 已加载图像的缓存，同一张图片在多个坦克、爆炸之间共享
+_image_cache = {}
+
 # 加载图像函数
 def load_image(name, scale=1):
+    cached = _image_cache.get((name, scale))
+    if cached is not None:
+        return cached
     try:
-        debug_print(f"正在加载图像: {name}")
+        log.debug("正在加载图像: %s", name)
         if not os.path.exists(name):
-            print(f"错误: 图像文件不存在: {name}")
-            debug_print(f"检查当前工作目录: {os.getcwd()}")
-            debug_print(f"检查文件是否存在: {os.path.exists(name)}")
-            debug_print(f"检查父目录是否存在: {os.path.exists(os.path.dirname(name))}")
+            log.error("错误: 图像文件不存在: %s", name)
+            log.debug("检查当前工作目录: %s", os.getcwd())
+            log.debug("检查文件是否存在: %s", os.path.exists(name))
+            log.debug("检查父目录是否存在: %s", os.path.exists(os.path.dirname(name)))
             raise FileNotFoundError(f"图像文件不存在: {name}")
             
-        debug_print(f"文件存在，尝试加载: {name}")
+        log.debug("文件存在，尝试加载: %s", name)
         image = pygame.image.load(name).convert_alpha()
         size = image.get_size()
         size = (int(size[0] * scale), int(size[1] * scale))
-        debug_print(f"图像加载成功: {name}, 原始尺寸: {image.get_size()}, 缩放尺寸: {size}")
-        return pygame.transform.scale(image, size)
+        log.debug("图像加载成功: %s, 原始尺寸: %s, 缩放尺寸: %s", name, image.get_size(), size)
+        image = pygame.transform.scale(image, size)
+        _image_cache[(name, scale)] = image
+        return image
     except pygame.error as e:
-        print(f"无法加载图像: {name}")
-        print(f"错误详情: {e}")
-        debug_print(f"Pygame错误详情: {e}")
+        log.error("无法加载图像: %s", name)
+        log.error("错误详情: %s", e)
         # 创建一个默认的表面作为替代
         surface = pygame.Surface((30, 30))
         surface.fill((255, 0, 255))  # 使用洋红色表示缺失的纹理
-        debug_print("返回洋红色默认表面")
+        log.debug("返回洋红色默认表面")
         return surface
     except Exception as e:
-        print(f"加载图像时发生未知错误: {name}")
-        print(f"错误类型: {type(e).__name__}, 错误详情: {e}")
-        debug_print(f"错误详情: {e}")
-        traceback.print_exc()
+        log.error("加载图像时发生未知错误: %s", name)
+        log.exception("错误类型: %s, 错误详情: %s", type(e).__name__, e)
         # 创建一个默认的表面作为替代
         surface = pygame.Surface((30, 30))
         surface.fill((255, 0, 0))  # 使用红色表示错误
-        debug_print("返回红色默认表面")
+        log.debug("返回红色默认表面")
         return surface
 
 # 资源路径
+# 资源目录和已解析的资源路径，只在第一次请求某个文件时访问文件系统
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+_asset_paths = {}
+
 def get_asset_path(filename):
+    asset_path = _asset_paths.get(filename)
+    if asset_path is not None:
+        return asset_path
     try:
-        debug_print(f"获取资源路径: {filename}")
-        # 获取当前脚本的绝对路径
-        current_script_path = os.path.abspath(__file__)
-        debug_print(f"当前脚本路径: {current_script_path}")
-        
-        # 获取脚本所在目录
-        script_dir = os.path.dirname(current_script_path)
-        debug_print(f"脚本所在目录: {script_dir}")
-        
-        # 检查资源目录是否存在
-        assets_dir = os.path.join(script_dir, 'assets')
-        debug_print(f"资源目录路径: {assets_dir}")
-        
-        if not os.path.exists(assets_dir):
-            print(f"资源目录不存在: {assets_dir}")
-            debug_print(f"尝试创建资源目录: {assets_dir}")
-            os.makedirs(assets_dir, exist_ok=True)
-            debug_print(f"已创建资源目录: {assets_dir}")
-        else:
-            debug_print(f"资源目录已存在: {assets_dir}")
-            # 列出资源目录中的文件
-            files = os.listdir(assets_dir)
-            debug_print(f"资源目录中的文件: {files}")
-        
-        # 构建资源文件的完整路径
-        asset_path = os.path.join(assets_dir, filename)
-        debug_print(f"完整资源路径: {asset_path}")
+        asset_path = os.path.join(ASSETS_DIR, filename)
+        log.debug("资源路径: %s", asset_path)
         
         # 检查资源文件是否存在
         if not os.path.exists(asset_path):
-            print(f"警告: 资源文件不存在: {asset_path}")
-            debug_print(f"检查当前工作目录: {os.getcwd()}")
+            log.warning("警告: 资源文件不存在: %s", asset_path)
             # 尝试在当前工作目录查找
             alt_path = os.path.join(os.getcwd(), 'assets', filename)
-            debug_print(f"尝试替代路径: {alt_path}")
             if os.path.exists(alt_path):
-                debug_print(f"在替代路径找到文件: {alt_path}")
-                return alt_path
-        else:
-            debug_print(f"资源文件存在: {asset_path}")
-        
-        return asset_path
+                log.debug("在替代路径找到文件: %s", alt_path)
+                asset_path = alt_path
     except Exception as e:
-        print(f"获取资源路径时出错: {e}")
+        log.error("获取资源路径时出错: %s", e)
         # 返回原始路径，让后续代码处理文件不存在的情况
-        return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', filename)
+        asset_path = os.path.join(ASSETS_DIR, filename)
+    _asset_paths[filename] = asset_path
+    return asset_path
+
+# 每种坦克原图四个方向的(旋转后的图像, 碰撞遮罩)，同类坦克共用，绘制时也能按图像合批
+_orientation_cache = {}
+
+def tank_orientations(original_image):
+    orientations = _orientation_cache.get(original_image)
+    if orientations is None:
+        orientations = []
+        for direction in range(4):
+            angle = -90 * direction  # 转换方向为角度
+            image = pygame.transform.rotate(original_image, angle)
+            orientations.append((image, mask_for(image)))
+        orientations = tuple(orientations)
+        _orientation_cache[original_image] = orientations
+    return orientations
 
 # 坦克基类
 class Tank(pygame.sprite.Sprite):
+    components = frozenset(('tank', 'moving'))
+    team = None
+    
     def __init__(self, x, y, speed, tank_image, bullet_image, missile_image):
         super().__init__()
         self.image = tank_image
+        self.mask = mask_for(tank_image)
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
@@ -166,40 +188,99 @@ class Tank(pygame.sprite.Sprite):
         # 射击冷却时间
         self.bullet_cooldown = 300  # 毫秒
         self.missile_cooldown = 1000  # 毫秒
-        self.last_shot = 0
-        self.last_missile = 0
-        self.cooldown = 0
-        self.missile_cooldown = 0
+        self.bullet_ready = True  # 冷却中为False，由计时轮在冷却结束的那一步置回True
+        self.missile_ready = True
         self.original_image = self.image
+        self.timers = None  # 由Game注入的计时轮，冷却按模拟步计时
+        self.world_rect = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)  # 可活动的世界范围
+        self.obstacle_rects = []  # 由Game注入的障碍物矩形，移动时做扫掠检测
+        self.blocked = False  # 上一次移动是否被障碍物挡住
     
     def update(self):
-        # 冷却时间更新已经不需要了，因为我们使用了基于时间戳的冷却系统
+        # 冷却由计时轮结束，坦克本身没有每步要更新的状态
         pass
     
     def move(self, dx, dy):
+        # 沿整段移动路径检测障碍物，碰到时停在接触的位置，一步走得再远也不会穿墙
+        # 已经嵌入的障碍物不拦截，由Game的碰撞响应推出来，但路径上的其他障碍物照样拦截
+        self.blocked = False
+        if self.obstacle_rects:
+            hit = first_hit(self.rect, dx, dy, self.obstacle_rects, skip_overlapping=True)
+            if hit is not None:
+                hit_time = hit[0]
+                dx, dy = round(dx * hit_time), round(dy * hit_time)
+                self.blocked = True
+        
         # 计算新位置
         new_x = self.rect.x + dx
         new_y = self.rect.y + dy
         
         # 边界检查
-        if 0 <= new_x <= SCREEN_WIDTH - self.rect.width:
+        world = self.world_rect
+        if world.left <= new_x <= world.right - self.rect.width:
             self.rect.x = new_x
-        if 0 <= new_y <= SCREEN_HEIGHT - self.rect.height:
+        if world.top <= new_y <= world.bottom - self.rect.height:
             self.rect.y = new_y
     
     def rotate(self, direction):
         self.direction = direction
-        angle = -90 * direction  # 转换方向为角度
-        self.image = pygame.transform.rotate(self.original_image, angle)
+        self.image, self.mask = tank_orientations(self.original_image)[direction]
         self.rect = self.image.get_rect(center=self.rect.center)
     
+    def drive(self, keys):
+        # 按按键状态移动和射击，返回发射的炮弹/导弹
+        # 移动控制 - 先确定方向，只在方向改变时才旋转
+        new_direction = None
+        if keys[K_w]:
+            new_direction = 0  # 上
+        elif keys[K_d]:
+            new_direction = 1  # 右
+        elif keys[K_s]:
+            new_direction = 2  # 下
+        elif keys[K_a]:
+            new_direction = 3  # 左
+        
+        # 只在方向改变时才旋转
+        if new_direction is not None and new_direction != self.direction:
+            self.rotate(new_direction)
+        
+        # 根据当前方向移动
+        if self.direction == 0 and keys[K_w]:  # 上
+            self.move(0, -self.speed)
+        elif self.direction == 1 and keys[K_d]:  # 右
+            self.move(self.speed, 0)
+        elif self.direction == 2 and keys[K_s]:  # 下
+            self.move(0, self.speed)
+        elif self.direction == 3 and keys[K_a]:  # 左
+            self.move(-self.speed, 0)
+        
+        # 添加射击控制
+        if keys[K_SPACE]:
+            bullet = self.shoot_bullet()
+            if bullet:
+                return bullet
+        
+        # 添加导弹控制
+        if keys[K_m]:
+            missile = self.shoot_missile()
+            if missile:
+                return missile
+        
+        return None
+    
+    def start_cooldown(self, flag, cooldown):
+        # 冷却时间按模拟步向上取整，期间flag为False，到期时由计时轮置回True
+        delay = -(-cooldown * SIM_RATE // 1000)
+        if delay > 0:
+            setattr(self, flag, False)
+            self.timers.schedule(delay, setattr, self, flag, True)
+    
     def shoot_bullet(self):
         # 检查冷却时间
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_shot < self.bullet_cooldown:
+        if not self.bullet_ready:
             return None
         
-        self.last_shot = current_time
+        self.start_cooldown('bullet_ready', self.bullet_cooldown)
         
         # 根据坦克方向确定子弹的初始位置和速度
         bullet_speed = 10
@@ -225,11 +306,10 @@ class Tank(pygame.sprite.Sprite):
     
     def shoot_missile(self):
         # 检查冷却时间
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_missile < self.missile_cooldown:
+        if not self.missile_ready:
             return None
         
-        self.last_missile = current_time
+        self.start_cooldown('missile_ready', self.missile_cooldown)
         
         # 根据坦克方向确定导弹的初始位置和速度
         missile_speed = 7
@@ -269,6 +349,9 @@ class Tank(pygame.sprite.Sprite):
 
 # 玩家坦克类
 class PlayerTank(Tank):
+    components = Tank.components | {'friendly'}
+    team = 'friendly'
+    
     def __init__(self, x, y):
         # 加载坦克图像
         tank_image = load_image(get_asset_path('player_tank.svg'))
@@ -277,52 +360,22 @@ class PlayerTank(Tank):
         
         super().__init__(x, y, 5, tank_image, bullet_image, missile_image)
         self.original_image = self.image
+        self.input_keys = None  # 外部注入的按键状态（如训练环境），为None时读取键盘
+    
+    def current_keys(self):
+        if self.input_keys is not None:
+            return self.input_keys
+        return pygame.key.get_pressed()
     
     def update(self):
         super().update()
-        keys = pygame.key.get_pressed()
-        
-        # 移动控制 - 先确定方向，只在方向改变时才旋转
-        new_direction = None
-        if keys[K_w]:
-            new_direction = 0  # 上
-        elif keys[K_d]:
-            new_direction = 1  # 右
-        elif keys[K_s]:
-            new_direction = 2  # 下
-        elif keys[K_a]:
-            new_direction = 3  # 左
-        
-        # 只在方向改变时才旋转
-        if new_direction is not None and new_direction != self.direction:
-            self.rotate(new_direction)
-        
-        # 根据当前方向移动
-        if self.direction == 0 and keys[K_w]:  # 上
-            self.move(0, -self.speed)
-        elif self.direction == 1 and keys[K_d]:  # 右
-            self.move(self.speed, 0)
-        elif self.direction == 2 and keys[K_s]:  # 下
-            self.move(0, self.speed)
-        elif self.direction == 3 and keys[K_a]:  # 左
-            self.move(-self.speed, 0)
-        
-        # 添加射击控制
-        if keys[K_SPACE]:
-            bullet = self.shoot_bullet()
-            if bullet:
-                return bullet
-        
-        # 添加导弹控制
-        if keys[K_m]:
-            missile = self.shoot_missile()
-            if missile:
-                return missile
-        
-        return None
+        return self.drive(self.current_keys())
 
 # 机器人坦克类
 class RobotTank(Tank):
+    components = Tank.components | {'hostile'}
+    team = 'hostile'
+    
     def __init__(self, x, y):
         # 加载坦克图像
         tank_image = load_image(get_asset_path('robot_tank.svg'))
@@ -331,32 +384,89 @@ class RobotTank(Tank):
         
         super().__init__(x, y, 3, tank_image, bullet_image, missile_image)
         self.original_image = self.image
-        self.move_timer = 0
-        self.move_interval = 60  # 每隔一段时间改变移动方向
+        self.move_interval = 60  # 随机游走时每隔多少步改变移动方向
+        self.turn_timer = None  # 随机游走时登记在计时轮上的换向计时器
+        self.turn_remaining = self.move_interval  # 不在随机游走时换向还需要的步数
+        self.turn_due = False
         self.target = None
+        self.flow_field = None  # 由Game注入的共享流场
+        self.line_of_sight = None  # 由Game注入的共享视线查询
+        self.input_keys = None  # 由外部程序（如比赛中的机器人程序）控制时的按键状态，设置后不使用内置AI
     
-    def update(self):
+    def update(self, frames=1):
+        # frames大于1时一次推进多帧（屏幕外的低精度模拟）
         super().update()
+        step = self.speed * frames
+        
+        # 优先沿共享流场向目标前进
+        direction = None
+        if self.flow_field is not None:
+            direction = self.flow_field.direction_at(*self.rect.center)
+        if direction is not None:
+            self.pause_turn(frames)
+            self.follow_flow(direction, step)
+            return
         
-        # 定时改变移动方向
-        self.move_timer += 1
-        if self.move_timer >= self.move_interval:
-            self.move_timer = 0
+        # 没有可用流场时退回随机游走
+        # 定时改变移动方向：只有随机游走经过的步数计入换向时间，包括这次更新推进的步数
+        if self.turn_timer is None:
+            if self.turn_remaining > frames:
+                self.turn_timer = self.timers.schedule(self.turn_remaining - frames, self.turn)
+            else:
+                self.turn_due = True
+        if self.turn_due:
+            self.turn_due = False
+            self.turn_timer = self.timers.schedule(self.move_interval, self.turn)
             new_direction = random.randint(0, 3)
             if new_direction != self.direction:  # 只在方向改变时才旋转
                 self.rotate(new_direction)
         
+        self.move_forward(step)
+    
+    def turn(self):
+        # 计时轮回调：下一次随机游走的更新时换向
+        self.turn_due = True
+    
+    def pause_turn(self, frames):
+        # 改为沿流场前进时取消换向计时，记下到上次随机游走更新时为止还差的步数
+        if self.turn_timer is not None:
+            self.turn_remaining = self.turn_timer.deadline - (self.timers.now - frames)
+            self.timers.cancel(self.turn_timer)
+            self.turn_timer = None
+            self.turn_due = False
+    
+    def follow_flow(self, direction, step):
+        # 先在垂直于前进方向的轴上对齐格子中心，再沿流场方向前进，避免擦到墙角
+        grid = self.flow_field.grid
+        col, row = grid.cell_at(*self.rect.center)
+        if not grid.is_blocked(col, row):
+            center_x, center_y = grid.cell_center(col, row)
+            if direction in (0, 2):
+                offset = center_x - self.rect.centerx
+                align_direction = 1 if offset > 0 else 3
+            else:
+                offset = center_y - self.rect.centery
+                align_direction = 2 if offset > 0 else 0
+            if offset != 0:
+                direction = align_direction
+                step = min(step, abs(offset))
+        
+        if direction != self.direction:  # 只在方向改变时才旋转
+            self.rotate(direction)
+        self.move_forward(step)
+    
+    def move_forward(self, step):
         # 根据当前方向移动
         if self.direction == 0:  # 上
-            self.move(0, -self.speed)
+            self.move(0, -step)
         elif self.direction == 1:  # 右
-            self.move(self.speed, 0)
+            self.move(step, 0)
         elif self.direction == 2:  # 下
-            self.move(0, self.speed)
+            self.move(0, step)
         elif self.direction == 3:  # 左
-            self.move(-self.speed, 0)
+            self.move(-step, 0)
     
-    def ai_shoot(self, player):
+    def ai_shoot(self, player, elapsed_frames=1):
         # 设置目标
         self.target = player
         
@@ -365,34 +475,56 @@ class RobotTank(Tank):
         dy = player.rect.centery - self.rect.centery
         distance = math.sqrt(dx * dx + dy * dy)
         
-        # 根据距离和随机因素决定是否射击
-        if distance < 300 and random.random() < 0.03:
-            # 确定射击方向
-            if abs(dx) > abs(dy):
-                if dx > 0:
-                    self.rotate(1)  # 右
-                else:
-                    self.rotate(3)  # 左
-            else:
-                if dy > 0:
-                    self.rotate(2)  # 下
-                else:
-                    self.rotate(0)  # 上
+        # 每帧3%的开火几率；隔多帧才思考一次时按经过的帧数折算，保持开火频率不变
+        fire_chance = 0.03 if elapsed_frames == 1 else 1 - 0.97 ** elapsed_frames
+        
+        # 确定射击方向：水平距离更大时朝左右，否则朝上下
+        if abs(dx) > abs(dy):
+            direction = 1 if dx > 0 else 3  # 右 / 左
+        else:
+            direction = 2 if dy > 0 else 0  # 下 / 上
+        
+        # 根据距离和随机因素决定是否射击，弹道被障碍物挡住时不浪费弹药
+        if distance < 300 and random.random() < fire_chance and self.has_line_of_sight(player, direction):
+            self.rotate(direction)
             
             # 随机决定使用炮弹还是导弹
-            current_time = pygame.time.get_ticks()
-            if random.random() < 0.2 and current_time - self.last_missile >= self.missile_cooldown:
+            if random.random() < 0.2 and self.missile_ready:
                 return self.shoot_missile()
-            elif current_time - self.last_shot >= self.bullet_cooldown:
+            elif self.bullet_ready:
                 return self.shoot_bullet()
         
         return None
+    
+    def has_line_of_sight(self, player, direction):
+        # 弹药从炮口沿射击方向直线飞行：检查从炮口到弹道与目标齐平处的这一段
+        # （视线栅格中的障碍物已按弹体半径膨胀）
+        if self.line_of_sight is None:
+            return True
+        x, y = self.rect.center
+        if direction == 0:
+            y -= self.rect.height // 2
+            end_x, end_y = x, player.rect.centery
+        elif direction == 1:
+            x += self.rect.width // 2
+            end_x, end_y = player.rect.centerx, y
+        elif direction == 2:
+            y += self.rect.height // 2
+            end_x, end_y = x, player.rect.centery
+        else:
+            x -= self.rect.width // 2
+            end_x, end_y = player.rect.centerx, y
+        return self.line_of_sight.is_clear(x, y, end_x, end_y)
 
 # 子弹/导弹类
 class Bullet(pygame.sprite.Sprite):
+    # 每个阵营一份组件集合，发射时按阵营选用，不为每颗炮弹新建
+    team_components = {team: frozenset(('projectile', 'moving', team)) for team in ('friendly', 'hostile')}
+    
     def __init__(self, x, y, dx, dy, direction, owner):
         super().__init__()
         self.image = owner.bullet_image
+        self.mask = mask_for(self.image)
         self.rect = self.image.get_rect()
         self.rect.centerx = x
         self.rect.centery = y
@@ -402,21 +534,30 @@ class Bullet(pygame.sprite.Sprite):
         self.owner = owner
         self.is_missile = False
         self.damage = 10
+        self.world_rect = owner.world_rect
+        self.components = self.team_components[owner.team]  # 与发射者同一阵营
+        self.last_move = (0, 0)  # 上一次更新的位移，碰撞检测按这段路径扫掠
     
-    def update(self):
-        # 根据速度向量移动
-        self.rect.x += self.dx
-        self.rect.y += self.dy
+    def update(self, frames=1):
+        # 根据速度向量移动，frames大于1时一次推进多帧
+        move_x, move_y = self.dx * frames, self.dy * frames
+        self.rect.x += move_x
+        self.rect.y += move_y
+        self.last_move = (move_x, move_y)
         
-        # 如果超出屏幕边界，则删除
-        if (self.rect.right < 0 or self.rect.left > SCREEN_WIDTH or
-            self.rect.bottom < 0 or self.rect.top > SCREEN_HEIGHT):
+        # 如果超出世界边界，则删除
+        world = self.world_rect
+        if (self.rect.right < world.left or self.rect.left > world.right or
+            self.rect.bottom < world.top or self.rect.top > world.bottom):
             self.kill()
 
 class Missile(pygame.sprite.Sprite):
+    team_components = Bullet.team_components
+    
     def __init__(self, x, y, dx, dy, direction, owner):
         super().__init__()
         self.image = owner.missile_image
+        self.mask = mask_for(self.image)
         self.rect = self.image.get_rect()
         self.rect.centerx = x
         self.rect.centery = y
@@ -426,19 +567,27 @@ class Missile(pygame.sprite.Sprite):
         self.owner = owner
         self.is_missile = True
         self.damage = 30
+        self.world_rect = owner.world_rect
+        self.components = self.team_components[owner.team]  # 与发射者同一阵营
+        self.last_move = (0, 0)  # 上一次更新的位移，碰撞检测按这段路径扫掠
     
-    def update(self):
-        # 根据速度向量移动
-        self.rect.x += self.dx
-        self.rect.y += self.dy
+    def update(self, frames=1):
+        # 根据速度向量移动，frames大于1时一次推进多帧
+        move_x, move_y = self.dx * frames, self.dy * frames
+        self.rect.x += move_x
+        self.rect.y += move_y
+        self.last_move = (move_x, move_y)
         
-        # 如果超出屏幕边界，则删除
-        if (self.rect.right < 0 or self.rect.left > SCREEN_WIDTH or
-            self.rect.bottom < 0 or self.rect.top > SCREEN_HEIGHT):
+        # 如果超出世界边界，则删除
+        world = self.world_rect
+        if (self.rect.right < world.left or self.rect.left > world.right or
+            self.rect.bottom < world.top or self.rect.top > world.bottom):
             self.kill()
 
 # 爆炸效果类
 class Explosion(pygame.sprite.Sprite):
+    components = frozenset(('effect',))
+    
     def __init__(self, center, is_large=False):
         super().__init__()
         self.size = 50 if is_large else 30
@@ -449,17 +598,21 @@ class Explosion(pygame.sprite.Sprite):
         self.frame = 0
         self.max_frame = 5
     
-    def update(self):
-        self.frame += 1
+    def next_frame(self, frame_step=1):
+        # 下一个需要缩小图像或结束动画的帧（画质降低时跳过部分帧，不重新缩放图像）
+        return min((self.frame // frame_step + 1) * frame_step, self.max_frame)
+    
+    def update(self, frame):
+        # 由Game在计时轮到期时调用，中间的帧不做任何事
+        self.frame = frame
         if self.frame >= self.max_frame:
             self.kill()  # 确保从所有精灵组中移除
             return True  # 返回True表示已经完成爆炸动画
-        else:
-            # 爆炸动画效果
-            size = int(self.size * (1 - self.frame / self.max_frame))
-            self.image = pygame.transform.scale(self.original_image, (size, size))
-            self.rect = self.image.get_rect(center=self.rect.center)
-            return False  # 返回False表示爆炸动画还在进行中
+        # 爆炸动画效果
+        size = int(self.size * (1 - self.frame / self.max_frame))
+        self.image = pygame.transform.scale(self.original_image, (size, size))
+        self.rect = self.image.get_rect(center=self.rect.center)
+        return False  # 返回False表示爆炸动画还在进行中
 
 # 游戏状态显示
 class StatusDisplay:
@@ -478,28 +631,35 @@ class StatusDisplay:
             for font in possible_fonts:
                 if os.path.exists(font):
                     font_path = font
-                    debug_print(f"找到中文字体: {font}")
+                    log.debug("找到中文字体: %s", font)
                     break
             
             if font_path:
                 self.font = pygame.font.Font(font_path, 36)
-                debug_print("成功加载中文字体")
+                log.debug("成功加载中文字体")
             else:
                 # 如果找不到中文字体，使用默认字体
-                debug_print("未找到中文字体，使用默认字体")
+                log.debug("未找到中文字体，使用默认字体")
                 self.font = pygame.font.Font(None, 36)
         except Exception as e:
-            debug_print(f"加载字体时出错: {e}")
+            log.debug("加载字体时出错: %s", e)
             # 出错时使用默认字体
             self.font = pygame.font.Font(None, 36)
+        self.health_texts = None  # 上次渲染的生命值文字
     
-    def show_health(self, surface, player, robot):
+    def show_health(self, surface, player, robot, refresh=True):
+        # refresh为False时直接使用上次渲染的文字，省去字体渲染
+        if refresh or self.health_texts is None:
+            self.health_texts = (
+                self.font.render(f"玩家生命: {player.health}", True, GREEN),
+                self.font.render(f"机器人生命: {robot.health}", True, RED),
+            )
+        player_health_text, robot_health_text = self.health_texts
+        
         # 显示玩家生命值
-        player_health_text = self.font.render(f"玩家生命: {player.health}", True, GREEN)
         surface.blit(player_health_text, (10, 10))
         
         # 显示机器人生命值
-        robot_health_text = self.font.render(f"机器人生命: {robot.health}", True, RED)
         surface.blit(robot_health_text, (SCREEN_WIDTH - 200, 10))
     
     def show_message(self, surface, message, color=WHITE):
@@ -509,6 +669,8 @@ class StatusDisplay:
 
 # 障碍物类
 class Obstacle(pygame.sprite.Sprite):
+    components = frozenset(('obstacle', 'solid'))
+    
     def __init__(self, x, y, width, height):
         super().__init__()
         self.image = pygame.Surface((width, height))
@@ -519,60 +681,136 @@ class Obstacle(pygame.sprite.Sprite):
 
 # 主游戏类
 class Game:
-    def __init__(self):
+    def __init__(self, robot_count=None, sound_manager=None, world_size=None, game_map=None):
         try:
-            debug_print("正在初始化游戏对象...")
+            log.debug("正在初始化游戏对象...")
+            # 世界大小默认与屏幕相同，更大的世界由摄像机滚动显示；指定地图时以地图为准
+            self.game_map = game_map
+            self.world_size = world_size
+            if game_map is not None:
+                self.world_width, self.world_height = game_map.width, game_map.height
+            else:
+                self.world_width, self.world_height = world_size or (SCREEN_WIDTH, SCREEN_HEIGHT)
+            self.world_rect = pygame.Rect(0, 0, self.world_width, self.world_height)
             # 加载背景
             background_path = get_asset_path('background.svg')
-            debug_print(f"加载背景图像: {background_path}")
+            log.debug("加载背景图像: %s", background_path)
             self.background = load_image(background_path)
-            debug_print("背景加载完成")
+            self.tile_map = TileMap.from_image(self.background, self.world_width, self.world_height,
+                                               TILE_SIZE, chunk_tiles=CHUNK_TILES)
+            self.camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT, self.world_width, self.world_height)
+            log.debug("背景加载完成")
             
             # 初始化音效管理器
-            debug_print("初始化音效管理器...")
-            self.sound_manager = SoundManager()
-            debug_print("音效管理器初始化完成")
-            
-            # 创建精灵组
-            debug_print("创建精灵组...")
-            self.all_sprites = pygame.sprite.Group()
-            self.obstacles = pygame.sprite.Group()
-            self.player_bullets = pygame.sprite.Group()
-            self.robot_bullets = pygame.sprite.Group()
-            self.explosions = pygame.sprite.Group()
-            debug_print("精灵组创建完成")
+            log.debug("初始化音效管理器...")
+            self.sound_manager = sound_manager if sound_manager is not None else SoundManager()
+            log.debug("音效管理器初始化完成")
+            
+            # 创建实体存储，各精灵组是按组件缓存的查询，实体生成和消亡时自动更新
+            log.debug("创建精灵组...")
+            self.entities = EntityStore()
+            self.all_sprites = self.entities.query('moving')  # 动态精灵（坦克和弹药）
+            self.obstacles = self.entities.query('obstacle')
+            self.tanks = self.entities.query('tank')
+            self.projectiles = self.entities.query('projectile')
+            self.player_bullets = self.entities.query('projectile', 'friendly')
+            self.robot_bullets = self.entities.query('projectile', 'hostile')
+            self.explosions = self.entities.query('effect')
+            self.robots = self.entities.query('tank', 'hostile')
+            log.debug("精灵组创建完成")
             
             # 创建障碍物
-            debug_print("创建障碍物...")
+            log.debug("创建障碍物...")
             self.create_obstacles()
-            debug_print("障碍物创建完成")
+            self.obstacle_rects = [solid.rect for solid in self.entities.query('solid')]
+            # 弹药与坦克按遮罩做像素级检测，统计矩形筛选和遮罩检测的次数
+            self.collider = MaskCollider()
+            # 障碍物不会移动，预先合成进地图区块，不参与每帧的更新和绘制
+            self.tile_map.set_static_sprites(self.obstacles)
+            log.debug("障碍物创建完成")
+            
+            # 创建导航网格和共享流场
+            log.debug("创建导航网格...")
+            if game_map is not None:
+                # 编译好的地图自带导航和视线栅格
+                self.nav_grid = game_map.nav_grid
+                self.line_of_sight = game_map.line_of_sight
+            else:
+                self.nav_grid = shared_nav_grid(self.world_width, self.world_height, NAV_CELL_SIZE,
+                                                self.obstacle_rects, NAV_CLEARANCE)
+                self.line_of_sight = shared_line_of_sight(self.world_width, self.world_height,
+                                                          LOS_CELL_SIZE, self.obstacle_rects, LOS_MARGIN)
+            self.flow_field = FlowField(self.nav_grid, FLOW_BUILD_BUDGET)
             
             # 创建坦克
-            debug_print("创建玩家坦克...")
-            self.player = PlayerTank(100, 300)
-            debug_print("创建机器人坦克...")
-            self.robot = RobotTank(600, 300)
+            log.debug("创建玩家坦克...")
+            player_x, player_y = game_map.player_spawn if game_map is not None else (100, 300)
+            self.player = self.entities.spawn(PlayerTank(player_x, player_y))
+            log.debug("创建机器人坦克...")
+            if robot_count is None:
+                robot_count = game_map.robot_count if game_map is not None else 1
+            self.robot_count = robot_count
+            for slot, (x, y) in enumerate(self.robot_spawn_points(robot_count)):
+                robot = RobotTank(x, y)
+                robot.flow_field = self.flow_field
+                robot.line_of_sight = self.line_of_sight
+                robot.update_slot = slot  # 屏幕外低精度更新时错开的帧
+                self.entities.spawn(robot)
+            self.robot = self.robots.sprites()[0]  # 状态栏显示的机器人
+            
+            # AI调度器：错开各机器人的思考帧并限制每帧AI耗时
+            self.ai_scheduler = AIScheduler(AI_THINK_INTERVAL, AI_FAR_THINK_INTERVAL,
+                                            AI_FAR_DISTANCE, AI_FRAME_BUDGET_MS)
+            for robot in self.robots:
+                self.ai_scheduler.register(robot)
             
-            debug_print("将坦克添加到精灵组...")
-            self.all_sprites.add(self.player)
-            self.all_sprites.add(self.robot)
+            # 计时轮：冷却、机器人换向和爆炸动画按模拟步计时，与实际运行速度无关
+            self.frame = 0
+            self.timers = TimerWheel(TIMER_WHEEL_BITS, TIMER_WHEEL_LEVELS)
+            for tank in self.tanks:
+                tank.timers = self.timers
+                tank.world_rect = self.world_rect
+                tank.obstacle_rects = self.obstacle_rects
+                # 开局时两种弹药都从头开始冷却
+                tank.start_cooldown('bullet_ready', tank.bullet_cooldown)
+                tank.start_cooldown('missile_ready', tank.missile_cooldown)
+            self.camera.follow(self.player.rect)
+
+            
+            self.render_pipeline = RenderPipeline()
+            self.render_count = 0
+            # 上一步模拟结束时动态精灵的中心和视口位置，渲染时用于插值
+            self.previous_centers = {}
+            self.previous_view = self.camera.rect.topleft
+            
+            # 画质设置由主循环根据帧耗时调整，默认最高画质
+            self.quality = QUALITY_LEVELS[0]
+            self.sound_frame = -1
+            self.sounds_this_frame = 0
             
-            debug_print("创建状态显示...")
+            log.debug("创建状态显示...")
             self.status_display = StatusDisplay()
             self.game_over = False
             self.winner = None
+            self.match_stats = new_match_stats()
+            telemetry.begin_match()
             
             # 坦克移动音效状态
             self.player_moving = False
             
-            debug_print("游戏对象初始化完成")
+            log.debug("游戏对象初始化完成")
         except Exception as e:
-            print(f"游戏初始化失败: {type(e).__name__}: {e}")
-            traceback.print_exc()
+            log.exception("游戏初始化失败: %s: %s", type(e).__name__, e)
             raise
     
     def create_obstacles(self):
-        # 从背景SVG中提取障碍物位置
+        # 使用地图时直接采用编译好的碰撞盒
+        if self.game_map is not None:
+            for x, y, width, height in self.game_map.boxes:
+                self.entities.spawn(Obstacle(x, y, width, height))
+            return
+        
+        # 没有地图时使用内置布局（与背景SVG中的障碍物位置一致）
         obstacles = [
             (200, 150, 50, 50),  # x, y, width, height
             (550, 400, 50, 50),
@@ -581,71 +819,81 @@ class Game:
             (150, 450, 100, 30)
         ]
         
-        for x, y, width, height in obstacles:
-            obstacle = Obstacle(x, y, width, height)
-            self.obstacles.add(obstacle)
-            self.all_sprites.add(obstacle)
+        # 世界比屏幕大时，按屏幕大小的区块重复铺设这组障碍物（与背景瓦片对齐）
+        for block_y in range(0, self.world_height, SCREEN_HEIGHT):
+            for block_x in range(0, self.world_width, SCREEN_WIDTH):
+                for x, y, width, height in obstacles:
+                    if block_x + x + width > self.world_width or block_y + y + height > self.world_height:
+                        continue
+                    self.entities.spawn(Obstacle(block_x + x, block_y + y, width, height))
     
-    def process_events(self):
-        for event in pygame.event.get():
-            if event.type == QUIT:
-                return False
-            
-            if event.type == KEYDOWN:
-                if event.key == K_ESCAPE:
-                    return False
-                
-                # 玩家射击
-                if event.key == K_SPACE and not self.game_over:
-                    bullet = self.player.shoot_bullet()
-                    if bullet:
-                        self.all_sprites.add(bullet)
-                        self.player_bullets.add(bullet)
-                        self.sound_manager.play_sound('shoot')
-                
-                # 玩家发射导弹
-                if event.key == K_m and not self.game_over:
-                    missile = self.player.shoot_missile()
-                    if missile:
-                        self.all_sprites.add(missile)
-                        self.player_bullets.add(missile)
-                        self.sound_manager.play_sound('missile')
-                
-                # 重新开始游戏
-                if event.key == K_r and self.game_over:
-                    self.__init__()
+    def robot_spawn_points(self, count):
+        # 地图指定了出生点时依次循环使用
+        if self.game_map is not None and self.game_map.robot_spawns:
+            spawns = self.game_map.robot_spawns
+            return [spawns[i % len(spawns)] for i in range(count)]
         
-        return True
+        # 第一个机器人保持原来的出生点，其余的在右半场的可通行格子上依次排开
+        points = [(600, 300)]
+        step = NAV_CELL_SIZE * 3
+        for x in range(self.world_width - step, self.world_width // 2, -step):
+            for y in range(step, self.world_height - step, step):
+                if len(points) >= count:
+                    return points[:count]
+                if (x, y) == points[0]:
+                    continue
+                col, row = self.nav_grid.cell_at(x + 20, y + 20)
+                if not self.nav_grid.is_blocked(col, row):
+                    points.append((x, y))
+        return points[:count]
+    
+    def process_events(self, key_downs):
+        # 处理输入阶段交来的按键按下事件；移动和射击由按键状态驱动，在模拟的每一步中进行
+        for event in key_downs:
+            # 重新开始游戏
+            if event.key == K_r and self.game_over:
+                self.__init__(self.robot_count, self.sound_manager, self.world_size, self.game_map)
+    
+    def dispose(self):
+        # 取消计时器并拆掉所有实体：计时器回调和精灵组形成的引用环断开后，
+        # 对局占用的内存和按精灵组保存的缓存立即释放，不必等垃圾回收
+        self.timers.clear()
+        for entity in self.entities.entities.sprites():
+            entity.kill()
+    
+    def sim_step(self):
+        # 固定步长的一步模拟，先记下当前位置供渲染插值
+        self.previous_centers = {sprite: sprite.rect.center for sprite in self.all_sprites}
+        self.previous_view = self.camera.rect.topleft
+        self.run_logic()
     
     def run_logic(self):
         if not self.game_over:
+            self.frame += 1
+            # 触发这一步到期的计时器（冷却结束、机器人换向、爆炸动画）
+            self.timers.advance_to(self.frame)
+            
+            # 玩家换格子时才重新计算共享流场
+            self.flow_field.set_target(*self.player.rect.center)
+            
             # 更新所有精灵前先获取玩家可能的射击
             player_projectile = self.player.update()
             if player_projectile:
-                self.all_sprites.add(player_projectile)
-                self.player_bullets.add(player_projectile)
-                if player_projectile.is_missile:
-                    self.sound_manager.play_sound('missile')
-                else:
-                    self.sound_manager.play_sound('shoot')
-            
-            # 更新除玩家外的所有精灵
-            for sprite in self.all_sprites:
-                if sprite != self.player:  # 跳过玩家，因为已经更新过了
-                    sprite.update()
-            
-            # 更新爆炸效果
-            explosions_to_remove = []
-            for explosion in self.explosions:
-                if explosion.update():  # 如果爆炸动画完成
-                    explosions_to_remove.append(explosion)
-            
-            # 移除已完成的爆炸效果
-            for explosion in explosions_to_remove:
-                self.explosions.remove(explosion)
+                self.add_projectile(player_projectile)
+            
+            self.camera.follow(self.player.rect)
+            
+            # 机器人按是否在活动区域内决定更新精度
+            self.update_robots()
+            
+            # 更新弹药（障碍物是静态的，不在动态精灵组中）
+            # 飞出世界的弹药会被移除，先记下来，碰撞检测时仍要检查它这一步走过的路径
+            moving_bullets = self.projectiles.sprites()
+            self.projectiles.update()
+            left_world = [bullet for bullet in moving_bullets if not bullet.alive()]
             
             # 检测玩家移动状态并播放音效
-            keys = pygame.key.get_pressed()
+            keys = self.player.current_keys()
             if keys[K_w] or keys[K_a] or keys[K_s] or keys[K_d]:
                 if not self.player_moving:
                     self.sound_manager.play_sound('tank_move')
@@ -656,6 +904,7 @@ class Game:
                     self.player_moving = False
             
             # 检测坦克与障碍物碰撞
+            # 坦克移动时已经停在障碍物边上，这里处理仍然嵌入障碍物的情况（例如出生点重叠）
             # 玩家坦克
             tank_collisions = pygame.sprite.spritecollide(self.player, self.obstacles, False)
             if tank_collisions:
@@ -670,118 +919,286 @@ class Game:
                     self.player.rect.x += self.player.speed
             
             # 机器人坦克
-            tank_collisions = pygame.sprite.spritecollide(self.robot, self.obstacles, False)
-            if tank_collisions:
-                # 简单的碰撞响应：将坦克推回并改变方向
-                if self.robot.direction == 0:  # 上
-                    self.robot.rect.y += self.robot.speed
-                    self.robot.direction = 2
-                    self.robot.rotate(self.robot.direction)
-                elif self.robot.direction == 1:  # 右
-                    self.robot.rect.x -= self.robot.speed
-                    self.robot.direction = 3
-                    self.robot.rotate(self.robot.direction)
-                elif self.robot.direction == 2:  # 下
-                    self.robot.rect.y -= self.robot.speed
-                    self.robot.direction = 0
-                    self.robot.rotate(self.robot.direction)
-                elif self.robot.direction == 3:  # 左
-                    self.robot.rect.x += self.robot.speed
-                    self.robot.direction = 1
-                    self.robot.rotate(self.robot.direction)
-            
-            # 机器人AI射击
-            robot_bullet = self.robot.ai_shoot(self.player)
-            if robot_bullet:
-                self.all_sprites.add(robot_bullet)
-                self.robot_bullets.add(robot_bullet)
-                if robot_bullet.is_missile:
-                    self.sound_manager.play_sound('missile')
-                else:
-                    self.sound_manager.play_sound('shoot')
-            
-            # 检测子弹与障碍物碰撞
-            for bullet in self.player_bullets:
-                if pygame.sprite.spritecollide(bullet, self.obstacles, False):
-                    self.explosions.add(Explosion(bullet.rect.center))
-                    self.sound_manager.play_sound('explosion')
-                    bullet.kill()
-            
-            for bullet in self.robot_bullets:
-                if pygame.sprite.spritecollide(bullet, self.obstacles, False):
-                    self.explosions.add(Explosion(bullet.rect.center))
-                    self.sound_manager.play_sound('explosion')
-                    bullet.kill()
+            for robot in self.robots:
+                tank_collisions = pygame.sprite.spritecollide(robot, self.obstacles, False)
+                # 外部控制的机器人被挡住时由控制程序自己决定怎么走
+                if tank_collisions or (robot.blocked and robot.input_keys is None):
+                    # 简单的碰撞响应：嵌入障碍物时推回，然后掉头
+                    if tank_collisions:
+                        robot.move_forward(-robot.speed)
+                    robot.rotate((robot.direction + 2) % 4)
+                    robot.blocked = False
+            
+            # 机器人AI射击（由调度器分帧执行）
+            if AI_BATCH_DECISIONS and batch_ai_shoot is not None:
+                self.ai_scheduler.update_batch([self.player], self.robot_think_batch)
+            else:
+                self.ai_scheduler.update([self.player], self.robot_think)
+            
+            # 检测弹药与障碍物、坦克的碰撞（按本步的移动路径扫掠，取最早碰到的一个）
+            # 弹药只与敌对阵营的坦克检测
+            player_bullets = self.player_bullets.sprites()
+            player_bullets += [bullet for bullet in left_world if 'friendly' in bullet.components]
+            robot_bullets = self.robot_bullets.sprites()
+            robot_bullets += [bullet for bullet in left_world if 'hostile' in bullet.components]
+            robot_hits = self.sweep_projectiles(player_bullets, self.robots.sprites())
+            player_hits = self.sweep_projectiles(robot_bullets, self.entities.query('tank', 'friendly').sprites())
             
             # 检测玩家子弹与机器人碰撞
-            hits = pygame.sprite.spritecollide(self.robot, self.player_bullets, True)
-            for bullet in hits:
-                result = self.robot.take_damage(bullet.damage, bullet.is_missile)
+            for bullet, robot in robot_hits:
+                if not robot.alive():
+                    continue  # 同一步中已经被摧毁
+                result = robot.take_damage(bullet.damage, bullet.is_missile)
+                telemetry.damage(self.frame, bullet, robot, result)
+                self.count_hit('player', bullet, result)
                 
                 if result == "deflected":
                     # 显示弹开效果
-                    self.explosions.add(Explosion(bullet.rect.center))
-                    self.sound_manager.play_sound('deflect')
-                    self.sound_manager.play_sound('deflect')
+                    self.add_explosion(bullet.rect.center)
+                    self.play_sound('deflect')
                 elif result == "hit":
                     # 显示命中效果
-                    self.explosions.add(Explosion(bullet.rect.center))
-                    self.sound_manager.play_sound('explosion')
-                    self.sound_manager.play_sound('explosion')
+                    self.add_explosion(bullet.rect.center)
+                    self.play_sound('explosion')
                 elif result == "destroyed":
                     # 显示坦克被摧毁效果
-                    self.explosions.add(Explosion(self.robot.rect.center, True))
-                    self.sound_manager.play_sound('explosion')
-                    self.game_over = True
-                    self.winner = "player"
+                    self.add_explosion(robot.rect.center, True)
+                    self.play_sound('explosion')
+                    # 所有机器人都被摧毁才算玩家获胜
+                    if not self.robots:
+                        self.game_over = True
+                        self.winner = "player"
             
             # 检测机器人子弹与玩家碰撞
-            hits = pygame.sprite.spritecollide(self.player, self.robot_bullets, True)
-            for bullet in hits:
+            for bullet, _ in player_hits:
                 result = self.player.take_damage(bullet.damage, bullet.is_missile)
+                telemetry.damage(self.frame, bullet, self.player, result)
+                self.count_hit('robot', bullet, result)
                 
                 if result == "deflected":
                     # 显示弹开效果
-                    self.explosions.add(Explosion(bullet.rect.center))
+                    self.add_explosion(bullet.rect.center)
                 elif result == "hit":
                     # 显示命中效果
-                    self.explosions.add(Explosion(bullet.rect.center))
+                    self.add_explosion(bullet.rect.center)
                 elif result == "destroyed":
                     # 显示坦克被摧毁效果
-                    self.explosions.add(Explosion(self.player.rect.center, True))
-                    self.sound_manager.play_sound('explosion')
+                    self.add_explosion(self.player.rect.center, True)
+                    self.play_sound('explosion')
                     self.game_over = True
                     self.winner = "robot"
+            
+            if self.game_over:
+                # 对局在这一步结束，记录结果
+                telemetry.match_end(self.frame, self.winner, self.player)
+                history.record(self.match_result())
     
-    def display_frame(self):
-        # 绘制背景
-        screen.blit(self.background, (0, 0))
+    def count_hit(self, shooter, bullet, result):
+        # shooter为发射方（'player'或'robot'），累计本场对局的命中统计
+        stats = self.match_stats
+        if result == "deflected":
+            stats[shooter + '_deflected'] += 1
+        else:
+            stats[shooter + '_hits'] += 1
+            stats['damage_dealt' if shooter == 'player' else 'damage_taken'] += bullet.damage
+    
+    def match_result(self):
+        # 本场对局的结果和统计，写入对局历史
+        map_name = self.game_map.name if self.game_map is not None else None
+        result = dict(self.match_stats)
+        result.update(winner=self.winner, ticks=self.frame, duration=self.frame / SIM_RATE, map=map_name,
+                      robot_count=self.robot_count, world_width=self.world_width, world_height=self.world_height,
+                      config=f"{map_name or '无地图'} {self.world_width}x{self.world_height} 机器人{self.robot_count}")
+        return result
+    
+    def sweep_projectiles(self, bullets, tanks):
+        # 碰到障碍物的弹药直接爆炸；返回命中坦克的(弹药, 坦克)列表
+        # 坦克在本步中已经移动完毕，按静止目标处理；障碍物是实心矩形，不需要遮罩
+        tank_rects = [tank.rect for tank in tanks]
+        tank_masks = [tank.mask for tank in tanks]
+        hits = []
+        for bullet in bullets:
+            dx, dy = bullet.last_move
+            start = bullet.rect.move(-dx, -dy)
+            # 大多数弹药这一步什么都碰不到，先用整段路径的包围盒快速排除
+            path = start.union(bullet.rect)
+            near_obstacle = path.collidelist(self.obstacle_rects) >= 0
+            near_tank = path.collidelist(tank_rects) >= 0
+            if not (near_obstacle or near_tank):
+                continue
+            obstacle_hit = first_hit(start, dx, dy, self.obstacle_rects) if near_obstacle else None
+            tank_hit = None
+            if near_tank:
+                tank_hit = self.collider.first_hit(start, dx, dy, bullet.mask, tank_rects, tank_masks)
+            if obstacle_hit is None and tank_hit is None:
+                continue
+            # 同时碰到时先算障碍物，与逐个检测时的顺序一致
+            hit_tank = tank_hit is not None and (obstacle_hit is None or tank_hit[0] < obstacle_hit[0])
+            hit_time = tank_hit[0] if hit_tank else obstacle_hit[0]
+            # 弹药停在碰撞发生的位置，爆炸效果显示在接触点
+            bullet.rect.topleft = (start.x + round(dx * hit_time), start.y + round(dy * hit_time))
+            bullet.kill()
+            if hit_tank:
+                hits.append((bullet, tanks[tank_hit[1]]))
+            else:
+                telemetry.obstacle_hit(self.frame, bullet)
+                self.add_explosion(bullet.rect.center)
+                self.play_sound('explosion')
+        return hits
+    
+    def add_explosion(self, center, is_large=False):
+        # 画质降低时限制同时存在的爆炸数量，坦克被摧毁的大爆炸总是显示
+        max_explosions = self.quality.max_explosions
+        if not is_large and max_explosions is not None and len(self.explosions) >= max_explosions:
+            return
+        self.animate_explosion(self.entities.spawn(Explosion(center, is_large)))
+    
+    def animate_explosion(self, explosion, frame=None):
+        # 计时轮回调：推进爆炸动画并登记下一个需要变化的帧，动画完成的爆炸会自行kill()
+        if frame is not None and explosion.update(frame):
+            return
+        next_frame = explosion.next_frame(self.quality.explosion_frame_step)
+        self.timers.schedule(next_frame - explosion.frame, self.animate_explosion, explosion, next_frame)
+    
+    def play_sound(self, sound_name):
+        # 画质降低时限制每帧新播放的音效数量
+        if self.sound_frame != self.frame:
+            self.sound_frame = self.frame
+            self.sounds_this_frame = 0
+        max_sounds = self.quality.max_sounds
+        if max_sounds is not None and self.sounds_this_frame >= max_sounds:
+            return
+        self.sounds_this_frame += 1
+        self.sound_manager.play_sound(sound_name)
+    
+    def update_robots(self):
+        # 视口附近的机器人每帧更新；更远的机器人每隔几帧才更新一次，一次推进相应的帧数
+        active_rect = self.camera.rect.inflate(ACTIVE_MARGIN * 2, ACTIVE_MARGIN * 2)
+        interval = OFFSCREEN_UPDATE_INTERVAL
+        for robot in self.robots:
+            if robot.input_keys is not None:
+                # 外部控制的机器人与玩家一样按按键行动，每帧更新
+                projectile = robot.drive(robot.input_keys)
+                if projectile:
+                    self.add_projectile(projectile)
+            elif interval <= 1 or active_rect.colliderect(robot.rect):
+                robot.update()
+            elif (self.frame + robot.update_slot) % interval == 0:
+                robot.update(interval)
+    
+    def robot_think(self, robot, elapsed_frames):
+        if robot.input_keys is not None:
+            return  # 外部控制的机器人自己决定何时射击
+        robot_bullet = robot.ai_shoot(self.player, elapsed_frames)
+        if robot_bullet:
+            self.add_projectile(robot_bullet)
+    
+    def robot_think_batch(self, robots, elapsed_frames):
+        if any(robot.input_keys is not None for robot in robots):
+            thinking = [index for index, robot in enumerate(robots) if robot.input_keys is None]
+            robots = [robots[index] for index in thinking]
+            elapsed_frames = [elapsed_frames[index] for index in thinking]
+        for robot_bullet in batch_ai_shoot(robots, self.player, elapsed_frames):
+            self.add_projectile(robot_bullet)
+    
+    def add_projectile(self, projectile):
+        self.entities.spawn(projectile)
+        telemetry.shot(self.frame, projectile)
+        self.match_stats['player_shots' if projectile.owner is self.player else 'robot_shots'] += 1
+        if projectile.is_missile:
+            self.play_sound('missile')
+        else:
+            self.play_sound('shoot')
+    
+    def display_frame(self, alpha=1.0):
+        self.draw_frame(screen, alpha)
+        # 更新屏幕
+        pygame.display.flip()
+    
+    def draw_frame(self, surface, alpha=1.0):
+        # 把当前画面绘制到surface上，离线渲染时surface可以是不显示的表面
+        # alpha为上一步模拟到当前步之间的插值比例，1表示直接绘制当前状态
+        view = self.camera.rect
+        previous = None
+        if alpha < 1.0:
+            previous = self.previous_centers
+            previous_x, previous_y = self.previous_view
+            view = view.move(round((previous_x - view.x) * (1.0 - alpha)),
+                             round((previous_y - view.y) * (1.0 - alpha)))
         
-        # 绘制所有精灵
-        self.all_sprites.draw(screen)
-        self.explosions.draw(screen)
+        # 按图层提交绘制命令：地图区块、坦克、弹药、爆炸效果，只提交可见的部分
+        pipeline = self.render_pipeline
+        pipeline.begin()
+        for chunk, position in self.tile_map.visible_chunks(view):
+            pipeline.submit(LAYER_GROUND, chunk, position)
+        pipeline.submit_sprites(LAYER_TANKS, self.tanks, view, previous, alpha)
+        pipeline.submit_sprites(LAYER_PROJECTILES, self.projectiles, view, previous, alpha)
+        pipeline.submit_sprites(LAYER_EFFECTS, self.explosions, view)
+        pipeline.flush(surface, self.quality.render_scale)
+        self.render_count += 1
         
         # 显示状态
         if not self.game_over:
-            self.status_display.show_health(screen, self.player, self.robot)
+            # 状态栏显示仍存活的第一个机器人
+            robot = next(iter(self.robots), self.robot)
+            refresh = self.render_count % self.quality.hud_interval == 0
+            self.status_display.show_health(surface, self.player, robot, refresh)
         else:
             if self.winner == "player":
-                self.status_display.show_message(screen, "你赢了! 按R键重新开始", GREEN)
+                self.status_display.show_message(surface, "你赢了! 按R键重新开始", GREEN)
             else:
-                self.status_display.show_message(screen, "你输了! 按R键重新开始", RED)
-        
-        # 更新屏幕
-        pygame.display.flip()
+                self.status_display.show_message(surface, "你输了! 按R键重新开始", RED)
 
 # 主函数
-def main():
-    debug_print("游戏主函数开始执行")
+def main(robot_count=None, world_size=None, map_path=DEFAULT_MAP, speed=1, split_process=SPLIT_SIMULATION):
+    log.debug("游戏主函数开始执行")
+    # 崩溃时把环形缓冲区中最近的日志转储到文件
+    crash_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), CRASH_LOG)
+    log.install_excepthook(crash_path)
+    # 记录对局事件，目录可以用环境变量TANK_TELEMETRY覆盖，为空时不记录
+    telemetry_dir = os.environ.get('TANK_TELEMETRY', TELEMETRY_DIR)
+    if telemetry_dir:
+        telemetry_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), telemetry_dir)
+    # 结束的对局写入对局历史数据库，同样可以用环境变量TANK_HISTORY覆盖，为空时不记录
+    history_path = os.environ.get('TANK_HISTORY', MATCH_HISTORY_DB)
+    if history_path:
+        history_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), history_path)
+    if split_process:
+        # 模拟在单独的进程中运行，本进程只处理输入、渲染和音效；事件和对局结果由模拟进程记录
+        if map_path:
+            map_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), map_path)
+        run_split(robot_count, world_size, map_path, telemetry_dir, history_path)
+        pygame.quit()
+        log.flush()
+        sys.exit()
+    if telemetry_dir:
+        telemetry.open(telemetry_dir)
+    if history_path:
+        history.open(history_path)
     try:
-        debug_print("正在初始化游戏主循环...")
-        game = Game()
+        log.debug("正在初始化游戏主循环...")
+        game_map = None
+        if map_path:
+            if not os.path.isabs(map_path):
+                map_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), map_path)
+            log.debug("加载地图: %s", map_path)
+            game_map = load_map(map_path)
+        # 模拟以固定步长推进，冷却也按模拟步计时，快进时行为与正常速度一致
+        game = Game(robot_count, world_size=world_size, game_map=game_map)
+        sim_loop = FixedStepLoop(1000.0 / SIM_RATE, speed, MAX_SIM_STEPS_PER_FRAME, UNBOUNDED_FRAME_MS)
+        elapsed_ms = 0
+        # 输入只在模拟之前采集一次，同时统计按键到画面显示的延迟
+        stage = InputStage(InputLatency(INPUT_LATENCY_SAMPLES))
+        
+        def sim_step():
+            game.sim_step()
+            stage.step_done()
+        
+        governor = QualityGovernor(FPS, QUALITY_LEVELS, QUALITY_WINDOW, QUALITY_DOWNGRADE_RATIO,
+                                   QUALITY_UPGRADE_RATIO, QUALITY_UPGRADE_DELAY)
         done = False
         
-        debug_print("游戏开始运行主循环...")
+        log.debug("游戏开始运行主循环...")
         frame_count = 0
         start_time = pygame.time.get_ticks()
         min_run_time = 3000  # 至少运行3秒
@@ -792,6 +1209,7 @@ def main():
         welcome_rect = welcome_text.get_rect(center=(SCREEN_WIDTH // 2, 50))
         screen.blit(welcome_text, welcome_rect)
         pygame.display.flip()
+        frame_start = time.perf_counter()
         
         while not done:
             current_time = pygame.time.get_ticks()
@@ -799,21 +1217,31 @@ def main():
             
             # 确保游戏至少运行一段时间
             if elapsed_time < min_run_time:
-                debug_print(f"游戏运行中: {elapsed_time/1000:.1f}秒 / {min_run_time/1000}秒")
+                log.debug("游戏运行中: %.1f秒 / %s秒", elapsed_time/1000, min_run_time/1000)
             
-            # 处理事件
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    done = True
-                elif event.type == KEYDOWN and event.key == K_ESCAPE:
-                    done = True
+            # 取出本帧的事件并读取按键状态，这是唯一读取输入的地方
+            key_downs = stage.poll()
+            done = stage.quit
+            for event in key_downs:
+                if event.key == K_f:
+                    # 循环切换快进倍率
+                    speeds = FAST_FORWARD_SPEEDS
+                    index = speeds.index(sim_loop.speed) + 1 if sim_loop.speed in speeds else 0
+                    sim_loop.set_speed(speeds[index % len(speeds)])
+                    speed_name = f"x{sim_loop.speed}" if sim_loop.speed else "不限速"
+                    pygame.display.set_caption(f'坦克大战 {speed_name}' if sim_loop.speed != 1 else '坦克大战')
+                    log.debug("模拟速度: %s", speed_name)
             
             # 只有在最小运行时间后才处理游戏逻辑
             if elapsed_time >= min_run_time:
-                done = not game.process_events()
-                game.run_logic()
-                game.display_frame()
+                game.process_events(key_downs)
+                game.player.input_keys = stage.keys  # 重新开始的对局换了玩家坦克
+                # 按经过的时间执行若干步模拟，再在最后两步之间插值渲染
+                _, alpha = sim_loop.advance(elapsed_ms, sim_step)
+                game.display_frame(alpha)
+                stage.latency.presented(time.perf_counter())
             else:
+                stage.latency.discard_pending()  # 欢迎画面期间的按键不计入延迟
                 # 在最小运行时间内，只显示欢迎消息
                 screen.fill(BLACK)
                 screen.blit(welcome_text, welcome_rect)
@@ -823,18 +1251,35 @@ def main():
                 screen.blit(countdown, countdown_rect)
                 pygame.display.flip()
             
-            clock.tick(FPS)
+            # 帧间等待时事件一到就收下，记下准确的到达时间，留到下一帧模拟之前统一处理
+            busy_ms = (time.perf_counter() - frame_start) * 1000
+            stage.wait_until(frame_start + 1.0 / FPS)
+            elapsed_ms = clock.tick(FPS)
+            frame_start = time.perf_counter()
+            # 按本帧实际耗时（不含等待）调整画质，重新开始的对局沿用当前等级
+            # 快进时本来就会用满每一帧，不据此降低画质
+            if sim_loop.speed == 1:
+                level = governor.level
+                game.quality = governor.record(busy_ms)
+                if governor.level != level:
+                    log.debug("画质调整为: %s (平均帧耗时 %.1fms)", game.quality.name, governor.average_ms())
             frame_count += 1
-            if frame_count % 100 == 0 and DEBUG_MODE:
-                debug_print(f"游戏已运行 {frame_count} 帧")
+            if frame_count % 100 == 0:
+                log.debug("游戏已运行 %s 帧", frame_count)
         
-        debug_print("游戏主循环正常结束")
+        log.debug("游戏主循环正常结束")
+        log.info("%s", stage.latency.report())
     except Exception as e:
-        print(f"游戏运行时发生错误: {type(e).__name__}: {e}")
-        traceback.print_exc()
+        log.exception("游戏运行时发生错误: %s: %s", type(e).__name__, e)
+        # 把最近的日志转储到文件，便于事后排查
+        try:
+            log.dump(crash_path)
+            log.error("最近的日志已保存到: %s", crash_path)
+        except OSError:
+            pass
         # 在发生错误时显示错误信息并等待几秒钟
         try:
-            debug_print("尝试显示错误信息...")
+            log.debug("尝试显示错误信息...")
             font = pygame.font.Font(None, 36)
             error_text1 = font.render(f"错误: {type(e).__name__}", True, RED)
             error_text2 = font.render(f"{str(e)}", True, RED)
@@ -850,7 +1295,7 @@ def main():
             screen.blit(error_text3, error_rect3)
             pygame.display.flip()
             
-            debug_print("错误信息已显示，等待用户按ESC键退出...")
+            log.debug("错误信息已显示，等待用户按ESC键退出...")
             # 等待用户按ESC键退出
             waiting = True
             wait_time = 0
@@ -861,14 +1306,16 @@ def main():
                 clock.tick(30)
                 wait_time += 1
                 if wait_time % 30 == 0:
-                    debug_print(f"已等待 {wait_time//30} 秒...")
+                    log.debug("已等待 %s 秒...", wait_time//30)
         except Exception as e2:
-            print(f"显示错误信息时发生另一个错误: {e2}")
-            traceback.print_exc()
+            log.exception("显示错误信息时发生另一个错误: %s", e2)
     
-    debug_print("正在退出游戏...")
+    log.debug("正在退出游戏...")
+    telemetry.close()
+    history.close()
     pygame.quit()
-    debug_print("pygame已退出")
+    log.debug("pygame已退出")
+    log.flush()
     sys.exit()
 
 if __name__ == "__main__":
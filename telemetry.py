@@ -0,0 +1,295 @@
+# 遥测模块
+# 把对局中的关键事件（开火、受伤、撞上障碍物、对局结束）记录为定长的二进制记录，
+# 在内存中攒够一批后由后台线程压缩，追加写入按天和进程划分的数据文件，并为每个数据块写一条索引；
+# 统计工具先读索引，只解压需要的数据块
+#
+# 用法: python telemetry.py [目录] [--since YYYYMMDD] [--until YYYYMMDD] [--event shot,damage,...]
+
+import argparse
+import atexit
+import glob
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+
+from config import SIM_RATE, TELEMETRY_CHUNK_EVENTS, TELEMETRY_COMPRESS_LEVEL
+
+try:
+    import numpy as np
+except ImportError:  # 没有numpy时统计工具逐条解析
+    np = None
+
+# 事件类型
+EVENT_SHOT = 1          # 开火：actor发射了projectile
+EVENT_DAMAGE = 2        # 弹药命中坦克：outcome为结果
+EVENT_OBSTACLE_HIT = 3  # 弹药撞上障碍物
+EVENT_MATCH_END = 4     # 对局结束：team为获胜方
+EVENT_NAMES = {EVENT_SHOT: 'shot', EVENT_DAMAGE: 'damage', EVENT_OBSTACLE_HIT: 'obstacle', EVENT_MATCH_END: 'match_end'}
+
+TEAMS = ('friendly', 'hostile')
+WEAPONS = (None, 'bullet', 'missile')
+OUTCOMES = (None, 'deflected', 'hit', 'destroyed')
+
+# 事件记录: 对局, 模拟步, 类型, 阵营, 武器, 结果, 发射者id, 弹药id, 目标id, x, y
+EVENT = struct.Struct('<IIBBBBIIIii')
+if np is not None:
+    EVENT_DTYPE = np.dtype([('match', '<u4'), ('tick', '<u4'), ('event', 'u1'), ('team', 'u1'),
+                            ('weapon', 'u1'), ('outcome', 'u1'), ('actor', '<u4'), ('projectile', '<u4'),
+                            ('target', '<u4'), ('x', '<i4'), ('y', '<i4')])
+
+# 数据块头: 标记, 事件数, 压缩后长度, 会话, 事件类型位掩码；数据文件本身也能重建索引
+CHUNK_MAGIC = b'TLM1'
+CHUNK_HEADER = struct.Struct('<4sIIII')
+# 索引记录: 数据块在数据文件中的偏移（含块头）, 压缩后长度, 事件数, 会话, 事件类型位掩码
+INDEX_RECORD = struct.Struct('<QIIII')
+
+DATA_SUFFIX = '.tlm'
+INDEX_SUFFIX = '.tlx'
+
+
+class Telemetry:
+    """游戏事件记录器
+
+    open()之前所有记录方法都直接返回，训练环境和离线渲染不会产生任何开销。
+    记录只是把一个元组追加到列表，攒够chunk_events条或对局结束时整批交给后台线程，
+    打包、压缩和写文件都不在游戏主循环中进行。
+    """
+
+    def __init__(self, chunk_events=4096, compress_level=1):
+        self.enabled = False
+        self.chunk_events = chunk_events
+        self.compress_level = compress_level
+        self.directory = None
+        self.session = 0  # 本次运行的随机编号，与对局编号一起区分不同的对局
+        self.pid = 0  # 打开记录器的进程，数据文件按进程区分
+        self.match = 0
+        self.pending = []
+        self.chunks_written = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._files = None  # (日期, 数据文件, 索引文件)
+
+    def open(self, directory):
+        """创建目录并启动后台线程，返回True；已经打开时什么也不做，返回False
+
+        训练进程和比赛进程可能同时记录到同一个目录：每个进程写自己的文件，
+        会话编号随机产生，同一秒启动的进程也不会混在一起。
+        只有得到True的调用方才应该调用close()。
+        """
+        if self.enabled:
+            return False
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.session = int.from_bytes(os.urandom(4), 'little')
+        self.pid = os.getpid()
+        if self._thread is None:
+            atexit.register(self.close)
+        self.enabled = True
+        self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+        self._thread.start()
+        return True
+
+    def begin_match(self):
+        if self.enabled:
+            self.flush()
+            self.match += 1
+
+    def emit(self, tick, event, team, weapon, outcome, actor, projectile, target, x, y):
+        self.pending.append((self.match, tick, event, team, weapon, outcome, actor, projectile, target, x, y))
+        if len(self.pending) >= self.chunk_events:
+            self.flush()
+
+    def shot(self, tick, projectile):
+        if self.enabled:
+            owner = projectile.owner
+            x, y = projectile.rect.center
+            self.emit(tick, EVENT_SHOT, TEAMS.index(owner.team), 1 + projectile.is_missile, 0,
+                      owner.entity_id, projectile.entity_id, 0, x, y)
+
+    def damage(self, tick, projectile, target, result):
+        if self.enabled:
+            owner = projectile.owner
+            x, y = projectile.rect.center
+            self.emit(tick, EVENT_DAMAGE, TEAMS.index(owner.team), 1 + projectile.is_missile,
+                      OUTCOMES.index(result), owner.entity_id, projectile.entity_id, target.entity_id, x, y)
+
+    def obstacle_hit(self, tick, projectile):
+        if self.enabled:
+            owner = projectile.owner
+            x, y = projectile.rect.center
+            self.emit(tick, EVENT_OBSTACLE_HIT, TEAMS.index(owner.team), 1 + projectile.is_missile, 0,
+                      owner.entity_id, projectile.entity_id, 0, x, y)
+
+    def match_end(self, tick, winner, player):
+        # 获胜方记在team中：玩家获胜为friendly
+        if self.enabled:
+            x, y = player.rect.center
+            self.emit(tick, EVENT_MATCH_END, 0 if winner == 'player' else 1, 0, 0,
+                      player.entity_id, 0, 0, x, y)
+            self.flush()
+
+    def flush(self):
+        # 把已攒下的事件交给后台线程
+        if self.pending:
+            self._queue.put(self.pending)
+            self.pending = []
+
+    def close(self):
+        """写出剩余的事件并等待后台线程结束"""
+        if not self.enabled:
+            return
+        self.flush()
+        self.enabled = False
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            events = self._queue.get()
+            if events is None:
+                break
+            self._write_chunk(events)
+        if self._files is not None:
+            self._files[1].close()
+            self._files[2].close()
+            self._files = None
+
+    def _write_chunk(self, events):
+        pack = EVENT.pack
+        raw = b''.join([pack(*event) for event in events])
+        compressed = zlib.compress(raw, self.compress_level)
+        mask = 0
+        for event_type in {event[2] for event in events}:
+            mask |= 1 << event_type
+
+        # 按天换文件，文件只由本进程追加；先写数据再写索引，索引只指向完整的数据块
+        day = time.strftime('%Y%m%d')
+        if self._files is None or self._files[0] != day:
+            if self._files is not None:
+                self._files[1].close()
+                self._files[2].close()
+            base = os.path.join(self.directory, f'{day}-{self.pid}')
+            self._files = (day, open(base + DATA_SUFFIX, 'ab'), open(base + INDEX_SUFFIX, 'ab'))
+        _, data_file, index_file = self._files
+        offset = data_file.seek(0, os.SEEK_END)
+        data_file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, len(events), len(compressed), self.session, mask))
+        data_file.write(compressed)
+        data_file.flush()
+        index_file.write(INDEX_RECORD.pack(offset, len(compressed), len(events), self.session, mask))
+        index_file.flush()
+        self.chunks_written += 1
+
+
+def read_chunks(directory, since=None, until=None, event_mask=None):
+    """按索引依次产生(会话, 解压后的事件数据)
+
+    文件名为“日期-进程号”，since/until是YYYYMMDD格式的日期（含两端），按文件名筛选；
+    event_mask不为None时跳过不包含这些事件类型的数据块。
+    """
+    for index_path in sorted(glob.glob(os.path.join(directory, '*' + INDEX_SUFFIX))):
+        day = os.path.basename(index_path)[:-len(INDEX_SUFFIX)].split('-')[0]
+        if (since and day < since) or (until and day > until):
+            continue
+        with open(index_path, 'rb') as f:
+            index = f.read()
+        # 写入中途退出时最后一条索引可能不完整
+        index = index[:len(index) - len(index) % INDEX_RECORD.size]
+        with open(index_path[:-len(INDEX_SUFFIX)] + DATA_SUFFIX, 'rb') as data_file:
+            for offset, size, count, session, mask in INDEX_RECORD.iter_unpack(index):
+                if event_mask is not None and not mask & event_mask:
+                    continue
+                data_file.seek(offset + CHUNK_HEADER.size)
+                yield session, zlib.decompress(data_file.read(size))
+
+
+class TelemetrySummary:
+    """按(事件, 阵营, 武器, 结果)累计事件数，同时统计对局数和对局时长"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.matches = set()
+        self.match_ticks = 0
+        self.events = 0
+
+    def add(self, session, data):
+        if np is not None:
+            events = np.frombuffer(data, EVENT_DTYPE)
+            self.events += len(events)
+            keys = (events['event'].astype(np.uint32) << 24 | events['team'].astype(np.uint32) << 16 |
+                    events['weapon'].astype(np.uint32) << 8 | events['outcome'])
+            values, counts = np.unique(keys, return_counts=True)
+            for key, count in zip(values.tolist(), counts.tolist()):
+                self.counts[(key >> 24, (key >> 16) & 0xff, (key >> 8) & 0xff, key & 0xff)] += count
+            self.matches.update((session, match) for match in np.unique(events['match']).tolist())
+            self.match_ticks += int(events['tick'][events['event'] == EVENT_MATCH_END].sum())
+        else:
+            for match, tick, event, team, weapon, outcome, *_ in EVENT.iter_unpack(data):
+                self.events += 1
+                self.counts[(event, team, weapon, outcome)] += 1
+                self.matches.add((session, match))
+                if event == EVENT_MATCH_END:
+                    self.match_ticks += tick
+
+    def count(self, event, team=None, weapon=None, outcome=None):
+        return sum(count for (e, t, w, o), count in self.counts.items()
+                   if e == event and team in (None, t) and weapon in (None, w) and outcome in (None, o))
+
+    def report(self):
+        lines = [f"事件 {self.events} 条，对局 {len(self.matches)} 场"]
+        finished = self.count(EVENT_MATCH_END)
+        if finished:
+            lines.append(f"结束的对局 {finished} 场：玩家胜 {self.count(EVENT_MATCH_END, 0)}，"
+                         f"机器人胜 {self.count(EVENT_MATCH_END, 1)}，"
+                         f"平均时长 {self.match_ticks / finished / SIM_RATE:.1f} 秒")
+        lines.append("阵营      武器     开火   命中   弹开   摧毁  障碍物  命中率")
+        for team_index, team in enumerate(TEAMS):
+            for weapon_index in (1, 2):
+                shots = self.count(EVENT_SHOT, team_index, weapon_index)
+                if not shots:
+                    continue
+                hit, deflected, destroyed = (self.count(EVENT_DAMAGE, team_index, weapon_index, OUTCOMES.index(name))
+                                             for name in ('hit', 'deflected', 'destroyed'))
+                obstacle = self.count(EVENT_OBSTACLE_HIT, team_index, weapon_index)
+                lines.append(f"{team:<9} {WEAPONS[weapon_index]:<8} {shots:>5} {hit:>6} {deflected:>6} "
+                             f"{destroyed:>6} {obstacle:>7} {(hit + destroyed) / shots:>7.1%}")
+        return '\n'.join(lines)
+
+
+# 全局记录器，由游戏主函数打开
+telemetry = Telemetry(TELEMETRY_CHUNK_EVENTS, TELEMETRY_COMPRESS_LEVEL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="统计遥测文件中的对局事件")
+    parser.add_argument('directory', nargs='?', default='telemetry', help="遥测文件目录")
+    parser.add_argument('--since', help="起始日期（YYYYMMDD，含）")
+    parser.add_argument('--until', help="结束日期（YYYYMMDD，含）")
+    parser.add_argument('--event', help="只读取包含这些事件的数据块，逗号分隔: " + ','.join(EVENT_NAMES.values()))
+    args = parser.parse_args(argv)
+
+    event_mask = None
+    if args.event:
+        names = {name: event for event, name in EVENT_NAMES.items()}
+        event_mask = 0
+        for name in args.event.split(','):
+            if name not in names:
+                parser.error(f"未知的事件: {name}")
+            event_mask |= 1 << names[name]
+
+    start_time = time.perf_counter()
+    summary = TelemetrySummary()
+    chunks = 0
+    for session, data in read_chunks(args.directory, args.since, args.until, event_mask):
+        summary.add(session, data)
+        chunks += 1
+    print(summary.report())
+    print(f"读取 {chunks} 个数据块，用时 {time.perf_counter() - start_time:.2f} 秒")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,39 @@
+# 地图加载测试
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import game_map  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LoadMapTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'default.json')
+        shutil.copy(os.path.join(ROOT, 'maps', 'default.json'), self.source)
+        self.binary = game_map.compiled_path(self.source)
+
+    def tearDown(self):
+        game_map._map_cache.pop(self.source, None)
+        shutil.rmtree(self.directory)
+
+    def test_invalid_binary_is_rewritten(self):
+        # 比源文件新但无法解析的编译结果：重新编译后写回，目录中不留临时文件
+        with open(self.binary, 'wb') as f:
+            f.write(b'stale')
+        os.utime(self.binary, (os.path.getmtime(self.source) + 10,) * 2)
+        loaded = game_map.load_map(self.source)
+        with open(self.binary, 'rb') as f:
+            self.assertEqual(list(game_map.parse_map(f.read()).boxes), list(loaded.boxes))
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted(['default.json', os.path.basename(self.binary)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
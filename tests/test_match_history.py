@@ -0,0 +1,45 @@
+# 对局历史查询测试
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import match_history  # noqa: E402
+
+
+def _row(player, robot, winner, source='tournament', duration=10.0):
+    row = dict(match_history.new_match_stats(), finished_at=0.0, source=source, player=player, robot=robot,
+               winner=winner, ticks=600, duration=duration, map=None, robot_count=1, world_width=800,
+               world_height=600, config='test')
+    return tuple(row[column] for column in match_history.COLUMNS)
+
+
+class LeaderboardTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = match_history.connect(':memory:')
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_counts_both_sides(self):
+        # bot_b在机器人一方赢了两场，在玩家一方输了一场
+        rows = [_row('bot_a', 'bot_b', 'robot'), _row('bot_c', 'bot_b', 'robot'), _row('bot_b', 'bot_a', 'robot'),
+                _row('bot_a', 'bot_c', None)]
+        self.connection.executemany(match_history.INSERT, rows)
+        board = {name: (wins, played) for name, wins, played, _, _ in
+                 match_history.leaderboard(self.connection)}
+        self.assertEqual(board, {'bot_a': (1, 3), 'bot_b': (2, 3), 'bot_c': (0, 2)})
+        self.assertEqual(match_history.leaderboard(self.connection, limit=1)[0][0], 'bot_b')
+
+    def test_source_filter(self):
+        self.connection.executemany(match_history.INSERT, [_row('human', 'builtin', 'player', source='game'),
+                                                           _row('bot_a', 'bot_b', 'robot')])
+        board = match_history.leaderboard(self.connection, source='game')
+        self.assertEqual([(name, wins, played) for name, wins, played, _, _ in board],
+                         [('human', 1, 1), ('builtin', 0, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# 遥测记录与读取测试
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telemetry  # noqa: E402
+
+
+class TelemetryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_open_is_idempotent(self):
+        recorder = telemetry.Telemetry()
+        self.assertTrue(recorder.open(self.directory.name))
+        thread = recorder._thread
+        self.assertFalse(recorder.open(self.directory.name))
+        self.assertIs(recorder._thread, thread)
+        recorder.close()
+
+    def test_recorders_sharing_a_directory(self):
+        # 两个记录器模拟同时运行的两个进程：各写各的文件，会话不同，读取时都能读到
+        recorders = [telemetry.Telemetry(), telemetry.Telemetry()]
+        for pid, recorder in enumerate(recorders, 1000):
+            recorder.open(self.directory.name)
+            recorder.pid = pid
+        for recorder in recorders:
+            recorder.begin_match()
+            recorder.emit(5, telemetry.EVENT_SHOT, 0, 1, 0, 1, 2, 0, 10, 20)
+            recorder.emit(9, telemetry.EVENT_MATCH_END, 0, 0, 0, 1, 0, 0, 10, 20)
+            recorder.close()
+        self.assertEqual(len([name for name in os.listdir(self.directory.name)
+                              if name.endswith(telemetry.INDEX_SUFFIX)]), 2)
+        self.assertNotEqual(recorders[0].session, recorders[1].session)
+        summary = telemetry.TelemetrySummary()
+        for session, data in telemetry.read_chunks(self.directory.name):
+            summary.add(session, data)
+        self.assertEqual(summary.events, 4)
+        self.assertEqual(len(summary.matches), 2)
+        self.assertEqual(summary.count(telemetry.EVENT_MATCH_END), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
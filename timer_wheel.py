@@ -0,0 +1,125 @@
+# 计时轮模块
+# 冷却、机器人换向和特效寿命等定时事件向分层计时轮登记到期的模拟步，
+# 每步只处理真正到期的计时器，不再每帧轮询所有实体；登记和取消都是O(1)
+
+
+class Timer:
+    """计时轮中的一个计时器，由TimerWheel.schedule()返回，可以用TimerWheel.cancel()取消"""
+
+    __slots__ = ('deadline', 'callback', 'args', '_slot')
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self._slot = None  # 所在的槽，触发或取消后为None
+
+    @property
+    def active(self):
+        return self._slot is not None
+
+
+class TimerWheel:
+    """分层计时轮
+
+    第0层的每个槽对应一步，第k层的每个槽对应 2**(bits*k) 步。计时器放在能容纳其到期步的最低一层，
+    低一层转完一圈时把上一层当前槽中的计时器重新分配到下面各层。
+    每步只取出第0层的一个槽，同一步到期的计时器按登记的顺序触发。
+    超出最高一层范围的计时器先放在最高一层，每转一圈重新分配一次。
+    """
+
+    def __init__(self, bits=6, levels=4):
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.levels = levels
+        self.now = 0  # 已经处理完的模拟步
+        self.pending = 0
+        self.fired_last_tick = 0
+        # 每个槽是一个字典，按插入顺序保存计时器，删除单个计时器是O(1)
+        self._wheels = [[{} for _ in range(1 << bits)] for _ in range(levels)]
+
+    def __len__(self):
+        return self.pending
+
+    def schedule(self, delay, callback, *args):
+        """delay步之后调用callback(*args)，delay小于1时在下一步调用"""
+        return self.schedule_at(self.now + max(1, delay), callback, *args)
+
+    def schedule_at(self, tick, callback, *args):
+        """在第tick步调用callback(*args)，tick不晚于当前步时在下一步调用"""
+        timer = Timer(max(tick, self.now + 1), callback, args)
+        self._insert(timer)
+        self.pending += 1
+        return timer
+
+    def cancel(self, timer):
+        slot = timer._slot
+        if slot is not None:
+            del slot[timer]
+            timer._slot = None
+            self.pending -= 1
+
+    def clear(self):
+        """取消所有计时器"""
+        for wheel in self._wheels:
+            for index, slot in enumerate(wheel):
+                if slot:
+                    for timer in slot:
+                        timer._slot = None
+                    wheel[index] = {}
+        self.pending = 0
+
+    def _insert(self, timer):
+        # 放在到期步与当前步只有本层及以下的位不同的那一层
+        deadline = timer.deadline
+        now = self.now
+        bits = self.bits
+        level = 0
+        while level < self.levels - 1 and deadline >> (bits * (level + 1)) != now >> (bits * (level + 1)):
+            level += 1
+        slot = self._wheels[level][(deadline >> (bits * level)) & self.mask]
+        slot[timer] = None
+        timer._slot = slot
+
+    def _cascade(self, level, index):
+        # 把上层一个槽中的计时器重新分配到下面各层
+        wheel = self._wheels[level]
+        timers = wheel[index]
+        if timers:
+            wheel[index] = {}
+            for timer in timers:
+                self._insert(timer)
+
+    def advance_to(self, tick):
+        """推进到第tick步，依次触发途经各步到期的计时器，返回触发的个数"""
+        fired = 0
+        while self.now < tick:
+            fired += self.tick()
+        return fired
+
+    def tick(self):
+        """推进一步并触发这一步到期的计时器"""
+        self.now += 1
+        now = self.now
+        bits = self.bits
+        # 低层转完一圈时，依次把上面各层当前槽中的计时器分配下来
+        level = 1
+        while level < self.levels and not now & ((1 << (bits * level)) - 1):
+            self._cascade(level, (now >> (bits * level)) & self.mask)
+            level += 1
+
+        wheel = self._wheels[0]
+        index = now & self.mask
+        expired = wheel[index]
+        fired = 0
+        if expired:
+            wheel[index] = {}
+            for timer in list(expired):
+                if timer._slot is not expired:
+                    continue  # 已被这一步前面的回调取消
+                timer._slot = None
+                self.pending -= 1
+                timer.callback(*timer.args)
+                fired += 1
+        self.fired_last_tick = fired
+        return fired
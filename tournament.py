@@ -0,0 +1,319 @@
+# 比赛模块
+# 已注册的机器人程序两两进行单循环比赛（每对交换阵营各打一场），对局分给多个进程并行运行，
+# 最后按Elo等级分排名。每个机器人程序在自己的进程中运行，每步只等待预算内的时间，
+# 超时或出错的一步按不动处理，慢的程序不会拖住模拟和其他对局
+#
+# 用法: python tournament.py chaser random idle --bot mine=my_bot:MyBot [--rounds N] [--workers N]
+
+import os
+
+# 比赛不需要窗口和声音，必须在导入pygame之前设置
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+
+from bots import NOOP, Action, MatchInfo, TankView, ProjectileView, Observation, load_bot
+from config import (SIM_RATE, DEFAULT_MAP, BOT_TICK_BUDGET_MS, BOT_IPC_MARGIN_MS, BOT_START_TIMEOUT,
+                    MATCH_MAX_TICKS, ELO_START, ELO_K, MATCH_HISTORY_DB)
+from match_history import history
+
+
+def _bot_main(conn, spec):
+    # 机器人程序进程：收到观测后调用act()，连同本步消耗的CPU时间一起返回
+    bot = load_bot(spec)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        kind, tick, payload = message
+        start = time.process_time()
+        try:
+            if kind == 'reset':
+                bot.reset(payload)
+                action = NOOP
+            else:
+                action = Action(*bot.act(payload))
+        except Exception:
+            action = None  # 出错的一步按不动处理
+        conn.send((tick, action, (time.process_time() - start) * 1000))
+
+
+class BotProcess:
+    """对局进程一侧的机器人程序句柄
+
+    send()发出观测，receive()最多等到截止时间。没有按时回答，或者回答中报告的CPU时间
+    超出预算，这一步就按不动处理；迟到的回答在下次发送前丢弃，程序仍在计算时不发新的观测，
+    这一步也不再等待。
+    """
+
+    def __init__(self, spec, context, budget_ms=BOT_TICK_BUDGET_MS):
+        self.spec = spec
+        self.budget_ms = budget_ms
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_bot_main, args=(child, spec), daemon=True)
+        self.process.start()
+        child.close()
+        self.pending = None  # 已发出、还没收到回答的步数
+        self.sent = False  # 本步是否发出了观测
+        self.ticks = 0
+        self.overruns = 0
+        self.errors = 0
+        self.cpu_ms = 0.0
+
+    def reset(self, info):
+        # 第一次调用要等进程启动和导入，给足时间；失败时整场按不动处理
+        self.conn.send(('reset', -1, info))
+        if self.conn.poll(BOT_START_TIMEOUT):
+            self.conn.recv()
+        else:
+            self.pending = -1
+
+    def send(self, tick, observation):
+        self.ticks += 1
+        if self.pending is not None:
+            while self.pending is not None and self.conn.poll():
+                if self.conn.recv()[0] == self.pending:
+                    self.pending = None
+            if self.pending is not None:
+                self.overruns += 1
+                self.sent = False
+                return False
+        self.conn.send(('act', tick, observation))
+        self.pending = tick
+        self.sent = True
+        return True
+
+    def receive(self, deadline):
+        if not self.sent:
+            return NOOP
+        if not self.conn.poll(max(0.0, deadline - time.perf_counter())):
+            self.overruns += 1
+            return NOOP
+        _, action, cpu_ms = self.conn.recv()
+        self.pending = None
+        self.sent = False
+        self.cpu_ms += cpu_ms
+        if action is None:
+            self.errors += 1
+            return NOOP
+        if cpu_ms > self.budget_ms:
+            self.overruns += 1
+            return NOOP
+        return action
+
+    def stats(self):
+        return {'ticks': self.ticks, 'overruns': self.overruns, 'errors': self.errors,
+                'cpu_ms': self.cpu_ms}
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(0.5)
+        if self.process.is_alive():
+            self.process.kill()  # 还在计算的程序不会读到退出消息
+            self.process.join()
+        self.conn.close()
+
+
+def _tank_view(tank):
+    return TankView(tank.entity_id, tank.rect.centerx, tank.rect.centery, tank.direction, tank.health,
+                    tank.bullet_ready, tank.missile_ready)
+
+
+def observe(game, tank):
+    """tank一方看到的只读观测"""
+    if tank.team == 'friendly':
+        enemies = tuple(_tank_view(robot) for robot in game.robots)
+    else:
+        enemies = (_tank_view(game.player),) if game.player.alive() else ()
+    projectiles = tuple(ProjectileView(projectile.rect.centerx, projectile.rect.centery, projectile.dx,
+                                       projectile.dy, projectile.is_missile, tank.team not in projectile.components)
+                        for projectile in game.projectiles)
+    return Observation(game.frame, _tank_view(tank), enemies, projectiles)
+
+
+def play_match(spec_a, spec_b, seed=0, max_ticks=MATCH_MAX_TICKS, map_path=DEFAULT_MAP,
+               budget_ms=BOT_TICK_BUDGET_MS):
+    """spec_a控制玩家坦克，spec_b控制机器人坦克，返回对局结果，winner为胜方阵营'a'/'b'，平局为None
+
+    两个程序各自在单独的进程中同时思考；每步最多等待预算加上进程间通信的余量。
+    """
+    # 游戏模块只在对局进程中导入，机器人程序进程不需要加载
+    import tank_battle
+    from assets.sound_manager import NullSoundManager
+    from game_map import load_map
+    from pygame.locals import K_w, K_a, K_s, K_d, K_SPACE, K_m
+    move_keys = (None, K_w, K_d, K_s, K_a)
+
+    random.seed(seed)
+    game_map = None
+    if map_path:
+        game_map = load_map(os.path.join(os.path.dirname(os.path.abspath(__file__)), map_path))
+    game = tank_battle.Game(1, NullSoundManager(), game_map=game_map)
+    tanks = (game.player, game.robot)
+    keys = []
+    for tank in tanks:
+        tank.input_keys = {key: False for key in (K_w, K_a, K_s, K_d, K_SPACE, K_m)}
+        keys.append(tank.input_keys)
+
+    obstacles = tuple(tuple(rect) for rect in game.obstacle_rects)
+    context = multiprocessing.get_context('spawn')
+    bots = [BotProcess(spec, context, budget_ms) for spec in (spec_a, spec_b)]
+    timeout = (budget_ms + BOT_IPC_MARGIN_MS) / 1000.0
+    try:
+        for bot, tank in zip(bots, tanks):
+            bot.reset(MatchInfo(game.world_width, game.world_height, obstacles, tank.team, SIM_RATE))
+        ticks = 0
+        while ticks < max_ticks and not game.game_over:
+            for bot, tank in zip(bots, tanks):
+                bot.send(ticks, observe(game, tank))
+            deadline = time.perf_counter() + timeout
+            for bot, tank_keys in zip(bots, keys):
+                move, fire, missile = bot.receive(deadline)
+                for key in tank_keys:
+                    tank_keys[key] = False
+                if move:
+                    tank_keys[move_keys[move]] = True
+                tank_keys[K_SPACE] = bool(fire)
+                tank_keys[K_m] = bool(missile)
+            game.run_logic()
+            ticks += 1
+    finally:
+        for bot in bots:
+            bot.close()
+
+    # 胜方按阵营返回（'a'/'b'，平局为None），两个参赛者使用同一个程序时也能区分
+    winner = {'player': 'a', 'robot': 'b'}.get(game.winner)
+    return {'a': spec_a, 'b': spec_b, 'winner': winner, 'ticks': ticks,
+            'health': (max(game.player.health, 0), max(game.robot.health, 0)),
+            'bots': (bots[0].stats(), bots[1].stats()), 'match': game.match_result()}
+
+
+def _match_worker(jobs, results, settings):
+    # 对局进程：不是守护进程，才能为每场对局启动机器人程序进程
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        index, spec_a, spec_b, seed = job
+        try:
+            result = play_match(spec_a, spec_b, seed, **settings)
+        except Exception as e:
+            result = {'a': spec_a, 'b': spec_b, 'winner': None, 'ticks': 0, 'error': f"{type(e).__name__}: {e}"}
+        results.put((index, result))
+
+
+class Ratings:
+    """Elo等级分和胜负统计，按对局顺序逐场更新"""
+
+    def __init__(self, names, start=ELO_START, k=ELO_K):
+        self.k = k
+        self.rating = {name: float(start) for name in names}
+        self.record = {name: {'played': 0, 'won': 0, 'lost': 0, 'drawn': 0, 'ticks': 0, 'overruns': 0,
+                              'errors': 0, 'cpu_ms': 0.0} for name in names}
+
+    def add(self, name_a, name_b, winner, bot_stats=()):
+        expected = 1.0 / (1.0 + 10 ** ((self.rating[name_b] - self.rating[name_a]) / 400.0))
+        score = 0.5 if winner is None else float(winner == name_a)
+        self.rating[name_a] += self.k * (score - expected)
+        self.rating[name_b] -= self.k * (score - expected)
+        for name, result in ((name_a, score), (name_b, 1.0 - score)):
+            record = self.record[name]
+            record['played'] += 1
+            record['won' if result == 1.0 else 'lost' if result == 0.0 else 'drawn'] += 1
+        for name, stats in zip((name_a, name_b), bot_stats):
+            for key, value in stats.items():
+                self.record[name][key] += value
+
+    def table(self):
+        lines = ["名次  程序              Elo   场次  胜   负   平   超时率  出错  CPU(ms/步)"]
+        ranked = sorted(self.rating, key=self.rating.get, reverse=True)
+        for place, name in enumerate(ranked, 1):
+            record = self.record[name]
+            ticks = max(record['ticks'], 1)
+            lines.append(f"{place:>3}   {name:<16} {self.rating[name]:>5.0f} {record['played']:>5} "
+                         f"{record['won']:>4} {record['lost']:>4} {record['drawn']:>4} "
+                         f"{record['overruns'] / ticks:>7.1%} {record['errors']:>5} {record['cpu_ms'] / ticks:>10.3f}")
+        return '\n'.join(lines)
+
+
+def run_tournament(bots, rounds=1, workers=None, seed=0, **settings):
+    """bots是{名称: "模块:类名"}，每对程序交换阵营各打rounds场，返回(Ratings, 按顺序的结果列表)"""
+    names = list(bots)
+    pairings = [(a, b) for _ in range(rounds) for a in names for b in names if a != b]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(pairings)))
+
+    # 使用spawn启动，避免在已初始化的SDL上fork
+    context = multiprocessing.get_context('spawn')
+    jobs = context.Queue()
+    results = context.Queue()
+    for index, (a, b) in enumerate(pairings):
+        jobs.put((index, bots[a], bots[b], seed + index))
+    for _ in range(workers):
+        jobs.put(None)
+    processes = [context.Process(target=_match_worker, args=(jobs, results, settings)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    finished = [None] * len(pairings)
+    for count in range(1, len(pairings) + 1):
+        index, result = results.get()
+        finished[index] = result
+        a, b = pairings[index]
+        outcome = result.get('error') or (f"{a}胜" if result['winner'] == 'a' else
+                                          f"{b}胜" if result['winner'] == 'b' else "平局")
+        print(f"[{count}/{len(pairings)}] {a} vs {b}: {outcome}（{result['ticks']}步）")
+    for process in processes:
+        process.join()
+
+    # 按固定的对局顺序计算等级分，结果与完成的先后无关；打开了对局历史时同时写入
+    ratings = Ratings(names)
+    for (a, b), result in zip(pairings, finished):
+        winner = {'a': a, 'b': b}.get(result['winner'])
+        ratings.add(a, b, winner, result.get('bots', ()))
+        if 'match' in result:
+            history.record(result['match'], player=a, robot=b)
+    return ratings, finished
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="机器人程序单循环比赛")
+    parser.add_argument('bots', nargs='*', default=['chaser', 'random', 'idle'],
+                        help="参赛程序：内置程序名，或 名称=模块:类名")
+    parser.add_argument('--bot', action='append', default=[], help="追加参赛程序：名称=模块:类名")
+    parser.add_argument('--rounds', type=int, default=1, help="每对程序交换阵营各打几场")
+    parser.add_argument('--workers', type=int, default=None, help="同时进行的对局数，默认等于CPU核数")
+    parser.add_argument('--ticks', type=int, default=MATCH_MAX_TICKS, help="每场对局的最大步数，到时为平局")
+    parser.add_argument('--budget', type=float, default=BOT_TICK_BUDGET_MS, help="每步的CPU预算（毫秒）")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--history', default=MATCH_HISTORY_DB, help="对局历史数据库，为空时不记录")
+    args = parser.parse_args(argv)
+
+    bots = {}
+    for entry in args.bots + args.bot:
+        name, _, spec = entry.partition('=')
+        bots[name] = spec or name
+    if len(bots) < 2:
+        parser.error("至少需要两个参赛程序")
+
+    if args.history:
+        history.open(os.path.join(os.path.dirname(os.path.abspath(__file__)), args.history), source='tournament')
+    start_time = time.perf_counter()
+    ratings, _ = run_tournament(bots, args.rounds, args.workers, args.seed,
+                                max_ticks=args.ticks, budget_ms=args.budget)
+    print(ratings.table())
+    print(f"用时 {time.perf_counter() - start_time:.1f} 秒")
+    history.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
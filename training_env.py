@@ -0,0 +1,381 @@
+# 训练环境模块
+# Gym风格的向量化环境：K场对局同步推进，观测、奖励和结束标志写入预分配的数组
+
+import os
+
+# 训练时不需要窗口和声音，必须在导入pygame之前设置
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import multiprocessing
+import random
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+from pygame.locals import K_w, K_a, K_s, K_d, K_SPACE, K_m
+
+import tank_battle
+from assets.sound_manager import NullSoundManager
+from game_map import load_map
+from match_history import history
+from obs_renderer import ObservationRenderer
+
+# 动作：[移动方向, 发射炮弹, 发射导弹]
+# 移动方向 0: 不动, 1: 上, 2: 右, 3: 下, 4: 左
+ACTION_SIZE = 3
+MOVE_KEYS = (None, K_w, K_d, K_s, K_a)
+CONTROL_KEYS = (K_w, K_a, K_s, K_d, K_SPACE, K_m)
+
+# 观测中记录的实体数量上限，不足的部分补0
+MAX_OBS_ROBOTS = 8
+MAX_OBS_PROJECTILES = 16
+MAX_OBS_OBSTACLES = 8
+
+PLAYER_FEATURES = 6     # x, y, 方向, 生命, 炮弹就绪, 导弹就绪
+ROBOT_FEATURES = 5      # 存活, x, y, 方向, 生命
+PROJECTILE_FEATURES = 6  # x, y, dx, dy, 是否导弹, 是否敌方
+OBSTACLE_FEATURES = 4   # x, y, 宽, 高
+
+OBS_SIZE = (PLAYER_FEATURES + MAX_OBS_ROBOTS * ROBOT_FEATURES +
+            MAX_OBS_PROJECTILES * PROJECTILE_FEATURES + MAX_OBS_OBSTACLES * OBSTACLE_FEATURES)
+
+# 胜负奖励，其余奖励按造成和受到的伤害计算
+WIN_REWARD = 1.0
+LOSE_REWARD = -1.0
+
+
+class TankMatch:
+    """一场无窗口对局，玩家坦克由动作控制"""
+
+    def __init__(self, robot_count=1, max_steps=3600, map_path=None, arena=None):
+        self.robot_count = robot_count
+        self.max_steps = max_steps
+        self.game_map = load_map(map_path) if map_path else None
+        self.arena = arena  # 随机地图生成器，每次重置时换一张新地图
+        self.game = None
+        self.keys = {key: False for key in CONTROL_KEYS}
+        self.sound_manager = NullSoundManager()
+        self.reset()
+
+    def reset(self):
+        # 上一局的对局数据和观测静态层立即释放，长时间训练内存不增长
+        if self.game is not None:
+            self.game.dispose()
+        if self.arena is not None:
+            self.game_map = self.arena.generate_map()  # 每场对局都换新地图
+        self.game = tank_battle.Game(self.robot_count, self.sound_manager, game_map=self.game_map)
+        self.game.player.input_keys = self.keys
+        self.steps = 0
+        self.player_health = self.game.player.health
+        self.robot_health = self.total_robot_health()
+
+    def total_robot_health(self):
+        # 被摧毁的机器人已从组中移除，生命值按0计算
+        return sum(max(robot.health, 0) for robot in self.game.robots)
+
+    def step(self, move, fire, missile):
+        keys = self.keys
+        for key in CONTROL_KEYS:
+            keys[key] = False
+        if move:
+            keys[MOVE_KEYS[move]] = True
+        keys[K_SPACE] = bool(fire)
+        keys[K_m] = bool(missile)
+
+        game = self.game
+        game.run_logic()
+        self.steps += 1
+
+        # 奖励 = 造成的伤害 - 受到的伤害（按满血100归一化）
+        player_health = max(game.player.health, 0)
+        robot_health = self.total_robot_health()
+        reward = ((self.robot_health - robot_health) - (self.player_health - player_health)) / 100.0
+        self.player_health = player_health
+        self.robot_health = robot_health
+
+        if game.game_over:
+            reward += WIN_REWARD if game.winner == "player" else LOSE_REWARD
+        done = game.game_over or self.steps >= self.max_steps
+        return reward, done
+
+    def write_observation(self, out):
+        # 把对局状态写入一行观测数组（坐标按屏幕尺寸归一化）
+        game = self.game
+        width = float(game.world_width)
+        height = float(game.world_height)
+        out[:] = 0
+
+        player = game.player
+        out[0] = player.rect.centerx / width
+        out[1] = player.rect.centery / height
+        out[2] = player.direction / 3.0
+        out[3] = player.health / 100.0
+        out[4] = player.bullet_ready
+        out[5] = player.missile_ready
+        index = PLAYER_FEATURES
+
+        for robot in game.robots.sprites()[:MAX_OBS_ROBOTS]:
+            out[index] = 1.0
+            out[index + 1] = robot.rect.centerx / width
+            out[index + 2] = robot.rect.centery / height
+            out[index + 3] = robot.direction / 3.0
+            out[index + 4] = robot.health / 100.0
+            index += ROBOT_FEATURES
+        index = PLAYER_FEATURES + MAX_OBS_ROBOTS * ROBOT_FEATURES
+
+        # 玩家和机器人的弹药各占一半名额
+        half = MAX_OBS_PROJECTILES // 2
+        base = index
+        for group, hostile in ((game.player_bullets, 0.0), (game.robot_bullets, 1.0)):
+            index = base
+            for projectile in group.sprites()[:half]:
+                out[index] = projectile.rect.centerx / width
+                out[index + 1] = projectile.rect.centery / height
+                out[index + 2] = projectile.dx / 10.0
+                out[index + 3] = projectile.dy / 10.0
+                out[index + 4] = projectile.is_missile
+                out[index + 5] = hostile
+                index += PROJECTILE_FEATURES
+            base += half * PROJECTILE_FEATURES
+        index = PLAYER_FEATURES + MAX_OBS_ROBOTS * ROBOT_FEATURES + MAX_OBS_PROJECTILES * PROJECTILE_FEATURES
+
+        for obstacle in game.obstacles.sprites()[:MAX_OBS_OBSTACLES]:
+            out[index] = obstacle.rect.x / width
+            out[index + 1] = obstacle.rect.y / height
+            out[index + 2] = obstacle.rect.width / width
+            out[index + 3] = obstacle.rect.height / height
+            index += OBSTACLE_FEATURES
+
+
+def _reset_matches(matches, start, observations, pixels=None, renderer=None):
+    for offset, match in enumerate(matches):
+        match.reset()
+        match.write_observation(observations[start + offset])
+        if renderer is not None:
+            renderer.render(match.game, pixels[start + offset])
+
+
+def _step_matches(matches, start, actions, observations, rewards, dones, pixels=None, renderer=None):
+    # 推进一段连续的对局，结束的对局自动重置，观测写入新对局的初始状态
+    for offset, match in enumerate(matches):
+        row = start + offset
+        move, fire, missile = actions[row].tolist()
+        reward, done = match.step(move, fire, missile)
+        if done:
+            match.reset()
+        rewards[row] = reward
+        dones[row] = done
+        match.write_observation(observations[row])
+        if renderer is not None:
+            renderer.render(match.game, pixels[row])
+
+
+def _attach(name, shape, dtype):
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _worker_main(conn, names, num_envs, start, stop, robot_count, max_steps, seed, obs_resolution,
+                 map_path, history_path, arena):
+    # 子进程：只负责[start, stop)范围内的对局，数据通过共享内存交换
+    if seed is not None:
+        random.seed(seed)
+    if arena is not None:
+        # 没有指定种子时各子进程按系统随机数重新播种，避免生成同样的地图序列
+        arena.reseed(seed)
+    owns_history = bool(history_path) and history.open(history_path, source='training', player='agent')
+    blocks = []
+    arrays = []
+    for name, (shape, dtype) in zip(names, _array_specs(num_envs, obs_resolution)):
+        block, array = _attach(name, shape, dtype)
+        blocks.append(block)
+        arrays.append(array)
+    observations, rewards, dones, actions = arrays[:4]
+    pixels = arrays[4] if obs_resolution else None
+    renderer = ObservationRenderer(*obs_resolution) if obs_resolution else None
+    matches = [TankMatch(robot_count, max_steps, map_path, arena) for _ in range(start, stop)]
+
+    try:
+        while True:
+            command = conn.recv()
+            if command == 'step':
+                _step_matches(matches, start, actions, observations, rewards, dones, pixels, renderer)
+            elif command == 'reset':
+                _reset_matches(matches, start, observations, pixels, renderer)
+            else:
+                break
+            conn.send(True)
+    finally:
+        if owns_history:
+            history.close()
+        del observations, rewards, dones, actions, pixels, arrays
+        for block in blocks:
+            block.close()
+
+
+def _array_specs(num_envs, obs_resolution=None):
+    # 观测, 奖励, 结束标志, 动作, 以及可选的像素观测(K, 高, 宽)
+    specs = [((num_envs, OBS_SIZE), np.float32),
+             ((num_envs,), np.float32),
+             ((num_envs,), np.bool_),
+             ((num_envs, ACTION_SIZE), np.int32)]
+    if obs_resolution:
+        width, height = obs_resolution
+        specs.append(((num_envs, height, width), np.uint8))
+    return specs
+
+
+class VectorTankEnv:
+    """K场对局同步推进的向量化环境
+
+    step()接受形状为(K, 3)的动作数组，返回的观测、奖励、结束标志都是预分配的数组，
+    每一步原地覆盖，调用方需要保留时请自行复制。对局结束后自动重置。
+    num_workers大于0时对局平均分配到多个子进程，数组放在共享内存中，不需要序列化。
+    obs_resolution=(宽, 高)时额外提供pixels数组，每步写入类别编码的低分辨率画面。
+    map_path指定对局使用的地图文件，不指定时使用内置布局。
+    arena为ArenaGenerator时忽略map_path，每场对局重置时换一张新生成的随机地图。
+    history_path指定对局历史数据库时，分出胜负的对局以training来源写入。
+    """
+
+    def __init__(self, num_envs, robot_count=1, max_steps=3600, num_workers=0, seed=None,
+                 obs_resolution=None, map_path=None, history_path=None, arena=None):
+        self.num_envs = num_envs
+        self.obs_resolution = tuple(obs_resolution) if obs_resolution else None
+        self.pixels = None
+        self.renderer = None
+        self.num_workers = min(num_workers, num_envs)
+        self.closed = False
+        self._owns_history = False
+        self._blocks = []
+        self._workers = []
+        self._connections = []
+
+        specs = _array_specs(num_envs, self.obs_resolution)
+        if self.num_workers > 0:
+            arrays = []
+            for shape, dtype in specs:
+                size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                block = shared_memory.SharedMemory(create=True, size=size)
+                self._blocks.append(block)
+                arrays.append(np.ndarray(shape, dtype=dtype, buffer=block.buf))
+            self.observations, self.rewards, self.dones, self.actions = arrays[:4]
+            if self.obs_resolution:
+                self.pixels = arrays[4]
+            for array in arrays:
+                array.fill(0)
+            self._start_workers(robot_count, max_steps, seed, map_path, history_path, arena)
+        else:
+            if seed is not None:
+                random.seed(seed)
+                if arena is not None:
+                    arena.reseed(seed)
+            if history_path:
+                # 同一进程中已经打开的对局历史（如游戏或另一个环境打开的）由打开它的一方关闭
+                self._owns_history = history.open(history_path, source='training', player='agent')
+            arrays = [np.zeros(shape, dtype=dtype) for shape, dtype in specs]
+            self.observations, self.rewards, self.dones, self.actions = arrays[:4]
+            if self.obs_resolution:
+                self.pixels = arrays[4]
+                self.renderer = ObservationRenderer(*self.obs_resolution)
+            self.matches = [TankMatch(robot_count, max_steps, map_path, arena) for _ in range(num_envs)]
+
+    def _start_workers(self, robot_count, max_steps, seed, map_path, history_path, arena):
+        # 使用spawn启动，避免在已初始化的SDL上fork
+        context = multiprocessing.get_context('spawn')
+        names = [block.name for block in self._blocks]
+        per_worker = -(-self.num_envs // self.num_workers)
+        for worker_index in range(self.num_workers):
+            start = worker_index * per_worker
+            stop = min(start + per_worker, self.num_envs)
+            if start >= stop:
+                break
+            parent_conn, child_conn = context.Pipe()
+            worker_seed = None if seed is None else seed + worker_index
+            process = context.Process(target=_worker_main,
+                                      args=(child_conn, names, self.num_envs, start, stop,
+                                            robot_count, max_steps, worker_seed, self.obs_resolution,
+                                            map_path, history_path, arena),
+                                      daemon=True)
+            process.start()
+            child_conn.close()
+            self._workers.append(process)
+            self._connections.append(parent_conn)
+
+    def _broadcast(self, command):
+        for conn in self._connections:
+            conn.send(command)
+        for conn in self._connections:
+            conn.recv()
+
+    def reset(self):
+        if self._workers:
+            self._broadcast('reset')
+        else:
+            _reset_matches(self.matches, 0, self.observations, self.pixels, self.renderer)
+        self.rewards.fill(0)
+        self.dones.fill(False)
+        return self.observations
+
+    def step(self, actions):
+        if actions is not self.actions:
+            np.copyto(self.actions, actions, casting='unsafe')
+        if self._workers:
+            self._broadcast('step')
+        else:
+            _step_matches(self.matches, 0, self.actions, self.observations, self.rewards, self.dones,
+                          self.pixels, self.renderer)
+        return self.observations, self.rewards, self.dones
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for conn in self._connections:
+            try:
+                conn.send('close')
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._workers:
+            process.join(timeout=5)
+        if self._owns_history:
+            history.close()
+        # 先释放对共享内存的引用，再关闭和删除共享内存
+        self.observations = self.rewards = self.dones = self.actions = self.pixels = None
+        for block in self._blocks:
+            try:
+                block.close()
+            except BufferError:
+                # 调用方仍持有数组引用，映射会在引用释放后回收
+                pass
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def benchmark(num_envs=16, steps=500, num_workers=0, obs_resolution=None):
+    # 随机动作下测量每秒环境步数
+    with VectorTankEnv(num_envs, num_workers=num_workers, seed=0, obs_resolution=obs_resolution) as env:
+        env.reset()
+        rng = np.random.default_rng(0)
+        actions = env.actions
+        start = time.perf_counter()
+        for _ in range(steps):
+            actions[:, 0] = rng.integers(0, 5, num_envs)
+            actions[:, 1:] = rng.integers(0, 2, (num_envs, 2))
+            env.step(actions)
+        elapsed = time.perf_counter() - start
+    rate = num_envs * steps / elapsed
+    print(f"{num_envs}个环境, {num_workers}个子进程: {rate:.0f} 步/秒")
+    return rate
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    benchmark(num_workers=workers)
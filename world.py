@@ -0,0 +1,136 @@
+# 世界模块
+# 世界坐标与屏幕坐标分离：摄像机跟随玩家，地面由分块的瓦片地图按需绘制
+
+from array import array
+
+import pygame
+
+
+class Camera:
+    """跟随目标的摄像机
+
+    rect是视口在世界坐标中的位置，始终限制在世界范围内。
+    """
+
+    def __init__(self, view_width, view_height, world_width, world_height):
+        self.rect = pygame.Rect(0, 0, view_width, view_height)
+        self.world_width = world_width
+        self.world_height = world_height
+
+    def follow(self, target_rect):
+        # 让目标位于视口中心，靠近世界边缘时停止滚动
+        x = target_rect.centerx - self.rect.width // 2
+        y = target_rect.centery - self.rect.height // 2
+        self.rect.x = min(max(x, 0), max(self.world_width - self.rect.width, 0))
+        self.rect.y = min(max(y, 0), max(self.world_height - self.rect.height, 0))
+
+    def apply(self, rect):
+        # 世界坐标转换为屏幕坐标
+        return rect.move(-self.rect.x, -self.rect.y)
+
+    def is_visible(self, rect):
+        return self.rect.colliderect(rect)
+
+
+class TileMap:
+    """分块的瓦片地图
+
+    地图由瓦片编号组成，每个编号对应瓦片集中的一张小图。
+    瓦片按区块预先拼成整块表面，区块在第一次可见时才生成，
+    并且只缓存有限数量，绘制时只处理与视口相交的区块。
+    静态精灵（障碍物）在生成区块时一并画进去，之后每帧不再单独绘制。
+    """
+
+    def __init__(self, cols, rows, tile_size, tileset, tiles=None, chunk_tiles=8, max_cached_chunks=64):
+        self.cols = cols
+        self.rows = rows
+        self.tile_size = tile_size
+        self.tileset = tileset
+        self.tiles = tiles if tiles is not None else array('H', bytes(2 * cols * rows))
+        self.chunk_tiles = chunk_tiles
+        self.chunk_size = chunk_tiles * tile_size
+        self.max_cached_chunks = max_cached_chunks
+        self._chunks = {}
+        self._static = {}  # 区块 -> 与之相交的静态精灵
+        self.chunks_drawn = 0
+        self.chunks_built = 0
+
+    @classmethod
+    def from_image(cls, image, world_width, world_height, tile_size=40, **kwargs):
+        # 把一张背景图切成瓦片集，并在整个世界中重复铺设
+        image_cols = max(1, image.get_width() // tile_size)
+        image_rows = max(1, image.get_height() // tile_size)
+        tileset = [image.subsurface((col * tile_size, row * tile_size, tile_size, tile_size))
+                   for row in range(image_rows) for col in range(image_cols)]
+        cols = -(-world_width // tile_size)
+        rows = -(-world_height // tile_size)
+        tiles = array('H', ((row % image_rows) * image_cols + (col % image_cols)
+                           for row in range(rows) for col in range(cols)))
+        return cls(cols, rows, tile_size, tileset, tiles, **kwargs)
+
+    @property
+    def width(self):
+        return self.cols * self.tile_size
+
+    @property
+    def height(self):
+        return self.rows * self.tile_size
+
+    def set_static_sprites(self, sprites):
+        # 按区块登记静态精灵，已生成的区块全部作废，下次绘制时重新合成
+        self._static = {}
+        size = self.chunk_size
+        for sprite in sprites:
+            rect = sprite.rect
+            for chunk_y in range(max(rect.top // size, 0), (rect.bottom - 1) // size + 1):
+                for chunk_x in range(max(rect.left // size, 0), (rect.right - 1) // size + 1):
+                    self._static.setdefault((chunk_x, chunk_y), []).append(sprite)
+        self.invalidate()
+
+    def _build_chunk(self, chunk_x, chunk_y):
+        surface = pygame.Surface((self.chunk_size, self.chunk_size)).convert()
+        first_col = chunk_x * self.chunk_tiles
+        first_row = chunk_y * self.chunk_tiles
+        tile_size = self.tile_size
+        for row in range(first_row, min(first_row + self.chunk_tiles, self.rows)):
+            for col in range(first_col, min(first_col + self.chunk_tiles, self.cols)):
+                tile = self.tileset[self.tiles[row * self.cols + col]]
+                surface.blit(tile, ((col - first_col) * tile_size, (row - first_row) * tile_size))
+        # 静态精灵超出区块的部分会被裁掉，由相邻区块各自绘制
+        origin_x, origin_y = chunk_x * self.chunk_size, chunk_y * self.chunk_size
+        for sprite in self._static.get((chunk_x, chunk_y), ()):
+            surface.blit(sprite.image, (sprite.rect.x - origin_x, sprite.rect.y - origin_y))
+        self.chunks_built += 1
+        return surface
+
+    def chunk(self, chunk_x, chunk_y):
+        key = (chunk_x, chunk_y)
+        surface = self._chunks.pop(key, None)
+        if surface is None:
+            surface = self._build_chunk(chunk_x, chunk_y)
+            # 超出缓存上限时丢弃最久未使用的区块
+            if len(self._chunks) >= self.max_cached_chunks:
+                del self._chunks[next(iter(self._chunks))]
+        # 重新插入到末尾，字典顺序即最近使用顺序
+        self._chunks[key] = surface
+        return surface
+
+    def invalidate(self):
+        # 瓦片或瓦片集改变后丢弃所有已生成的区块
+        self._chunks.clear()
+
+    def visible_chunks(self, view):
+        # 与视口view（世界坐标矩形）相交的区块及其屏幕位置
+        size = self.chunk_size
+        first_x = max(view.left // size, 0)
+        first_y = max(view.top // size, 0)
+        last_x = min((view.right - 1) // size, (self.cols - 1) // self.chunk_tiles)
+        last_y = min((view.bottom - 1) // size, (self.rows - 1) // self.chunk_tiles)
+        chunks = [(self.chunk(chunk_x, chunk_y), (chunk_x * size - view.x, chunk_y * size - view.y))
+                  for chunk_y in range(first_y, last_y + 1)
+                  for chunk_x in range(first_x, last_x + 1)]
+        self.chunks_drawn = len(chunks)
+        return chunks
+
+    def draw(self, surface, camera):
+        surface.blits(self.visible_chunks(camera.rect), doreturn=False)